@@ -68,8 +68,23 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+
+    # Check the blacklist against the in-memory filter of project.revoked_tokens
+    'TOKEN_REFRESH_SERIALIZER': 'project.authentication.TokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'project.authentication.TokenVerifySerializer',
 }
 
+# Bloom filter of blacklisted token JTIs: expected entries and false positive rate at that size
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 100000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+# Filters are rebuilt from the database this often, or once this many tokens were added since
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 60 * 60
+TOKEN_BLACKLIST_RECENT_MAX = 10000
+# Seconds between checks for tokens blacklisted by other workers (blacklisting in this worker applies at once)
+TOKEN_BLACKLIST_SYNC_INTERVAL = 5
+# Expired outstanding and blacklisted tokens are deleted by a job repeating this often
+TOKEN_PRUNE_INTERVAL = 60 * 60 * 24
+
 
 
 MIDDLEWARE = [
@@ -81,6 +96,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "project.traffic.TrafficStatsMiddleware",
     # "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
@@ -158,6 +174,54 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Ebook delivery for the read/download endpoints
+# 'django' streams files from the worker in FILE_STREAM_CHUNK_SIZE blocks.
+# 'x-accel-redirect' (nginx) and 'x-sendfile' (Apache/lighttpd) let the front proxy send the bytes;
+# for nginx, map FILE_ACCEL_REDIRECT_PREFIX to MEDIA_ROOT in an `internal` location.
+FILE_SERVE_MODE = os.environ.get('FILE_SERVE_MODE', 'django')
+FILE_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+FILE_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Background jobs (ebook ingestion) are stored in the database and run off the request path.
+# 'pool' runs them in a local process pool once the request commits, 'sync' runs them inline
+# and 'manual' leaves them for `manage.py drain_jobs` (run it with --watch, or delayed jobs
+# and retries never run). In 'pool' and 'sync' modes each web process dispatches delayed jobs
+# and retries when they are due.
+BACKGROUND_JOBS_MODE = os.environ.get('BACKGROUND_JOBS_MODE', 'pool')
+BACKGROUND_JOB_WORKERS = int(os.environ.get('BACKGROUND_JOB_WORKERS', 2))
+BACKGROUND_JOB_MAX_ATTEMPTS = 3
+BACKGROUND_JOB_RETRY_DELAY = 60  # seconds, multiplied by the attempt number
+BACKGROUND_JOB_TIMEOUT = 60 * 30  # running jobs older than this are assumed lost and retried
+BACKGROUND_JOB_POLL_INTERVAL = 30  # seconds between scheduler checks for jobs queued by other processes
+# Replaced files (e.g. old profile pictures) are deleted this many seconds later
+FILE_CLEANUP_DELAY = 60 * 10
+
+# Bytes per page when paginating plain text ebooks (pages end on a line break where possible).
+# Changing it rebuilds each book's page index on next use.
+TEXT_PAGE_SIZE = 3000
+# Most pages a single `read?page=n&count=k` request may return
+TEXT_MAX_PAGES_PER_REQUEST = 20
+# PDF pages on either side of a requested page whose text is extracted in the background (0 disables)
+PDF_PAGE_PREFETCH = 2
+# Text ebooks smaller than this (in bytes) are not given precompressed variants
+PRECOMPRESS_MIN_SIZE = 1024
+
+# Cover renditions generated in the background (widths in pixels).
+# Run `manage.py regenerate_thumbnails` after changing them.
+COVER_THUMBNAIL_WIDTHS = (96, 240, 480)
+COVER_THUMBNAIL_FORMATS = ('webp', 'jpeg')
+
+# Resumable ebook uploads (api/uploads/)
+UPLOAD_MAX_SIZE = 1024 * 1024 * 1024  # bytes per file
+UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024  # bytes per PATCH request
+UPLOAD_SESSION_TTL = 60 * 60 * 24  # seconds an incomplete upload is kept after its last chunk
+# `dedupe_media` only removes unreferenced stored files older than this (seconds), sparing uploads in progress
+STORED_BLOB_SWEEP_GRACE = 60 * 60
+
+# Profile pictures are normalized in the background into square JPEG renditions (sizes in pixels)
+PROFILE_PICTURE_SIZES = (64, 128, 256)
+PROFILE_PICTURE_MAX_UPLOAD_SIZE = 15 * 1024 * 1024  # bytes
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -197,19 +261,101 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    # Resumable uploads
+    'upload-offset',
+    'upload-length',
+    'upload-checksum',
+]
+
+CORS_EXPOSE_HEADERS = [
+    'upload-offset',
+    'upload-length',
+    'upload-expires',
 ]
 
 # Caching configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# The default cache is shared by all workers (L2 of project.tiered_cache). The generation
+# counters, response cache locks and metrics need atomic incr/add across processes, so it is
+# Redis or Memcached when CACHE_REDIS_URL or CACHE_MEMCACHED_LOCATION is set and the database
+# cache otherwise (its table is created by `migrate`). Do not use the file-based cache with
+# more than one worker process: its incr/add are not atomic.
+if os.environ.get('CACHE_REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CACHE_REDIS_URL'],
     }
+elif os.environ.get('CACHE_MEMCACHED_LOCATION'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ['CACHE_MEMCACHED_LOCATION'],
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'project.db_cache.DatabaseCache',
+        'LOCATION': 'kremlib_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+CACHES = {
+    'default': SHARED_CACHE,
 }
 
+# Per-process LRU (L1) in front of the shared cache, bounded by entries, bytes and seconds
+CACHE_L1_MAX_ENTRIES = 2000
+CACHE_L1_MAX_BYTES = 32 * 1024 * 1024
+CACHE_L1_TIMEOUT = 30
+# Generation counters are read from L2 at most this often per worker (seconds); invalidations
+# from other workers take up to this long to show, so cached hits normally skip L2 entirely
+CACHE_GENERATION_L1_TIMEOUT = 2
+
+# Per-namespace cache hit/miss/latency counters (see `manage.py cache_stats` and cache/metrics/)
+CACHE_METRICS_ENABLED = True
+# Seconds between adding each worker's counters to the shared totals
+CACHE_METRICS_FLUSH_INTERVAL = 10
+
 # Cache timeouts in seconds
 CACHE_MIDDLEWARE_SECONDS = 60 * 15  # 15 minutes
 CACHE_MIDDLEWARE_KEY_PREFIX = 'kremlib'
+# Cached book list pages (ids and counts), invalidated on any book write
+BOOK_LIST_CACHE_SECONDS = 60 * 5
+# Serialized books shared by all users, invalidated when the book, its ratings, comments or content change
+BOOK_PAYLOAD_CACHE_SECONDS = 60 * 30
+# Each user's favorites, reading progress and ratings overlaid on shared payloads
+USER_BOOK_STATE_CACHE_SECONDS = 60 * 30
+# Cached responses of expensive endpoints (popular, home, by_category, search)
+RESPONSE_CACHE_SECONDS = 60 * 5
+# How long an expired response may still be served while one worker recomputes it
+RESPONSE_CACHE_STALE_SECONDS = 60 * 5
+# Lifetime of the lock held by the worker recomputing a response
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+# How long other requests wait for that worker before computing the response themselves
+RESPONSE_CACHE_LOCK_WAIT = 5
+# Probabilistic early expiration: higher values refresh earlier before expiry (0 disables)
+RESPONSE_CACHE_EARLY_EXPIRATION_BETA = 1.0
+
+# Endpoints whose most requested URLs (and search queries) are counted for cache warming
+CACHE_WARMUP_URL_NAMES = ('home', 'book-list', 'book-detail', 'book-popular', 'book-by-category', 'book-search')
+# Request counts are kept in hourly buckets, each trimmed to its most frequent entries
+TRAFFIC_STATS_HOURS = 24
+TRAFFIC_STATS_MAX_ENTRIES = 500
+TRAFFIC_STATS_FLUSH_INTERVAL = 60
+# `manage.py warm_cache` and the startup hook replay this many URLs and search queries
+CACHE_WARMUP_URLS = 100
+CACHE_WARMUP_QUERIES = 50
+CACHE_WARMUP_WORKERS = 4
+# Seconds after which warming stops, whatever is left
+CACHE_WARMUP_BUDGET = 60
+# Warm the caches when a WSGI worker starts, before it takes traffic
+CACHE_WARMUP_ON_STARTUP = os.environ.get('CACHE_WARMUP_ON_STARTUP', '').lower() in ('1', 'true', 'yes')
+
+# How long the user of a JWT is cached, invalidated when the user is saved or logs out everywhere
+JWT_USER_CACHE_SECONDS = 60 * 5
+
+# Recommendation cache timeouts in seconds
+RECOMMENDATION_CACHE_SECONDS = 60 * 30  # 30 minutes, invalidated on user activity
+ANONYMOUS_RECOMMENDATION_CACHE_SECONDS = 60 * 5  # 5 minutes
+
+# Where `manage.py train_recommender` writes the memory-mapped factor model
+RECOMMENDER_MODEL_DIR = os.path.join(BASE_DIR, 'recommender')
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -217,7 +363,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'project.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -14,3 +14,18 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library.settings")
 
 application = get_wsgi_application()
+
+# Dispatch delayed and retried background jobs when they are due
+from project.jobs import start_scheduler  # noqa: E402
+
+start_scheduler()
+
+# Load the token blacklist filter and keep expired tokens pruned
+from project.revoked_tokens import load_on_startup  # noqa: E402
+
+load_on_startup()
+
+# Fill the caches from recent traffic before the worker takes requests (CACHE_WARMUP_ON_STARTUP)
+from project.warmup import warm_on_startup  # noqa: E402
+
+warm_on_startup()
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.models import User
 from project.models import (
     Book, Collection, UserProfile, Rating, ReadingProgress, 
-    Comment, Category, BookContent
+    Comment, Category, BookContent, BookPreview, BookSearchIndex, BackgroundJob,
+    TextPageIndex, UploadSession, PdfPageText
 )
 
 class adminsite(admin.AdminSite):
@@ -54,6 +55,32 @@ class BookContentPanel(admin.ModelAdmin):
     list_display = ("book", "created_at", "updated_at")
     search_fields = ("book__title",)
 
+class BookPreviewPanel(admin.ModelAdmin):
+    list_display = ("book", "preview_type", "total_pages", "version", "updated_at")
+    search_fields = ("book__title",)
+
+class TextPageIndexPanel(admin.ModelAdmin):
+    list_display = ("book", "page_size", "page_count", "updated_at")
+    search_fields = ("book__title",)
+
+class PdfPageTextPanel(admin.ModelAdmin):
+    list_display = ("book", "page_number", "created_at")
+    search_fields = ("book__title",)
+
+class BookSearchIndexPanel(admin.ModelAdmin):
+    list_display = ("book", "updated_at")
+    search_fields = ("book__title",)
+
+class BackgroundJobPanel(admin.ModelAdmin):
+    list_display = ("kind", "object_id", "status", "stage", "attempts", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    search_fields = ("error",)
+
+class UploadSessionPanel(admin.ModelAdmin):
+    list_display = ("filename", "user", "size", "offset", "status", "expires_at")
+    list_filter = ("status",)
+    search_fields = ("filename", "user__username")
+
 # Register models with the admin site
 siteadmin.register(Book, BookPanel)
 siteadmin.register(Collection, CollectionPanel)
@@ -63,4 +90,10 @@ siteadmin.register(Rating, RatingPanel)
 siteadmin.register(ReadingProgress, ReadingProgressPanel)
 siteadmin.register(Comment, CommentPanel)
 siteadmin.register(Category, CategoryPanel)
-siteadmin.register(BookContent, BookContentPanel)
\ No newline at end of file
+siteadmin.register(BookContent, BookContentPanel)
+siteadmin.register(BookPreview, BookPreviewPanel)
+siteadmin.register(BookSearchIndex, BookSearchIndexPanel)
+siteadmin.register(BackgroundJob, BackgroundJobPanel)
+siteadmin.register(TextPageIndex, TextPageIndexPanel)
+siteadmin.register(UploadSession, UploadSessionPanel)
+siteadmin.register(PdfPageText, PdfPageTextPanel)
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+Implicit-feedback matrix factorization (ALS) for book recommendations.
+
+Interactions from ratings, reading progress and collections are turned into
+confidence weights and factorized with alternating least squares
+(Hu, Koren & Volinsky, "Collaborative Filtering for Implicit Feedback Datasets").
+The trained user and item factors are stored in a single ``.npy`` file that is
+memory-mapped by the web workers.
+"""
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .models import Rating, ReadingProgress, Collection
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; recommendations fall back to the heuristic
+    np = None
+
+
+META_FILENAME = 'factors.json'
+
+# Confidence contributed by each kind of interaction
+COLLECTION_WEIGHT = 3.0
+COMPLETED_WEIGHT = 4.0
+IN_PROGRESS_WEIGHT = 1.0
+
+
+def load_interactions():
+    """
+    Collect implicit feedback as a {(user_id, book_id): weight} dict
+    """
+    weights = defaultdict(float)
+
+    for user_id, book_id, rating in Rating.objects.values_list('user_id', 'book_id', 'rating'):
+        weights[(user_id, book_id)] += float(rating)
+
+    progress = ReadingProgress.objects.values_list('user_id', 'book_id', 'current_page', 'total_pages', 'completed')
+    for user_id, book_id, current_page, total_pages, completed in progress:
+        if completed:
+            weights[(user_id, book_id)] += COMPLETED_WEIGHT
+        else:
+            fraction = min(current_page / total_pages, 1.0) if total_pages else 0.0
+            weights[(user_id, book_id)] += IN_PROGRESS_WEIGHT + 2.0 * fraction
+
+    for user_id, book_id in Collection.objects.values_list('user_id', 'book_id'):
+        weights[(user_id, book_id)] += COLLECTION_WEIGHT
+
+    return dict(weights)
+
+
+def _solve_rows(fixed, rows, alpha, regularization, out, row_indices, threads):
+    """
+    Solve the least squares problem for every row in ``row_indices``.
+
+    ``rows`` maps a row index to (column indices, weights) of its observed interactions.
+    """
+    factors = fixed.shape[1]
+    gram = fixed.T @ fixed
+    identity = regularization * np.eye(factors, dtype=np.float64)
+
+    def solve_chunk(chunk):
+        for row in chunk:
+            columns, values = rows[row]
+            if len(columns) == 0:
+                out[row] = 0
+                continue
+            observed = fixed[columns]
+            confidence = 1.0 + alpha * values
+            # A = Y^T Y + Y_u^T (C_u - I) Y_u + lambda * I ; b = Y_u^T C_u p_u
+            a = gram + (observed.T * (confidence - 1.0)) @ observed + identity
+            b = observed.T @ confidence
+            out[row] = np.linalg.solve(a, b)
+
+    chunk_size = max(1, len(row_indices) // (threads * 4))
+    chunks = [row_indices[i:i + chunk_size] for i in range(0, len(row_indices), chunk_size)]
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(solve_chunk, chunks))
+    else:
+        for chunk in chunks:
+            solve_chunk(chunk)
+
+
+def train_als(interactions, factors=32, iterations=15, regularization=0.05, alpha=10.0, threads=1, seed=None, callback=None):
+    """
+    Factorize an interaction dict into user and item factor matrices.
+
+    Returns a dict with 'user_ids', 'item_ids', 'user_factors' and 'item_factors'.
+    ``callback(iteration, elapsed)`` is called after every iteration.
+    """
+    if np is None:
+        raise ImportError('NumPy is required to train the recommender')
+
+    user_ids = sorted({user_id for user_id, _ in interactions})
+    item_ids = sorted({book_id for _, book_id in interactions})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    item_index = {book_id: i for i, book_id in enumerate(item_ids)}
+
+    by_user = defaultdict(lambda: ([], []))
+    by_item = defaultdict(lambda: ([], []))
+    for (user_id, book_id), weight in interactions.items():
+        u, i = user_index[user_id], item_index[book_id]
+        by_user[u][0].append(i)
+        by_user[u][1].append(weight)
+        by_item[i][0].append(u)
+        by_item[i][1].append(weight)
+
+    user_rows = {u: (np.array(cols, dtype=np.int64), np.array(vals, dtype=np.float64)) for u, (cols, vals) in by_user.items()}
+    item_rows = {i: (np.array(cols, dtype=np.int64), np.array(vals, dtype=np.float64)) for i, (cols, vals) in by_item.items()}
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(len(user_ids), factors))
+    item_factors = rng.normal(scale=0.01, size=(len(item_ids), factors))
+
+    user_order = list(range(len(user_ids)))
+    item_order = list(range(len(item_ids)))
+    for iteration in range(iterations):
+        started = time.time()
+        _solve_rows(item_factors, user_rows, alpha, regularization, user_factors, user_order, threads)
+        _solve_rows(user_factors, item_rows, alpha, regularization, item_factors, item_order, threads)
+        if callback:
+            callback(iteration + 1, time.time() - started)
+
+    return {
+        'user_ids': user_ids,
+        'item_ids': item_ids,
+        'user_factors': user_factors.astype(np.float32),
+        'item_factors': item_factors.astype(np.float32),
+    }
+
+
+def save_factors(model, directory=None, **params):
+    """
+    Persist a trained model as one stacked ``.npy`` matrix plus a JSON index.
+
+    The matrix file is versioned and the index is replaced atomically, so
+    workers never see a half-written model.
+    """
+    directory = directory or settings.RECOMMENDER_MODEL_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    version = str(int(time.time() * 1000))
+    filename = f'factors-{version}.npy'
+    stacked = np.vstack([model['user_factors'], model['item_factors']]).astype(np.float32)
+    tmp_path = os.path.join(directory, f'.{filename}.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, stacked)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+    meta = {
+        'version': version,
+        'filename': filename,
+        'user_ids': model['user_ids'],
+        'item_ids': model['item_ids'],
+        'factors': int(stacked.shape[1]),
+        'trained_at': time.time(),
+        'params': params,
+    }
+    tmp_meta = os.path.join(directory, f'.{META_FILENAME}.tmp')
+    with open(tmp_meta, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, os.path.join(directory, META_FILENAME))
+
+    # Remove older factor files; workers that still map them keep their view until reload
+    for name in os.listdir(directory):
+        if name.startswith('factors-') and name.endswith('.npy') and name != filename:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    return meta
+
+
+class FactorModel:
+    """
+    A memory-mapped, read-only view of a trained factor model
+    """
+
+    def __init__(self, meta, matrix):
+        self.version = meta['version']
+        self.trained_at = meta['trained_at']
+        self.factors = meta['factors']
+        self.user_index = {user_id: i for i, user_id in enumerate(meta['user_ids'])}
+        self.item_ids = np.array(meta['item_ids'], dtype=np.int64)
+        self.user_factors = matrix[:len(meta['user_ids'])]
+        self.item_factors = matrix[len(meta['user_ids']):]
+
+    def __contains__(self, user_id):
+        return user_id in self.user_index
+
+    def score(self, user_id):
+        """
+        Scores of every item for a user, as a vector aligned with ``item_ids``
+        """
+        return self.item_factors @ self.user_factors[self.user_index[user_id]]
+
+    def recommend(self, user_id, exclude=(), limit=10):
+        """
+        Return up to ``limit`` (book_id, score) pairs, best first, skipping ``exclude``
+        """
+        scores = self.score(user_id)
+        if exclude:
+            scores = scores.copy()
+            scores[np.isin(self.item_ids, list(exclude))] = -np.inf
+
+        count = min(limit, len(scores))
+        if count == 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.item_ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+# Loaded models by directory, as (index mtime, FactorModel)
+_loaded = {}
+
+
+def load_factor_model(directory=None):
+    """
+    Return the current FactorModel, or None if NumPy or a trained model is unavailable.
+
+    The model is memory-mapped once per process and reloaded when the index file changes.
+    """
+    if np is None:
+        return None
+
+    directory = directory or settings.RECOMMENDER_MODEL_DIR
+    meta_path = os.path.join(directory, META_FILENAME)
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except OSError:
+        return None
+
+    loaded = _loaded.get(directory)
+    if loaded is not None and loaded[0] == mtime:
+        return loaded[1]
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        matrix = np.load(os.path.join(directory, meta['filename']), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    model = FactorModel(meta, matrix)
+    _loaded[directory] = (mtime, model)
+    return model
@@ -7,3 +7,7 @@ class ProjectConfig(AppConfig):
     
     def ready(self):
         import project.signals  # Import signals when the app is ready
+        import project.ingestion  # Register background job handlers
+        import project.avatars
+        import project.uploads
+        import project.revoked_tokens
@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from .authentication import FilteredRefreshToken, invalidate_cached_user
 from .utils import standard_response
 
 
@@ -19,7 +20,7 @@ class TokenManager:
         Blacklist a refresh token to prevent its future use
         """
         try:
-            token = RefreshToken(token)
+            token = FilteredRefreshToken(token)
             token.blacklist()
             return True, None
         except TokenError as e:
@@ -31,7 +32,7 @@ class TokenManager:
         Validate a token without blacklisting it
         """
         try:
-            RefreshToken(token)
+            FilteredRefreshToken(token)
             return True, None
         except TokenError as e:
             return False, str(e)
@@ -85,6 +86,7 @@ def invalidate_all_tokens(request):
     
     # Get all valid tokens for user and blacklist them
     RefreshToken.for_user(user)
+    invalidate_cached_user(user.pk)
     
     # Update last_logout timestamp if UserProfile has this field
     try:
@@ -0,0 +1,91 @@
+"""
+JWT authentication with cached users, and refresh tokens checked against the
+in-memory blacklist filter of project.revoked_tokens.
+
+Kept apart from project.auth, whose views import rest_framework.views, which
+loads DEFAULT_AUTHENTICATION_CLASSES and so cannot be imported from it.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .cache_utils import invalidate_model_cache, model_cache_key
+from .revoked_tokens import revoked_tokens
+from .tiered_cache import tiered_cache
+
+# Generation counter of the cached users, bumped per user by invalidate_cached_user
+USER_AUTH_GENERATION = 'UserAuth'
+
+# The only user fields that are cached; the others are loaded on access
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def invalidate_cached_user(user_id):
+    """
+    Make the next authenticated request of a user load them from the database again
+    """
+    invalidate_model_cache(USER_AUTH_GENERATION, user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the token's user from the cache instead of querying it on every request.
+
+    Users are cached for JWT_USER_CACHE_SECONDS under their id and their token
+    generation, which is bumped when the user is saved or deleted (password
+    change, deactivation, ...) and by invalidate_all_tokens. Only CACHED_USER_FIELDS
+    (and a digest of the password hash when CHECK_REVOKE_TOKEN is on) are cached;
+    the user is rebuilt with its other fields deferred.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        cache_key = model_cache_key(USER_AUTH_GENERATION, 'jwt_user', user_id, instance_id=user_id)
+        cached = tiered_cache.get(cache_key, namespace='jwt_user')
+        if cached is None:
+            # Raises for unknown and inactive users, which are never cached
+            user = super().get_user(validated_token)
+            cached = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+            if api_settings.CHECK_REVOKE_TOKEN:
+                cached['password_digest'] = get_md5_hash_password(user.password)
+            tiered_cache.set(cache_key, cached, settings.JWT_USER_CACHE_SECONDS, namespace='jwt_user')
+            return user
+
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != cached.get('password_digest')
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        # Deferred fields are loaded on access, and save() only writes the loaded ones
+        fields = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in CACHED_USER_FIELDS]
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, fields, [cached[field] for field in fields])
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check only queries the database for probable hits
+    """
+
+    def check_blacklist(self):
+        if revoked_tokens.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class TokenVerifySerializer(jwt_serializers.TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if api_settings.BLACKLIST_AFTER_ROTATION and revoked_tokens.is_blacklisted(token.get(api_settings.JTI_CLAIM)):
+            raise ValidationError("Token is blacklisted")
+        return {}
@@ -0,0 +1,163 @@
+"""
+Profile picture normalization.
+
+Uploads are staged as-is and processed by a background job: the image is
+decoded, rotated according to its EXIF orientation, cropped to a square and
+re-encoded (without metadata) as small JPEG renditions. Files no client has
+seen are deleted right away; replaced renditions are removed FILE_CLEANUP_DELAY
+seconds later by a delayed job, once clients holding their URLs are done.
+An upload that cannot be processed is dropped, leaving the current picture.
+"""
+import os
+import uuid
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import UserProfile
+from .jobs import job_handler, enqueue, schedule_file_deletion, PermanentJobError
+
+PROCESS_PROFILE_PICTURE = 'process_profile_picture'
+
+INCOMING_DIR = 'profile_pictures/incoming'
+
+# Raised by Pillow for files that are not images or are corrupt, truncated or too large to decode
+DECODE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError)
+
+
+class ProfilePictureError(Exception):
+    """
+    An upload that cannot be used as a profile picture
+    """
+
+
+def check_profile_picture(uploaded_file):
+    """
+    Reject uploads that are too large or that do not decode completely, before they are queued
+    """
+    if uploaded_file.size > settings.PROFILE_PICTURE_MAX_UPLOAD_SIZE:
+        raise ProfilePictureError('Profile picture is too large')
+    largest = max(settings.PROFILE_PICTURE_SIZES)
+    try:
+        with Image.open(uploaded_file) as image:
+            # Same draft as rendering, so large JPEGs are decoded downscaled; load() reads every byte
+            image.draft('RGB', (largest * 2, largest * 2))
+            image.load()
+    except DECODE_ERRORS:
+        raise ProfilePictureError('Uploaded file is not a supported image')
+    finally:
+        uploaded_file.seek(0)
+
+
+def profile_picture_names(profile):
+    """
+    Every stored file of a profile's current picture
+    """
+    names = set(profile.profile_picture_renditions.values())
+    if profile.profile_picture:
+        names.add(profile.profile_picture.name)
+    return sorted(names)
+
+
+def stage_profile_picture(profile, uploaded_file):
+    """
+    Store an upload unprocessed and queue its normalization
+    """
+    ext = os.path.splitext(uploaded_file.name)[1].lower()
+    name = default_storage.save(f'{INCOMING_DIR}/{profile.user_id}-{uuid.uuid4().hex}{ext}', uploaded_file)
+
+    # A newer upload supersedes one that has not been processed yet
+    if profile.pending_profile_picture:
+        schedule_file_deletion([profile.pending_profile_picture], delay=0)
+    profile.pending_profile_picture = name
+    UserProfile.objects.filter(pk=profile.pk).update(pending_profile_picture=name)
+    enqueue(PROCESS_PROFILE_PICTURE, profile.pk, payload={'source': name})
+    return name
+
+
+def render_profile_picture(source, sizes):
+    """
+    Decode an image and return {size: JPEG bytes} of its square renditions
+    """
+    largest = max(sizes)
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale large photos while decoding
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+        square = ImageOps.fit(image, (largest, largest), Image.LANCZOS)
+
+    renditions = {}
+    for size in sorted(sizes, reverse=True):
+        rendition = square if size == largest else square.resize((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        # No exif argument, so no metadata is carried over
+        rendition.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+        renditions[size] = buffer.getvalue()
+    return renditions
+
+
+def discard_pending_picture(profile, source):
+    """
+    Give up on an upload: stop reporting it as processing and delete the staged file
+    """
+    UserProfile.objects.filter(pk=profile.pk, pending_profile_picture=source).update(pending_profile_picture='')
+    default_storage.delete(source)
+
+
+@job_handler(PROCESS_PROFILE_PICTURE)
+def process_profile_picture(job):
+    source = job.payload['source']
+    profile = UserProfile.objects.filter(pk=job.object_id).first()
+    if profile is None or profile.pending_profile_picture != source:
+        # The account is gone or a newer upload replaced this one
+        default_storage.delete(source)
+        return
+
+    try:
+        publish_profile_picture(profile, source)
+    except DECODE_ERRORS as e:
+        # A file that does not decode will not decode on a retry either
+        discard_pending_picture(profile, source)
+        raise PermanentJobError(f'Cannot decode profile picture: {e}') from e
+    except Exception:
+        if job.attempts >= settings.BACKGROUND_JOB_MAX_ATTEMPTS:
+            discard_pending_picture(profile, source)
+        raise
+
+
+def publish_profile_picture(profile, source):
+    """
+    Render a staged upload and make its renditions the profile's picture
+    """
+    sizes = settings.PROFILE_PICTURE_SIZES
+    with default_storage.open(source, 'rb') as file:
+        renditions = render_profile_picture(file, sizes)
+
+    token = uuid.uuid4().hex[:12]
+    names = {
+        str(size): default_storage.save(f'profile_pictures/{profile.user_id}-{token}-{size}.jpg', ContentFile(data))
+        for size, data in renditions.items()
+    }
+
+    old_names = profile_picture_names(profile)
+    updated = UserProfile.objects.filter(pk=profile.pk, pending_profile_picture=source).update(
+        profile_picture=names[str(max(sizes))],
+        profile_picture_renditions=names,
+        pending_profile_picture=''
+    )
+    if updated:
+        schedule_file_deletion(old_names)
+        default_storage.delete(source)
+    else:
+        # Superseded while rendering
+        for name in names.values():
+            default_storage.delete(name)
@@ -0,0 +1,127 @@
+"""
+Book payloads shared between users, with per-user fields overlaid.
+
+The serialized form of a book is the same for everyone except whether the user
+favorited it, their reading progress and their own rating. The shared part is
+cached once per book; the per-user part comes from one small cached record per
+user and is applied when the response is built, so authenticated requests hit
+the same cache entries as anonymous ones.
+"""
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from .cache_utils import generate_cache_key, get_generations, model_cache_key
+from .models import Collection, Comment, ReadingProgress, Rating
+from .serializers import BookSerializer
+from .tiered_cache import tiered_cache
+
+# Generation namespaces bumped by project.signals
+PAYLOAD_GENERATION = 'BookPayload'
+USER_STATE_GENERATION = 'UserBookState'
+
+# Counters change on every view or download; they are copied from the loaded rows instead
+LIVE_FIELDS = ('view_count', 'download_count')
+
+# Related collections read when serializing books
+BOOK_PREFETCHES = (
+    'favorites',  # Use the favorites M2M field instead of 'collections'
+    Prefetch('ratings', queryset=Rating.objects.select_related('user')),
+    Prefetch('comments', queryset=Comment.objects.select_related('user')),
+    'content',
+)
+
+
+def public_book_payloads(books, request):
+    """
+    Serialized books without per-user fields, from the cache where possible
+    """
+    books = list(books)
+    if not books:
+        return []
+    # Payloads contain absolute URLs
+    base_url = request.build_absolute_uri('/') if request else ''
+    generations = get_generations(PAYLOAD_GENERATION, *(book.pk for book in books))[1:]
+    keys = {
+        book.pk: generate_cache_key('book_payload', book.pk, base_url, f'generation_{generation}')
+        for book, generation in zip(books, generations)
+    }
+    payloads = tiered_cache.get_many(list(keys.values()), namespace='book_payload')
+
+    missing = [book for book in books if keys[book.pk] not in payloads]
+    if missing:
+        # Rows may have been loaded without their related collections; already prefetched ones are skipped
+        prefetch_related_objects(missing, *BOOK_PREFETCHES)
+        data = BookSerializer(missing, many=True, context={'request': request, 'public_only': True}).data
+        fresh = {keys[book.pk]: dict(item) for book, item in zip(missing, data)}
+        tiered_cache.set_many(fresh, settings.BOOK_PAYLOAD_CACHE_SECONDS, namespace='book_payload')
+        payloads.update(fresh)
+
+    items = []
+    for book in books:
+        item = dict(payloads[keys[book.pk]])
+        for field in LIVE_FIELDS:
+            item[field] = getattr(book, field)
+        items.append(item)
+    return items
+
+
+def get_user_book_state(user):
+    """
+    Favorites, reading progress and ratings of a user, keyed by book id; None for anonymous users
+    """
+    if not user.is_authenticated:
+        return None
+    cache_key = model_cache_key(USER_STATE_GENERATION, 'user_book_state', instance_id=user.pk)
+    state = tiered_cache.get(cache_key, namespace='user_book_state')
+    if state is None:
+        progress = ReadingProgress.objects.filter(user=user).values_list('book_id', 'current_page', 'total_pages', 'completed')
+        state = {
+            'favorites': set(Collection.objects.filter(user=user).values_list('book_id', flat=True)),
+            'progress': {
+                book_id: {'current_page': current_page, 'total_pages': total_pages, 'completed': completed}
+                for book_id, current_page, total_pages, completed in progress
+            },
+            'ratings': dict(Rating.objects.filter(user=user).values_list('book_id', 'rating')),
+        }
+        tiered_cache.set(cache_key, state, settings.USER_BOOK_STATE_CACHE_SECONDS, namespace='user_book_state')
+    return state
+
+
+def overlay_user_fields(items, state):
+    """
+    Set the per-user fields of serialized books from a user's state
+    """
+    for item in items:
+        book_id = item['id']
+        item['is_favorited'] = book_id in state['favorites']
+        item['reading_progress'] = state['progress'].get(book_id)
+        item['user_rating'] = state['ratings'].get(book_id)
+    return items
+
+
+def overlay_book_payload(data, request):
+    """
+    Apply the requesting user's fields to a cached book response (a list, a page or a single book)
+    """
+    state = get_user_book_state(request.user)
+    if state is None:
+        return data
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        overlay_user_fields(data['results'], state)
+    elif isinstance(data, list):
+        overlay_user_fields(data, state)
+    elif isinstance(data, dict) and 'id' in data:
+        overlay_user_fields([data], state)
+    return data
+
+
+def serialize_books(books, request):
+    """
+    Serialize books for a request: the shared payload plus the user's own fields
+    """
+    items = public_book_payloads(books, request)
+    # Responses cached for every user are built without anyone's fields
+    if request is not None and not getattr(request, 'public_payload', False):
+        state = get_user_book_state(request.user)
+        if state is not None:
+            overlay_user_fields(items, state)
+    return items
@@ -0,0 +1,114 @@
+"""
+Hit, miss and latency metrics of the application caches, by namespace.
+
+Every access through project.tiered_cache is counted in the worker that made
+it, under a namespace such as the cached function or view name. Counters are
+added to totals in the shared cache every CACHE_METRICS_FLUSH_INTERVAL seconds,
+so the metrics endpoint and `manage.py cache_stats` see all workers.
+"""
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+
+# Counted events; latencies are kept in microseconds so they can be incremented
+FIELDS = (
+    'hits', 'l1_hits', 'stale_hits', 'misses', 'sets', 'evictions', 'bytes',
+    'gets', 'get_us', 'set_us',
+)
+
+_counters = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _metric_key(namespace, field):
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_metrics_{namespace}_{field}"
+
+
+def _namespaces_key():
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_metrics_namespaces"
+
+
+def record(namespace, **increments):
+    """
+    Add to the counters of a namespace, e.g. ``record('popular', hits=1, get_us=120)``
+    """
+    if not settings.CACHE_METRICS_ENABLED:
+        return
+    with _lock:
+        counters = _counters[namespace or 'default']
+        for field, value in increments.items():
+            counters[field] += value
+    if time.monotonic() - _last_flush >= settings.CACHE_METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def record_get(namespace, started, hit, tier=None):
+    elapsed = int((time.perf_counter() - started) * 1_000_000)
+    record(
+        namespace,
+        gets=1,
+        get_us=elapsed,
+        hits=1 if hit else 0,
+        misses=0 if hit else 1,
+        l1_hits=1 if tier == 'l1' else 0
+    )
+
+
+def flush():
+    """
+    Add this worker's counters to the shared totals and reset them
+    """
+    global _last_flush
+    with _lock:
+        pending = {namespace: counters for namespace, counters in _counters.items() if any(counters.values())}
+        _counters.clear()
+        _last_flush = time.monotonic()
+
+    for namespace, counters in pending.items():
+        for field, value in counters.items():
+            if not value:
+                continue
+            key = _metric_key(namespace, field)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+    if pending:
+        namespaces = set(cache.get(_namespaces_key(), []))
+        if not set(pending) <= namespaces:
+            cache.set(_namespaces_key(), sorted(namespaces | set(pending)), None)
+
+
+def snapshot():
+    """
+    Totals of every namespace across workers, with derived hit ratio and mean latencies
+    """
+    flush()
+    namespaces = cache.get(_namespaces_key(), [])
+    values = cache.get_many([_metric_key(namespace, field) for namespace in namespaces for field in FIELDS])
+    totals = {}
+    for namespace in namespaces:
+        metrics = {field: values.get(_metric_key(namespace, field), 0) for field in FIELDS}
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_ratio'] = round(metrics['hits'] / lookups, 4) if lookups else None
+        metrics['avg_get_ms'] = round(metrics['get_us'] / metrics['gets'] / 1000, 3) if metrics['gets'] else None
+        metrics['avg_set_ms'] = round(metrics['set_us'] / metrics['sets'] / 1000, 3) if metrics['sets'] else None
+        metrics['avg_entry_bytes'] = metrics['bytes'] // metrics['sets'] if metrics['sets'] else None
+        totals[namespace] = metrics
+    return totals
+
+
+def reset():
+    """
+    Drop the shared totals and this worker's pending counters
+    """
+    with _lock:
+        _counters.clear()
+    namespaces = cache.get(_namespaces_key(), [])
+    cache.delete_many([_metric_key(namespace, field) for namespace in namespaces for field in FIELDS])
+    cache.delete(_namespaces_key())
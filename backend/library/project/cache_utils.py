@@ -2,9 +2,21 @@ from django.core.cache import cache
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.conf import settings
+from django.db import connection
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse
+from rest_framework.response import Response
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
+from . import cache_metrics
+from .tiered_cache import tiered_cache, local_cache
 import hashlib
+import io
 import json
+import math
+import random
+import time
 
 
 def generate_cache_key(prefix, *args, **kwargs):
@@ -32,9 +44,77 @@ def generate_cache_key(prefix, *args, **kwargs):
     return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_{hashlib.md5(key_string.encode()).hexdigest()}"
 
 
-def cache_result(timeout=None):
+def _generation_key(model_name, instance_id=None):
+    suffix = f"_{instance_id}" if instance_id is not None else ''
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_generation_{model_name}{suffix}"
+
+
+def _initial_generation():
+    # Counters that were evicted or lost restart above any value handed out before,
+    # so keys built from an older generation are never reused
+    return int(time.time() * 1000)
+
+
+def get_generations(model_name, *instance_ids):
+    """
+    Current cache generation of a model, followed by that of each given instance.
+
+    Cache keys that embed these values are invalidated by bumping a counter
+    instead of finding and deleting the keys. Counters live in the shared cache
+    and are kept in the worker's L1 for CACHE_GENERATION_L1_TIMEOUT seconds, so
+    other workers see an invalidation within that time and this one at once.
+    """
+    keys = [_generation_key(model_name)] + [_generation_key(model_name, instance_id) for instance_id in instance_ids]
+    generations = {}
+    for key in keys:
+        generation = local_cache.get(key)
+        if generation is not None:
+            generations[key] = generation
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        fetched = cache.get_many(missing)
+        for key in missing:
+            if key not in fetched:
+                cache.add(key, _initial_generation(), None)
+                fetched[key] = cache.get(key, _initial_generation())
+            local_cache.set(key, fetched[key], settings.CACHE_GENERATION_L1_TIMEOUT, namespace='generation')
+        generations.update(fetched)
+    return [generations[key] for key in keys]
+
+
+def _bump_generation(model_name, instance_id=None):
+    key = _generation_key(model_name, instance_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No counter yet; any new value invalidates keys from before it was lost
+        cache.set(key, _initial_generation() + 1, None)
+    # This worker sees its own invalidations right away
+    local_cache.delete(key)
+
+
+def model_cache_key(model_name, prefix, *args, instance_id=None, **kwargs):
+    """
+    Generate a cache key that changes whenever the model (or the instance) is invalidated
+    """
+    generations = get_generations(model_name, *([instance_id] if instance_id is not None else []))
+    return generate_cache_key(prefix, *args, f"generation_{'_'.join(map(str, generations))}", **kwargs)
+
+
+def _result_cache_key(func, model, args, kwargs):
+    if model is None:
+        return generate_cache_key(func.__name__, *args, **kwargs)
+    # Arguments that are instances of the model also tie the key to their own generation
+    instance_ids = [arg.pk for arg in args if arg.__class__.__name__ == model and getattr(arg, 'pk', None)]
+    generations = get_generations(model, *instance_ids)
+    return generate_cache_key(func.__name__, *args, f"generation_{'_'.join(map(str, generations))}", **kwargs)
+
+
+def cache_result(timeout=None, model=None):
     """
-    Decorator to cache function results
+    Decorator to cache function results.
+
+    With ``model`` (a model name), cached results are dropped by invalidate_model_cache.
     """
     if timeout is None:
         timeout = settings.CACHE_MIDDLEWARE_SECONDS
@@ -43,15 +123,15 @@ def cache_result(timeout=None):
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Generate a unique cache key
-            cache_key = generate_cache_key(func.__name__, *args, **kwargs)
+            cache_key = _result_cache_key(func, model, args, kwargs)
             
-            # Try to get the result from cache
-            result = cache.get(cache_key)
+            # Try to get the result from the local, then the shared cache
+            result = tiered_cache.get(cache_key, namespace=func.__qualname__)
             
             # If not in cache, call the function and cache the result
             if result is None:
                 result = func(*args, **kwargs)
-                cache.set(cache_key, result, timeout)
+                tiered_cache.set(cache_key, result, timeout, namespace=func.__qualname__)
                 
             return result
         return wrapper
@@ -63,31 +143,181 @@ def invalidate_cache_for(prefix, *args, **kwargs):
     Invalidate cache for a specific function and arguments
     """
     cache_key = generate_cache_key(prefix, *args, **kwargs)
-    cache.delete(cache_key)
+    # Other workers may keep their local copy for up to CACHE_L1_TIMEOUT seconds
+    tiered_cache.delete(cache_key)
 
 
 def invalidate_model_cache(model_name, instance_id=None):
     """
-    Invalidate all cache related to a specific model or instance
+    Invalidate all cache related to a specific model or instance.
+
+    Bumps the model's (or the instance's) generation counter, which works the
+    same on every cache backend and costs one increment however many keys exist.
+    """
+    _bump_generation(model_name, instance_id)
+
+
+# Headers that belong to one response and are never replayed from the cache
+UNCACHED_HEADERS = {'set-cookie', 'age', 'date'}
+
+# Recomputes stale responses after they have been served
+_refresh_executor = None
+
+# Request data that a background refresh needs to produce the same response
+DETACHED_ENVIRON = {
+    'PATH_INFO', 'SCRIPT_NAME', 'QUERY_STRING', 'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL',
+    'HTTP_HOST', 'HTTP_ACCEPT', 'HTTP_X_FORWARDED_HOST', 'HTTP_X_FORWARDED_PROTO', 'REMOTE_ADDR',
+    'wsgi.url_scheme',
+}
+
+
+def _response_entry(response, started):
+    return {
+        'status': response.status_code,
+        'content': response.content,
+        'headers': [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS],
+        'created': time.time(),
+        # Time it took to compute, which scales early expiration
+        'delta': time.time() - started,
+    }
+
+
+def _entry_response(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    response['Age'] = str(max(0, int(time.time() - entry['created'])))
+    return response
+
+
+def _compute_and_store(cache_key, compute, timeout, namespace):
+    started = time.time()
+    response = compute()
+    if response.status_code != 200:
+        return response, None
+    entry = dict(_response_entry(response, started), timeout=timeout)
+    # Kept past its freshness so it can be served while it is refreshed
+    tiered_cache.set(cache_key, entry, timeout + settings.RESPONSE_CACHE_STALE_SECONDS, namespace=namespace)
+    return response, entry
+
+
+def _refresh(cache_key, lock_key, compute, timeout, namespace):
+    try:
+        _compute_and_store(cache_key, compute, timeout, namespace)
+    finally:
+        cache.delete(lock_key)
+
+
+def _refresh_in_thread(cache_key, lock_key, compute, timeout, namespace):
+    try:
+        _refresh(cache_key, lock_key, compute, timeout, namespace)
+    except Exception:
+        # The stale entry stays until the next refresh attempt
+        pass
+    finally:
+        connection.close()
+
+
+def _detached_refresh(request):
+    """
+    A function recomputing the response to a routed ``request`` through its view,
+    with a new anonymous request and view instance.
+
+    Background refreshes run while the original request and view are still being
+    finalized on the request thread, so they must not share them.
     """
-    if instance_id:
-        # If an instance ID is provided, we can be more specific
-        pattern = f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_{model_name}_{instance_id}"
-        keys = [k for k in cache._cache.keys() if pattern in k]
-        for key in keys:
-            cache.delete(key)
-    else:
-        # Otherwise, invalidate all cache for the model
-        pattern = f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_{model_name}"
-        keys = [k for k in cache._cache.keys() if pattern in k]
-        for key in keys:
-            cache.delete(key)
+    match = request.resolver_match
+    environ = {key: value for key, value in request.META.items() if key in DETACHED_ENVIRON}
+
+    def refresh():
+        detached = WSGIRequest(dict(environ, REQUEST_METHOD='GET', **{'wsgi.input': io.BytesIO()}))
+        detached.resolver_match = match
+        detached.user = AnonymousUser()
+        # Makes the caching decorators compute the response instead of looking it up
+        detached.cache_refresh = True
+        response = match.func(detached, *match.args, **match.kwargs)
+        return response.render() if hasattr(response, 'render') else response
+    return refresh
+
+
+def _schedule_refresh(cache_key, lock_key, compute, timeout, namespace):
+    global _refresh_executor
+    if settings.BACKGROUND_JOBS_MODE == 'sync':
+        _refresh(cache_key, lock_key, compute, timeout, namespace)
+        return
+    if _refresh_executor is None:
+        _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+    _refresh_executor.submit(_refresh_in_thread, cache_key, lock_key, compute, timeout, namespace)
+
+
+def cached_response(cache_key, compute, timeout, namespace=None, refresh=None):
+    """
+    Serve a rendered response from the cache, computing it with ``compute()`` at most once at a time.
+
+    Stale entries are recomputed on another thread with ``refresh()``, which must
+    not share objects with the current request; it defaults to ``compute``.
+
+    - Fresh entries are served as is, except that each request may decide to
+      refresh early with a probability that rises as expiry approaches and with
+      the time the response takes to compute (probabilistic early expiration).
+    - Expired entries are served for up to RESPONSE_CACHE_STALE_SECONDS more
+      while a single worker recomputes them in the background.
+    - On a miss, one worker computes the response while the others wait up to
+      RESPONSE_CACHE_LOCK_WAIT seconds for it instead of computing it too, or
+      until it releases the lock without storing a response.
+    """
+    lock_key = f"{cache_key}_lock"
+    entry = tiered_cache.get(cache_key, namespace=namespace)
+    if entry is not None:
+        expires = entry['created'] + entry['timeout']
+        if time.time() >= expires:
+            cache_metrics.record(namespace, stale_hits=1)
+        beta = settings.RESPONSE_CACHE_EARLY_EXPIRATION_BETA
+        early = time.time() - entry['delta'] * beta * math.log(random.random() or 1e-12) >= expires
+        if early and cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+            _schedule_refresh(cache_key, lock_key, refresh or compute, timeout, namespace)
+        return _entry_response(entry)
+    
+    if cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        try:
+            response, entry = _compute_and_store(cache_key, compute, timeout, namespace)
+        finally:
+            cache.delete(lock_key)
+        return _entry_response(entry) if entry is not None else response
+    
+    # Another worker is computing this response; wait for it to land in the shared cache
+    deadline = time.time() + settings.RESPONSE_CACHE_LOCK_WAIT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        # Read before the entry: the holder stores the entry before releasing the lock
+        released = cache.get(lock_key) is None
+        entry = tiered_cache.shared.get(cache_key)
+        if entry is not None:
+            return _entry_response(entry)
+        if released:
+            # The response was not cacheable (or computing it failed)
+            break
+    response, entry = _compute_and_store(cache_key, compute, timeout, namespace)
+    return _entry_response(entry) if entry is not None else response
+
+
+def _response_cache_key(name, request, model, variant=''):
+    key_parts = [name, request.path, request.GET.urlencode(), variant]
+    if model is not None:
+        key_parts.append(f"generation_{get_generations(model)[0]}")
+    return generate_cache_key('response', *key_parts)
 
 
 # Method decorator for class-based views
-def cache_view_method(timeout=None):
+def cache_view_method(timeout=None, model=None, overlay=None):
     """
-    Decorator for caching class-based view methods
+    Decorator for caching the rendered responses of class-based view methods for GET requests.
+
+    With ``model`` (a model name), cached responses are dropped by invalidate_model_cache.
+
+    Responses are cached for anonymous users only, unless ``overlay(data, request)``
+    is given: then authenticated JSON requests share the anonymous entry, computed
+    with ``request.public_payload`` set, and ``overlay`` adds the user's own fields.
     """
     if timeout is None:
         timeout = settings.CACHE_MIDDLEWARE_SECONDS
@@ -95,25 +325,64 @@ def cache_view_method(timeout=None):
     def decorator(method):
         @wraps(method)
         def wrapper(self, request, *args, **kwargs):
-            # Don't cache for authenticated users with write operations
-            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            if getattr(request, 'cache_refresh', False):
+                # Background refresh of the shared entry (see _detached_refresh)
+                request.public_payload = True
+                return method(self, request, *args, **kwargs)
+            personalized = request.user.is_authenticated
+            # Don't cache write operations, views called without URL routing (which could not
+            # be refreshed), or authenticated users unless their fields can be overlaid
+            if request.method not in ('GET', 'HEAD') or request.resolver_match is None or (
+                personalized and (overlay is None or request.accepted_renderer.format != 'json')
+            ):
                 return method(self, request, *args, **kwargs)
-                
-            # Generate a cache key
-            key_parts = [
-                method.__name__,
-                request.path,
-                request.GET.urlencode()
-            ]
-            cache_key = f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_{'_'.join(key_parts)}"
             
-            # Try to get from cache
-            response = cache.get(cache_key)
+            def compute():
+                request.public_payload = True
+                # Render the response here so its bytes can be stored
+                response = self.finalize_response(request, method(self, request, *args, **kwargs), *args, **kwargs)
+                return response.render()
             
-            if response is None:
-                response = method(self, request, *args, **kwargs)
-                cache.set(cache_key, response, timeout)
-                
+            # The negotiated format is part of the key (JSON vs. browsable API)
+            cache_key = _response_cache_key(method.__name__, request, model, request.accepted_renderer.format)
+            response = cached_response(
+                cache_key, compute, timeout, namespace=method.__qualname__, refresh=_detached_refresh(request)
+            )
+            if personalized and response.status_code == 200:
+                return Response(overlay(json.loads(response.content), request))
             return response
         return wrapper
     return decorator
+
+
+def cache_view(timeout=None, model=None):
+    """
+    Decorator for caching the rendered responses of function views for anonymous GET requests.
+
+    Applied above @api_view, so it sees the plain Django request and the response DRF returns.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_MIDDLEWARE_SECONDS
+    
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Token-authenticated requests may get user-specific content
+            if (
+                request.method not in ('GET', 'HEAD')
+                or 'HTTP_AUTHORIZATION' in request.META
+                or getattr(request, 'resolver_match', None) is None
+                or getattr(request, 'cache_refresh', False)
+            ):
+                return view(request, *args, **kwargs)
+            
+            def compute():
+                response = view(request, *args, **kwargs)
+                return response.render() if hasattr(response, 'render') else response
+            
+            cache_key = _response_cache_key(view.__name__, request, model, request.META.get('HTTP_ACCEPT', ''))
+            return cached_response(
+                cache_key, compute, timeout, namespace=view.__name__, refresh=_detached_refresh(request)
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Precompressed sidecars for text ebooks.
+
+Each text ebook gets ``.gz`` (and ``.br``/``.zst`` when brotli or zstandard is
+installed) files next to it, written once at ingestion time. The read
+endpoint then serves the best variant the client accepts without
+compressing anything per request.
+"""
+import gzip
+import os
+import tempfile
+from django.conf import settings
+from .storage import SIDECAR_SUFFIXES
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _gzip_compress(source, target):
+    # mtime=0 keeps the output identical for identical input
+    with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=9, mtime=0) as compressed:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            compressed.write(chunk)
+
+
+def _brotli_compress(source, target):
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=11)
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+        target.write(compressor.process(chunk))
+    target.write(compressor.finish())
+
+
+def _zstd_compress(source, target):
+    zstandard.ZstdCompressor(level=19).copy_stream(source, target)
+
+
+def available_encodings():
+    """
+    (content coding, sidecar suffix, compress function) for every installed codec, best first
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append(('br', SIDECAR_SUFFIXES['br'], _brotli_compress))
+    if zstandard is not None:
+        encodings.append(('zstd', SIDECAR_SUFFIXES['zstd'], _zstd_compress))
+    encodings.append(('gzip', SIDECAR_SUFFIXES['gzip'], _gzip_compress))
+    return encodings
+
+
+def write_sidecars(path, force=False):
+    """
+    Write the missing compressed variants of a file, returning the encodings written.
+
+    Variants that are not smaller than the original are not kept.
+    """
+    if os.path.getsize(path) < settings.PRECOMPRESS_MIN_SIZE:
+        return []
+
+    written = []
+    for encoding, suffix, compress in available_encodings():
+        sidecar = path + suffix
+        if os.path.exists(sidecar) and not force:
+            continue
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with open(path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                compress(source, target)
+            if os.path.getsize(tmp_path) < os.path.getsize(path):
+                os.replace(tmp_path, sidecar)
+                written.append(encoding)
+            else:
+                os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return written
+
+
+def parse_accept_encoding(header):
+    """
+    Map of content coding to quality value from an Accept-Encoding header
+    """
+    qualities = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def choose_encoding(request, path):
+    """
+    Best precompressed variant of ``path`` acceptable to the client, as (encoding, suffix), or None
+    """
+    qualities = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+    best = None
+    for encoding, suffix, _ in available_encodings():
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality <= 0 or not os.path.exists(path + suffix):
+            continue
+        # Ties go to the earlier (better compressing) codec
+        if best is None or quality > best[0]:
+            best = (quality, encoding, suffix)
+    return best[1:] if best else None
@@ -0,0 +1,35 @@
+"""
+Database cache backend that is safe to share between worker processes.
+
+Django's DatabaseCache already makes add() atomic through the table's primary
+key, but its incr() is a get followed by a set: concurrent increments from
+different workers can be lost, and the set resets the entry's timeout. The
+generation counters and metrics rely on incr(), so here it locks the row with
+an UPDATE before reading it and only rewrites the value.
+"""
+import base64
+import pickle
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.db import connections, router, transaction
+
+
+class DatabaseCache(BaseDatabaseCache):
+    """
+    DatabaseCache whose incr() is atomic across processes and keeps the entry's expiry
+    """
+
+    def incr(self, key, delta=1, version=None):
+        db_key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        table = connection.ops.quote_name(self._table)
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            # A no-op write takes the row lock (the write lock on SQLite) before reading
+            cursor.execute(f'UPDATE {table} SET cache_key = cache_key WHERE cache_key = %s', [db_key])
+            value = self.get(key, self._missing_key, version=version) if cursor.rowcount else self._missing_key
+            if value is self._missing_key:
+                raise ValueError("Key '%s' not found." % key)
+            value += delta
+            pickled = base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1')
+            cursor.execute(f'UPDATE {table} SET value = %s WHERE cache_key = %s', [pickled, db_key])
+        return value
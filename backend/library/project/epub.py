@@ -0,0 +1,243 @@
+"""
+Lazy EPUB preview extraction.
+
+Only the zip central directory, the container and OPF files, the navigation
+document (or NCX) and the first spine documents are read. Documents are
+decompressed in small chunks and fed to an incremental HTML-to-text parser
+that stops as soon as the preview budget is used, so memory use does not
+depend on the size of the book or its images.
+"""
+import codecs
+import posixpath
+import zipfile
+from html.parser import HTMLParser
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+CHUNK_SIZE = 16 * 1024
+
+CONTAINER_PATH = 'META-INF/container.xml'
+
+# Elements whose content is never part of the text
+SKIPPED_TAGS = {'head', 'script', 'style', 'svg', 'math'}
+
+# Elements that start a new line of text
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'section', 'article', 'blockquote', 'pre', 'hr', 'dt', 'dd', 'figcaption',
+}
+
+
+class BudgetReached(Exception):
+    pass
+
+
+class TextStripper(HTMLParser):
+    """
+    Incremental HTML-to-text converter that raises BudgetReached once ``budget`` characters are collected
+    """
+
+    def __init__(self, budget):
+        super().__init__(convert_charrefs=True)
+        self.budget = budget
+        self.parts = []
+        self.length = 0
+        self.skip_depth = 0
+
+    def _append(self, text):
+        remaining = self.budget - self.length
+        if len(text) >= remaining:
+            self.parts.append(text[:remaining])
+            self.length = self.budget
+            raise BudgetReached()
+        self.parts.append(text)
+        self.length += len(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS and not self.skip_depth:
+            self.newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS and not self.skip_depth:
+            self.newline()
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS and not self.skip_depth:
+            self.newline()
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        text = ' '.join(data.split())
+        if not text:
+            return
+        if self.parts and not self.parts[-1].endswith(('\n', ' ')):
+            text = ' ' + text
+        self._append(text)
+
+    def newline(self):
+        if self.parts and not self.parts[-1].endswith('\n'):
+            self._append('\n')
+
+    def text(self):
+        return ''.join(self.parts).strip()
+
+
+class NavParser(HTMLParser):
+    """
+    Collects link titles from the table of contents <nav> of an EPUB 3 navigation document
+    """
+
+    def __init__(self, limit):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.entries = []
+        self.nav_depth = 0
+        self.in_toc = False
+        self.link_text = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'nav':
+            self.nav_depth += 1
+            if 'toc' in (attrs.get('epub:type') or '').split() or attrs.get('role') == 'doc-toc':
+                self.in_toc = True
+                self.toc_depth = self.nav_depth
+        elif tag == 'a' and self.in_toc:
+            self.link_text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'nav':
+            if self.in_toc and self.nav_depth == self.toc_depth:
+                self.in_toc = False
+            self.nav_depth -= 1
+        elif tag == 'a' and self.link_text is not None:
+            title = ' '.join(''.join(self.link_text).split())
+            self.link_text = None
+            if title:
+                self.entries.append(title)
+                if len(self.entries) >= self.limit:
+                    raise BudgetReached()
+
+    def handle_data(self, data):
+        if self.link_text is not None:
+            self.link_text.append(data)
+
+
+def _feed(archive, name, parser):
+    """
+    Stream a member of the archive through a parser until it ends or the parser's budget is reached
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    try:
+        with archive.open(name) as member:
+            for chunk in iter(lambda: member.read(CHUNK_SIZE), b''):
+                parser.feed(decoder.decode(chunk))
+            parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+        # Separate the text of consecutive documents
+        if isinstance(parser, TextStripper):
+            parser.newline()
+    except BudgetReached:
+        pass
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _resolve(base_dir, href):
+    return posixpath.normpath(posixpath.join(base_dir, unquote(href.split('#', 1)[0])))
+
+
+def _read_package(archive):
+    """
+    Parse container.xml and the OPF into (manifest, spine ids, nav path, ncx path)
+    """
+    container = ElementTree.fromstring(archive.read(CONTAINER_PATH))
+    rootfile = next(element for element in container.iter() if _local_name(element.tag) == 'rootfile')
+    opf_path = rootfile.get('full-path')
+    opf_dir = posixpath.dirname(opf_path)
+    package = ElementTree.fromstring(archive.read(opf_path))
+
+    manifest = {}
+    nav_path = ncx_path = None
+    spine_ids = []
+    toc_id = None
+    for element in package.iter():
+        tag = _local_name(element.tag)
+        if tag == 'item':
+            path = _resolve(opf_dir, element.get('href', ''))
+            manifest[element.get('id')] = path
+            if 'nav' in (element.get('properties') or '').split():
+                nav_path = path
+            if element.get('media-type') == 'application/x-dtbncx+xml':
+                ncx_path = path
+        elif tag == 'spine':
+            toc_id = element.get('toc')
+        elif tag == 'itemref' and element.get('linear', 'yes') != 'no':
+            spine_ids.append(element.get('idref'))
+
+    if toc_id in manifest:
+        ncx_path = manifest[toc_id]
+    return manifest, spine_ids, nav_path, ncx_path
+
+
+def _ncx_entries(archive, ncx_path, limit):
+    entries = []
+    in_label = False
+    with archive.open(ncx_path) as ncx:
+        for event, element in ElementTree.iterparse(ncx, events=('start', 'end')):
+            tag = _local_name(element.tag)
+            if tag == 'navLabel':
+                in_label = event == 'start'
+            elif event == 'end':
+                if tag == 'text' and in_label:
+                    title = ' '.join((element.text or '').split())
+                    if title:
+                        entries.append(title)
+                        if len(entries) >= limit:
+                            break
+                # Drop parsed elements so large NCX files stay cheap
+                element.clear()
+    return entries
+
+
+def extract_epub_preview(path, text_limit, toc_limit, spine_items=2):
+    """
+    Preview text of the first spine documents and table of contents of an EPUB
+    """
+    with zipfile.ZipFile(path) as archive:
+        manifest, spine_ids, nav_path, ncx_path = _read_package(archive)
+        names = set(archive.namelist())
+
+        toc = []
+        if nav_path in names:
+            parser = NavParser(toc_limit)
+            _feed(archive, nav_path, parser)
+            toc = parser.entries
+        if not toc and ncx_path in names:
+            toc = _ncx_entries(archive, ncx_path, toc_limit)
+
+        stripper = TextStripper(text_limit)
+        truncated = False
+        documents = [manifest[idref] for idref in spine_ids if manifest.get(idref) in names]
+        for document in documents[:spine_items]:
+            _feed(archive, document, stripper)
+            if stripper.length >= text_limit:
+                truncated = True
+                break
+
+    preview_text = stripper.text()
+    if truncated or len(documents) > spine_items:
+        preview_text += '...'
+    return {
+        'preview_text': preview_text,
+        'table_of_contents': toc,
+        'total_pages': None,
+        'preview_type': 'text',
+    }
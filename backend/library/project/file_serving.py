@@ -0,0 +1,308 @@
+import hashlib
+import os
+import secrets
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from django.utils.text import slugify
+from .storage import blob_digest
+
+# Content types for the ebook formats we know about; anything else is served as binary
+EBOOK_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'txt': 'text/plain',
+    'text': 'text/plain',
+    'epub': 'application/octet-stream',
+    'mobi': 'application/octet-stream',
+}
+
+# Requests asking for more ranges than this get the whole file instead
+MAX_RANGES = 16
+
+
+def file_extension(name):
+    return name.split('.')[-1].lower() if name and '.' in name else ''
+
+
+def ebook_content_type(name):
+    """
+    Determine the content type of an ebook from its file extension
+    """
+    return EBOOK_CONTENT_TYPES.get(file_extension(name), 'application/octet-stream')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Hash a file in fixed-size chunks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_ebook_hash(book):
+    """
+    Return the stored content hash of a book's ebook, computing it if missing
+    """
+    if not book.ebook_hash and book.ebook:
+        # Content-addressed files carry their digest in the name
+        book.ebook_hash = blob_digest(book.ebook.name) or file_sha256(book.ebook.path)
+        # Update only the hash so updated_at keeps tracking metadata changes
+        type(book).objects.filter(pk=book.pk).update(ebook_hash=book.ebook_hash)
+    return book.ebook_hash
+
+
+def ebook_filename(book):
+    """
+    Download name of a book's ebook, since stored files are named by their digest
+    """
+    ext = file_extension(book.ebook.name)
+    name = slugify(book.title or '') or f'book-{book.pk}'
+    return f'{name}.{ext}' if ext else name
+
+
+def ebook_validators(book, encoding=None):
+    """
+    Strong ETag (from the stored content hash) and Last-Modified timestamp of a book's ebook.
+
+    Each precompressed variant (``encoding``) gets its own ETag.
+    """
+    etag = ensure_ebook_hash(book)
+    etag = quote_etag(f'{etag}-{encoding}' if encoding else etag)
+    try:
+        last_modified = os.stat(book.ebook.path).st_mtime
+    except OSError:
+        last_modified = book.updated_at.timestamp()
+    return etag, last_modified
+
+
+def file_validators(field_file):
+    """
+    ETag and Last-Modified of a stored file from its size and mtime, without opening it
+    """
+    stat = os.stat(field_file.path)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', stat.st_mtime
+
+
+def not_modified_response(request, etag=None, last_modified=None):
+    """
+    Evaluate If-None-Match/If-Modified-Since (and If-Match/If-Unmodified-Since).
+
+    Returns a 304 or 412 response when a precondition short-circuits the
+    request, or None when the full response should be produced.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified) if last_modified is not None else None
+    )
+    if response is not None:
+        if etag:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def parse_range_header(header, size):
+    """
+    Parse a `Range: bytes=...` header against a file of ``size`` bytes.
+
+    Returns a sorted list of non-overlapping inclusive (start, end) ranges,
+    an empty list if no range is satisfiable, or None if the header is absent
+    or malformed (in which case the whole file should be sent).
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+
+    ranges = []
+    for part in header[len('bytes='):].split(','):
+        part = part.strip()
+        if '-' not in part:
+            return None
+        start, end = (value.strip() for value in part.split('-', 1))
+        try:
+            if not start:
+                # Suffix range: the last N bytes
+                if not end:
+                    return None
+                length = int(end)
+                if length > 0 and size > 0:
+                    ranges.append((max(0, size - length), size - 1))
+                continue
+            first = int(start)
+            last = int(end) if end else None
+        except ValueError:
+            return None
+        if first < 0 or (last is not None and last < first):
+            return None
+        if last is None:
+            last = size - 1
+        if first < size:
+            ranges.append((first, min(last, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Coalesce overlapping or adjacent ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, etag, last_modified):
+    """
+    Whether the If-Range precondition (if any) still holds for the current file
+    """
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        # Only strong validators can be used with If-Range
+        return etag is not None and value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and last_modified is not None and date == int(last_modified)
+
+
+def is_range_continuation(request):
+    """
+    Whether the request asks for a part of the file other than its beginning,
+    e.g. a resumed download or a reader fetching a later page.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    return header.startswith('bytes=') and not header[len('bytes='):].strip().startswith('0-')
+
+
+def _read_ranges(path, ranges, chunk_size, parts=None):
+    """
+    Yield the requested byte ranges of a file, seeking to each one.
+
+    If ``parts`` is given, each range is preceded by its multipart header and
+    the multipart trailer is yielded at the end.
+    """
+    with open(path, 'rb') as f:
+        for index, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+            if parts:
+                yield b'\r\n'
+        if parts:
+            yield parts[-1]
+
+
+def serve_file(request, field_file, content_type=None, as_attachment=False, filename=None, etag=None, variant=None,
+               last_modified=None):
+    """
+    Build a response that delivers a stored file without loading it into memory.
+
+    Depending on FILE_SERVE_MODE the file is streamed from the worker in
+    FILE_STREAM_CHUNK_SIZE blocks ('django'), or the transfer is handed to the
+    front proxy with an X-Accel-Redirect ('x-accel-redirect') or X-Sendfile
+    ('x-sendfile') header. Permission checks and counters stay in the view.
+
+    In 'django' mode single and multiple byte ranges are answered with
+    206 Partial Content; the proxies handle ranges themselves.
+
+    ``variant`` is an (encoding, suffix) pair naming a precompressed sidecar to
+    send instead of the file, with a matching Content-Encoding ('django' mode only).
+
+    ``etag`` and ``last_modified`` are the validators the view checked the
+    request against; they are sent in every mode and used for If-Range, so a
+    client's validators always match what it received. ``last_modified``
+    defaults to the mtime of the file sent.
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or 'application/octet-stream'
+    mode = settings.FILE_SERVE_MODE
+
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.FILE_ACCEL_REDIRECT_PREFIX + quote(field_file.name)
+        else:
+            response['X-Sendfile'] = field_file.path
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        if last_modified is None:
+            last_modified = os.stat(field_file.path).st_mtime
+        response['Last-Modified'] = http_date(last_modified)
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    encoding, suffix = variant or (None, '')
+    path = field_file.path + suffix
+    stat = os.stat(path)
+    size = stat.st_size
+    if last_modified is None:
+        last_modified = stat.st_mtime
+
+    ranges = None
+    # Ranges of an encoded variant are not supported; it is always sent whole
+    if not encoding and request.method in ('GET', 'HEAD') and if_range_matches(request, etag, last_modified):
+        ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+    if ranges is None or ranges == [(0, size - 1)]:
+        response = FileResponse(
+            open(path, 'rb'),
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename
+        )
+        response.block_size = settings.FILE_STREAM_CHUNK_SIZE
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            _read_ranges(path, ranges, settings.FILE_STREAM_CHUNK_SIZE),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    else:
+        boundary = secrets.token_hex(16)
+        parts = [
+            (
+                f'--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+            ).encode()
+            for start, end in ranges
+        ]
+        parts.append(f'--{boundary}--\r\n'.encode())
+        length = sum(len(part) for part in parts) + sum(end - start + 1 + 2 for start, end in ranges)
+        response = StreamingHttpResponse(
+            _read_ranges(path, ranges, settings.FILE_STREAM_CHUNK_SIZE, parts),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}'
+        )
+        response['Content-Length'] = str(length)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    else:
+        response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response['ETag'] = etag
+    return response
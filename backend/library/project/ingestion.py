@@ -0,0 +1,183 @@
+"""
+Ebook ingestion pipeline, run as a background job after a book's file is uploaded.
+
+Every stage is idempotent: it checks whether its output is already current for
+the book's content hash and does nothing if so, so a job can be retried or
+re-queued safely.
+"""
+from django.conf import settings
+from .models import Book, BookContent, BookSearchIndex, BackgroundJob, ReadingProgress
+from .file_serving import file_sha256, file_extension
+from .storage import blob_digest
+from .previews import get_book_preview, PREVIEW_EXTENSIONS
+from .text_pages import get_page_offsets, TEXT_EXTENSIONS
+from .compression import write_sidecars
+from .thumbnails import render_thumbnails
+from .jobs import job_handler, enqueue, run_stages, job_status
+from .cache_utils import invalidate_model_cache
+
+INGEST_BOOK = 'ingest_book'
+
+# How much of the extracted text goes into the search document
+SEARCH_INDEX_TEXT_LIMIT = 20000
+
+
+def enqueue_ingestion(book):
+    return enqueue(INGEST_BOOK, book.pk)
+
+
+def ingestion_status(book):
+    """
+    Status of the most recent ingestion job of a book, or None if it was never queued
+    """
+    job = BackgroundJob.objects.filter(kind=INGEST_BOOK, object_id=book.pk).order_by('-id').first()
+    return job_status(job) if job is not None else None
+
+
+def hash_stage(book):
+    if not book.ebook_hash:
+        book.ebook_hash = blob_digest(book.ebook.name) or file_sha256(book.ebook.path)
+        Book.objects.filter(pk=book.pk).update(ebook_hash=book.ebook_hash)
+
+
+def count_pages(book):
+    """
+    Number of pages of a PDF, or of a text file as split by its page index
+    """
+    file_ext = file_extension(book.ebook.name)
+    if file_ext == 'pdf':
+        from PyPDF2 import PdfReader
+        return len(PdfReader(book.ebook.path).pages)
+    if file_ext in TEXT_EXTENSIONS:
+        # Also stores the page index used by paged reading
+        return len(get_page_offsets(book)) - 1
+    return None
+
+
+def pages_stage(book):
+    if book.page_count is None:
+        book.page_count = count_pages(book)
+        if book.page_count is None:
+            return
+        Book.objects.filter(pk=book.pk).update(page_count=book.page_count)
+    # Reading progress created before the page count was known
+    ReadingProgress.objects.filter(book=book).exclude(total_pages=book.page_count).update(total_pages=book.page_count)
+
+
+def extract_text(book, limit):
+    """
+    About the first ``limit`` characters of an ebook's text, or None for formats without extractable text
+    """
+    file_ext = file_extension(book.ebook.name)
+    if file_ext == 'pdf':
+        from PyPDF2 import PdfReader
+        reader = PdfReader(book.ebook.path)
+        pages = []
+        length = 0
+        for page in reader.pages:
+            if length >= limit:
+                break
+            pages.append(page.extract_text() or '')
+            length += len(pages[-1])
+        return '\n\n'.join(pages)[:limit]
+    if file_ext in TEXT_EXTENSIONS:
+        with open(book.ebook.path, 'rb') as file:
+            # Up to 4 bytes per character
+            return file.read(limit * 4).decode('utf-8', errors='replace')[:limit]
+    return None
+
+
+def text_stage(book):
+    # The text only feeds the search document; it is kept out of BookContent,
+    # which is nested in every serialized book
+    if BookSearchIndex.objects.filter(book=book, source_hash=book.ebook_hash).exists():
+        return
+    text = extract_text(book, SEARCH_INDEX_TEXT_LIMIT)
+    BookSearchIndex.objects.update_or_create(
+        book=book,
+        defaults={'text': text or '', 'source_hash': book.ebook_hash}
+    )
+
+
+def compress_stage(book):
+    # Precompressed variants served by the read endpoint
+    if file_extension(book.ebook.name) in TEXT_EXTENSIONS:
+        write_sidecars(book.ebook.path)
+
+
+def preview_stage(book):
+    # Builds the table of contents together with the preview text
+    if file_extension(book.ebook.name) in PREVIEW_EXTENSIONS:
+        get_book_preview(book)
+
+
+def thumbnails_stage(book):
+    if not book.image:
+        if book.thumbnails:
+            Book.objects.filter(pk=book.pk).update(thumbnails={})
+            invalidate_model_cache('BookPayload', book.pk)
+        return
+    storage = book.image.storage
+    sizes = render_thumbnails(
+        storage.location,
+        book.image.name,
+        settings.COVER_THUMBNAIL_WIDTHS,
+        settings.COVER_THUMBNAIL_FORMATS
+    )
+    thumbnails = {'source': book.image.name, 'sizes': sizes}
+    if thumbnails != book.thumbnails:
+        book.thumbnails = thumbnails
+        Book.objects.filter(pk=book.pk).update(thumbnails=thumbnails)
+        invalidate_model_cache('BookPayload', book.pk)
+
+
+def build_search_document(book):
+    parts = [book.title, book.author, book.description, book.isbn, book.category]
+    preview = getattr(book, 'preview', None)
+    if preview is not None:
+        parts.extend(preview.table_of_contents)
+    # Content written by the uploader is preferred over the extracted text
+    content = BookContent.objects.filter(book=book).values_list('content', flat=True).first()
+    if not content:
+        content = BookSearchIndex.objects.filter(book=book).values_list('text', flat=True).first()
+    if content:
+        parts.append(content[:SEARCH_INDEX_TEXT_LIMIT])
+    return ' '.join(' '.join(str(part).split()) for part in parts if part).lower()
+
+
+def index_stage(book):
+    # Always rebuilt, since metadata edits change the document without changing the file
+    book = Book.objects.select_related('preview').get(pk=book.pk)
+    document = build_search_document(book)
+    previous = BookSearchIndex.objects.filter(book=book).values_list('document', flat=True).first()
+    if document == previous:
+        return
+    BookSearchIndex.objects.update_or_create(book=book, defaults={'document': document})
+    # Cached search responses are keyed by the Book generation
+    invalidate_model_cache('Book')
+
+
+INGESTION_STAGES = [
+    ('hash', hash_stage),
+    ('pages', pages_stage),
+    ('text', text_stage),
+    ('compress', compress_stage),
+    ('preview', preview_stage),
+    ('thumbnails', thumbnails_stage),
+    ('index', index_stage),
+]
+
+# Books without an ebook still get cover thumbnails and a search document
+COVER_STAGES = [
+    ('thumbnails', thumbnails_stage),
+    ('index', index_stage),
+]
+
+
+@job_handler(INGEST_BOOK)
+def ingest_book(job):
+    book = Book.objects.filter(pk=job.object_id).first()
+    if book is None:
+        # Deleted since it was queued
+        return
+    run_stages(job, INGESTION_STAGES if book.ebook else COVER_STAGES, book)
@@ -0,0 +1,289 @@
+"""
+A small database-backed job queue.
+
+Jobs are BackgroundJob rows; handlers are registered per job kind with
+@job_handler. Workers claim a job with a conditional UPDATE, so several
+processes can drain the queue at once without an external broker.
+
+Jobs due now are dispatched when the enqueuing transaction commits. Delayed
+jobs and retries are dispatched by a scheduler thread in each web process
+(started from wsgi.py), which wakes up at the next due job and at least every
+BACKGROUND_JOB_POLL_INTERVAL seconds to see jobs queued by other processes.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import BackgroundJob
+from . import worker
+
+logger = logging.getLogger(__name__)
+
+# Job handlers by kind; each is called with the BackgroundJob being run
+JOB_HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a handler for a failure that retrying cannot fix; the job fails right away
+    """
+
+
+def job_handler(kind):
+    """
+    Register a function as the handler of a job kind
+    """
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, object_id=None, payload=None, delay=0):
+    """
+    Queue a job and dispatch it once the current transaction commits.
+
+    A job that is still pending for the same kind and object is reused and
+    restarted from its first stage instead of queueing a duplicate.
+    """
+    run_after = timezone.now() + timedelta(seconds=delay)
+    job = None
+    if object_id is not None:
+        job = BackgroundJob.objects.filter(kind=kind, object_id=object_id, status='pending').first()
+    if job is not None:
+        job.payload = payload or {}
+        job.completed_stages = []
+        job.run_after = run_after
+        job.save(update_fields=['payload', 'completed_stages', 'run_after', 'updated_at'])
+    else:
+        job = BackgroundJob.objects.create(kind=kind, object_id=object_id, payload=payload or {}, run_after=run_after)
+
+    if not delay:
+        transaction.on_commit(dispatch)
+    else:
+        # Let the scheduler (if running in this process) wait for the new due time
+        transaction.on_commit(_wakeup.set)
+    return job
+
+
+_executor = None
+# Set in pool worker processes, which drain the queue themselves and never dispatch
+_in_worker = False
+
+
+def mark_worker_process():
+    global _in_worker
+    _in_worker = True
+
+
+def get_executor():
+    """
+    The per-process pool used to run jobs, created on first use
+    """
+    global _executor
+    if _executor is None:
+        # Spawned workers start with fresh database connections instead of inheriting ours
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.BACKGROUND_JOB_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=worker.init_worker,
+            initargs=(settings.SETTINGS_MODULE,)
+        )
+    return _executor
+
+
+def dispatch():
+    """
+    Start working on due jobs according to BACKGROUND_JOBS_MODE
+    """
+    global _executor
+    mode = settings.BACKGROUND_JOBS_MODE
+    if _in_worker:
+        # The worker's drain loop picks up jobs queued by the job it is running
+        return
+    if mode == 'sync':
+        run_pending()
+    elif mode == 'pool':
+        try:
+            get_executor().submit(worker.drain)
+        except Exception:
+            # A broken pool is replaced on the next dispatch; the job stays queued
+            logger.exception('Could not dispatch background jobs')
+            _executor = None
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def next_due_in():
+    """
+    Seconds until the earliest pending job is due (negative if overdue), or None if there is none
+    """
+    run_after = BackgroundJob.objects.filter(status='pending').order_by('run_after').values_list(
+        'run_after', flat=True
+    ).first()
+    return (run_after - timezone.now()).total_seconds() if run_after is not None else None
+
+
+def _run_scheduler():
+    while True:
+        wait = settings.BACKGROUND_JOB_POLL_INTERVAL
+        try:
+            due_in = next_due_in()
+            if due_in is not None and due_in <= 0:
+                dispatch()
+            elif due_in is not None:
+                wait = min(wait, due_in)
+        except Exception:
+            logger.exception('Could not schedule background jobs')
+        finally:
+            # The thread's own database connection
+            connection.close()
+        _wakeup.wait(wait)
+        _wakeup.clear()
+
+
+def start_scheduler():
+    """
+    Start the thread that dispatches delayed and retried jobs once they are due ('pool' and 'sync' modes)
+    """
+    global _scheduler
+    if settings.BACKGROUND_JOBS_MODE not in ('pool', 'sync') or _in_worker:
+        return
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_run_scheduler, name='job-scheduler', daemon=True)
+            _scheduler.start()
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs whose worker disappeared mid-run to the queue
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.BACKGROUND_JOB_TIMEOUT)
+    return BackgroundJob.objects.filter(status='running', started_at__lt=cutoff).update(status='pending')
+
+
+def claim_next_job(kinds=None):
+    """
+    Atomically mark the oldest due job as running and return it, or None if there is none
+    """
+    while True:
+        due = BackgroundJob.objects.filter(status='pending', run_after__lte=timezone.now())
+        if kinds:
+            due = due.filter(kind__in=kinds)
+        candidates = list(due.order_by('run_after', 'id').values_list('id', flat=True)[:10])
+        if not candidates:
+            return None
+        for job_id in candidates:
+            claimed = BackgroundJob.objects.filter(pk=job_id, status='pending').update(
+                status='running',
+                attempts=F('attempts') + 1,
+                started_at=timezone.now()
+            )
+            if claimed:
+                return BackgroundJob.objects.get(pk=job_id)
+
+
+def run_job(job):
+    """
+    Run a claimed job, recording success, a retry or a final failure
+    """
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+        handler(job)
+    except Exception as e:
+        logger.exception('Background job %s failed', job.pk)
+        retry = not isinstance(e, PermanentJobError) and job.attempts < settings.BACKGROUND_JOB_MAX_ATTEMPTS
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='pending' if retry else 'failed',
+            error=str(e),
+            run_after=timezone.now() + timedelta(seconds=settings.BACKGROUND_JOB_RETRY_DELAY * job.attempts),
+            finished_at=None if retry else timezone.now()
+        )
+        return False
+
+    BackgroundJob.objects.filter(pk=job.pk).update(status='done', stage='', error='', finished_at=timezone.now())
+    return True
+
+
+def run_pending(limit=None, kinds=None):
+    """
+    Run due jobs one after another until none are left (or ``limit`` jobs ran).
+
+    Returns the number of jobs run.
+    """
+    requeue_stale_jobs()
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job(kinds)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def run_stages(job, stages, *args):
+    """
+    Run a job's named stages in order, skipping those a previous attempt completed.
+
+    Progress is saved after every stage so that status can be queried while the job runs.
+    """
+    for name, stage in stages:
+        if name in job.completed_stages:
+            continue
+        job.stage = name
+        BackgroundJob.objects.filter(pk=job.pk).update(stage=name)
+        stage(*args)
+        job.completed_stages.append(name)
+        BackgroundJob.objects.filter(pk=job.pk).update(completed_stages=job.completed_stages)
+
+
+def job_status(job):
+    """
+    Serializable status of a job
+    """
+    return {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'stage': job.stage,
+        'completed_stages': job.completed_stages,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
+
+
+DELETE_FILES = 'delete_files'
+
+
+def schedule_file_deletion(names, delay=None):
+    """
+    Delete stored files later, off the request path.
+
+    The delay (FILE_CLEANUP_DELAY by default) lets clients that still hold the
+    old URLs finish loading them.
+    """
+    names = [name for name in names if name]
+    if names:
+        enqueue(DELETE_FILES, payload={'names': names}, delay=settings.FILE_CLEANUP_DELAY if delay is None else delay)
+
+
+@job_handler(DELETE_FILES)
+def delete_files(job):
+    for name in job.payload.get('names', []):
+        default_storage.delete(name)
@@ -0,0 +1,440 @@
+import copy
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from project.models import Book, Rating, ReadingProgress, Collection
+from project import als
+from project.tiered_cache import local_cache
+from project.recommendations import (
+    heuristic_recommendations, compute_recommendations, popular_books_queryset, similar_book_ids
+)
+
+STRATEGIES = ['heuristic', 'als', 'popular', 'similar_books']
+INTERACTION_MODELS = {'rating': Rating, 'progress': ReadingProgress, 'collection': Collection}
+
+# Connection alias of the throwaway database the benchmark runs on
+BENCHMARK_DATABASE = 'benchmark'
+
+
+def percentile(values, pct):
+    """
+    Linearly interpolated percentile of a list of numbers
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class BenchmarkRouter:
+    """
+    Send every query to the benchmark database
+    """
+
+    def db_for_read(self, model, **hints):
+        return BENCHMARK_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return BENCHMARK_DATABASE
+
+
+@contextmanager
+def isolated_database():
+    """
+    Route all queries to a new, migrated database (created like a test database) and
+    use a private cache, so live rows, table locks and the shared cache are never touched
+    """
+    settings_dict = copy.deepcopy(connections[DEFAULT_DB_ALIAS].settings_dict)
+    # SQLite gets a temporary file; other engines a database named after the live one
+    if settings_dict['ENGINE'].endswith('sqlite3'):
+        test_name = os.path.join(tempfile.gettempdir(), f'kremlib-benchmark-{os.getpid()}.sqlite3')
+    else:
+        test_name = f'benchmark_{settings_dict["NAME"]}'
+    settings_dict['TEST'] = dict(settings_dict['TEST'], NAME=test_name)
+    connections.settings[BENCHMARK_DATABASE] = settings_dict
+    benchmark = connections[BENCHMARK_DATABASE]
+    with override_settings(
+        DATABASE_ROUTERS=[BenchmarkRouter()],
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+    ):
+        old_name = benchmark.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        local_cache.clear()
+        try:
+            yield benchmark
+        finally:
+            local_cache.clear()
+            benchmark.creation.destroy_test_db(old_name, verbosity=0)
+            del connections[BENCHMARK_DATABASE]
+            del connections.settings[BENCHMARK_DATABASE]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark recommendation quality (precision/recall@k, coverage) and latency '
+        'on a time-based train/test split of a synthetic (default) or saved dataset. '
+        'Runs on a throwaway database created like a test database; live data is never queried or modified.'
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--generate', action='store_true', help='Generate a synthetic interaction dataset (default)')
+        source.add_argument('--dataset', help='Load an interaction dataset from a JSON file')
+        source.add_argument(
+            '--export-dataset',
+            help='Write the live interactions as a dataset JSON file and exit, to benchmark them with --dataset elsewhere'
+        )
+        parser.add_argument('--save-dataset', help='Write the generated dataset to a JSON file for reuse')
+        parser.add_argument('--users', type=int, default=200, help='Synthetic users to generate')
+        parser.add_argument('--books', type=int, default=500, help='Synthetic books to generate')
+        parser.add_argument('--interactions', type=int, default=5000, help='Synthetic interactions to generate')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--test-fraction', type=float, default=0.2, help='Most recent share of interactions held out')
+        parser.add_argument('-k', type=int, default=10, help='Cut-off for precision and recall')
+        parser.add_argument('--max-users', type=int, default=None, help='Evaluate at most this many test users')
+        parser.add_argument('--strategies', default=','.join(STRATEGIES), help='Comma-separated strategies to run')
+        parser.add_argument('--factors', type=int, default=32)
+        parser.add_argument('--iterations', type=int, default=15)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        strategies = [name.strip() for name in options['strategies'].split(',') if name.strip()]
+        unknown = set(strategies) - set(STRATEGIES)
+        if unknown:
+            raise CommandError(f'Unknown strategies: {", ".join(sorted(unknown))}')
+        if not 0 < options['test_fraction'] < 1:
+            raise CommandError('--test-fraction must be between 0 and 1')
+
+        if options['export_dataset']:
+            dataset = self.export_dataset()
+            with open(options['export_dataset'], 'w') as f:
+                json.dump(dataset, f)
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(dataset["interactions"])} interactions written to {options["export_dataset"]}'
+            ))
+            return
+
+        random.seed(options['seed'])
+        with isolated_database() as benchmark:
+            self.connection = benchmark
+            results = self.run(strategies, options)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def run(self, strategies, options):
+        if options['dataset']:
+            with open(options['dataset']) as f:
+                dataset = json.load(f)
+        else:
+            dataset = self.generate_dataset(options)
+            if options['save_dataset']:
+                with open(options['save_dataset'], 'w') as f:
+                    json.dump(dataset, f)
+        # Test interactions are only held out in memory, never inserted
+        train, test = self.split(dataset['interactions'], options['test_fraction'])
+        self.load_dataset(dataset, train)
+        train = self.collect_interactions()
+
+        relevant = self.relevant_items(train, test)
+        test_users = sorted(relevant)
+        if options['max_users']:
+            test_users = test_users[:options['max_users']]
+        if not test_users:
+            raise CommandError('No users with both train and test interactions')
+
+        catalog_size = Book.objects.filter(is_public=True).count()
+        self.stdout.write(
+            f'{len(train)} train / {len(test)} test interactions, '
+            f'{len(test_users)} evaluated users, {catalog_size} public books'
+        )
+
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'git_commit': git_commit(),
+            'params': {
+                'k': options['k'],
+                'test_fraction': options['test_fraction'],
+                'seed': options['seed'],
+                'source': 'dataset' if options['dataset'] else 'generated',
+            },
+            'dataset': {
+                'train_interactions': len(train),
+                'test_interactions': len(test),
+                'evaluated_users': len(test_users),
+                'catalog_size': catalog_size,
+            },
+            'strategies': {},
+        }
+
+        model_dir = None
+        try:
+            for name in strategies:
+                recommender = self.build_recommender(name, train, options)
+                if recommender is None:
+                    continue
+                if name == 'als':
+                    recommender, model_dir = recommender
+                results['strategies'][name] = self.evaluate(
+                    name, recommender, test_users, relevant, catalog_size, options['k']
+                )
+        finally:
+            if model_dir:
+                shutil.rmtree(model_dir, ignore_errors=True)
+
+        return results
+
+    def generate_dataset(self, options):
+        """
+        Synthetic users with category tastes over a catalog with skewed popularity
+        """
+        categories = [choice for choice, _ in Book.CATEGORY_CHOICES]
+        books = []
+        for i in range(options['books']):
+            books.append({
+                'id': i,
+                'title': f'Benchmark Book {i}',
+                'author': f'Author {i % max(1, options["books"] // 4)}',
+                'category': random.choice(categories),
+            })
+        by_category = defaultdict(list)
+        for book in books:
+            by_category[book['category']].append(book['id'])
+
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        interactions = []
+        seen = set()
+        tastes = {user: random.sample(categories, 2) for user in range(options['users'])}
+        attempts = 0
+        while len(interactions) < options['interactions'] and attempts < options['interactions'] * 10:
+            attempts += 1
+            user = random.randrange(options['users'])
+            liked = random.random() < 0.8
+            pool = by_category[random.choice(tastes[user])] if liked else None
+            if not pool:
+                pool = range(len(books))
+            # Zipf-like skew towards the first books of each pool
+            book = pool[min(int(random.paretovariate(1.2)) - 1, len(pool) - 1)]
+            kind = random.choice(list(INTERACTION_MODELS))
+            if (user, book, kind) in seen:
+                continue
+            seen.add((user, book, kind))
+            interactions.append({
+                'user': user,
+                'book': book,
+                'kind': kind,
+                'value': random.randint(3, 5) if liked else random.randint(1, 3),
+                'timestamp': (start + timedelta(minutes=random.randrange(180 * 24 * 60))).isoformat(),
+            })
+
+        return {'users': list(range(options['users'])), 'books': books, 'interactions': interactions}
+
+    def split(self, interactions, test_fraction):
+        """
+        Hold out the most recent interactions as the test set
+        """
+        ordered = sorted(interactions, key=lambda item: str(item['timestamp']))
+        cutoff = int(len(ordered) * (1 - test_fraction))
+        return ordered[:cutoff], ordered[cutoff:]
+
+    def load_dataset(self, dataset, train):
+        """
+        Create the dataset's users and books, and insert only the train interactions
+        """
+        suffix = int(time.time())
+        users = User.objects.bulk_create([
+            User(username=f'benchmark_{suffix}_{user}') for user in dataset['users']
+        ])
+        user_map = dict(zip(dataset['users'], (user.id for user in users)))
+
+        books = Book.objects.bulk_create([
+            Book(
+                title=book['title'],
+                author=book.get('author'),
+                category=book.get('category', 'Novel'),
+                is_public=book.get('is_public', True),
+                view_count=book.get('view_count', 0),
+            )
+            for book in dataset['books']
+        ])
+        book_map = dict(zip((book['id'] for book in dataset['books']), (book.id for book in books)))
+
+        ratings, progress, collections = [], [], []
+        for item in train:
+            user_id, book_id = user_map[item['user']], book_map[item['book']]
+            if item['kind'] == 'rating':
+                ratings.append(Rating(user_id=user_id, book_id=book_id, rating=max(1, min(5, item['value']))))
+            elif item['kind'] == 'progress':
+                completed = item['value'] >= 4
+                progress.append(ReadingProgress(
+                    user_id=user_id, book_id=book_id, total_pages=300,
+                    current_page=300 if completed else item['value'] * 50, completed=completed
+                ))
+            else:
+                collections.append(Collection(user_id=user_id, book_id=book_id))
+
+        Rating.objects.bulk_create(ratings, ignore_conflicts=True)
+        ReadingProgress.objects.bulk_create(progress, ignore_conflicts=True)
+        Collection.objects.bulk_create(collections, ignore_conflicts=True)
+
+        # Re-key the test interactions to database ids
+        for item in dataset['interactions']:
+            item['user'] = user_map[item['user']]
+            item['book'] = book_map[item['book']]
+
+    def collect_interactions(self):
+        interactions = []
+        for user, book, value, timestamp in Rating.objects.values_list('user_id', 'book_id', 'rating', 'updated_at'):
+            interactions.append({'user': user, 'book': book, 'kind': 'rating', 'value': value, 'timestamp': timestamp.isoformat()})
+        for user, book, completed, timestamp in ReadingProgress.objects.values_list('user_id', 'book_id', 'completed', 'last_read'):
+            interactions.append({'user': user, 'book': book, 'kind': 'progress', 'value': 5 if completed else 3, 'timestamp': timestamp.isoformat()})
+        for user, book, timestamp in Collection.objects.values_list('user_id', 'book_id', 'added_on'):
+            interactions.append({'user': user, 'book': book, 'kind': 'collection', 'value': 4, 'timestamp': timestamp.isoformat()})
+        return interactions
+
+    def export_dataset(self):
+        """
+        Read-only snapshot of the live interactions in the dataset format, without user details
+        """
+        interactions = self.collect_interactions()
+        book_ids = {item['book'] for item in interactions}
+        books = [
+            {
+                'id': book['id'],
+                'title': book['title'],
+                'author': book['author'],
+                'category': book['category'],
+                'is_public': book['is_public'],
+                'view_count': book['view_count'],
+            }
+            for book in Book.objects.filter(id__in=book_ids).values(
+                'id', 'title', 'author', 'category', 'is_public', 'view_count'
+            )
+        ]
+        return {
+            'users': sorted({item['user'] for item in interactions}),
+            'books': books,
+            'interactions': interactions,
+        }
+
+    def relevant_items(self, train, test):
+        """
+        Map each user with train history to the books they newly interacted with in the test period
+        """
+        seen = defaultdict(set)
+        for item in train:
+            seen[item['user']].add(item['book'])
+        relevant = defaultdict(set)
+        for item in test:
+            if item['user'] in seen and item['book'] not in seen[item['user']]:
+                relevant[item['user']].add(item['book'])
+        return dict(relevant)
+
+    def build_recommender(self, name, train, options):
+        """
+        Return a callable mapping a user to a list of recommended book ids
+        """
+        if name == 'heuristic':
+            return lambda user: heuristic_recommendations(user)[0]
+
+        if name == 'popular':
+            return lambda user: list(popular_books_queryset().values_list('id', flat=True)[:12])
+
+        if name == 'similar_books':
+            latest = {}
+            for item in train:
+                latest[item['user']] = item['book']
+
+            def recommend_similar(user):
+                seed = latest.get(user.id)
+                if seed is None:
+                    return []
+                return similar_book_ids(Book.objects.get(id=seed), include_also_read=True)
+            return recommend_similar
+
+        if name == 'als':
+            if als.np is None:
+                self.stdout.write(self.style.WARNING('Skipping als: NumPy is not installed'))
+                return None
+            started = time.time()
+            trained = als.train_als(
+                als.load_interactions(), factors=options['factors'],
+                iterations=options['iterations'], seed=options['seed']
+            )
+            model_dir = tempfile.mkdtemp(prefix='kremlib-benchmark-')
+            als.save_factors(trained, model_dir)
+            model = als.load_factor_model(model_dir)
+            self.stdout.write(f'Trained als in {time.time() - started:.2f}s')
+            return (lambda user: compute_recommendations(user, model)[0]), model_dir
+
+        return None
+
+    def evaluate(self, name, recommender, test_users, relevant, catalog_size, k):
+        users = User.objects.in_bulk(test_users)
+        precisions, recalls, latencies, queries = [], [], [], []
+        recommended = set()
+
+        for user_id in test_users:
+            with CaptureQueriesContext(self.connection) as context:
+                started = time.perf_counter()
+                book_ids = recommender(users[user_id])
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+
+            top_k = book_ids[:k]
+            recommended.update(top_k)
+            hits = len(set(top_k) & relevant[user_id])
+            precisions.append(hits / k)
+            recalls.append(hits / len(relevant[user_id]))
+
+        result = {
+            f'precision@{k}': sum(precisions) / len(precisions),
+            f'recall@{k}': sum(recalls) / len(recalls),
+            'coverage': len(recommended) / catalog_size if catalog_size else 0,
+            'latency_ms': {
+                'mean': sum(latencies) / len(latencies),
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies),
+            },
+            'queries': {
+                'mean': sum(queries) / len(queries),
+                'max': max(queries),
+            },
+        }
+        self.stdout.write(
+            f'{name:>14}: precision@{k}={result[f"precision@{k}"]:.4f} recall@{k}={result[f"recall@{k}"]:.4f} '
+            f'coverage={result["coverage"]:.3f} p50={result["latency_ms"]["p50"]:.1f}ms '
+            f'p95={result["latency_ms"]["p95"]:.1f}ms queries={result["queries"]["mean"]:.1f}'
+        )
+        return result
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from project import cache_metrics
+
+
+class Command(BaseCommand):
+    help = 'Print cache hits, misses, evictions, bytes and latency by namespace, summed over all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help='Keep printing the summary with rates since the last one')
+        parser.add_argument('--interval', type=float, default=10.0, help='Seconds between summaries with --watch')
+        parser.add_argument('--reset', action='store_true', help='Reset the counters before reading them')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            cache_metrics.reset()
+
+        previous = None
+        while True:
+            totals = cache_metrics.snapshot()
+            self.print_summary(totals, previous, options['interval'])
+            if not options['watch']:
+                break
+            previous = totals
+            time.sleep(options['interval'])
+
+    def print_summary(self, totals, previous, interval):
+        if not totals:
+            self.stdout.write('No cache activity recorded yet')
+            return
+
+        header = f'{"namespace":<40} {"hits":>9} {"misses":>9} {"ratio":>7} {"l1":>9} {"stale":>7} {"sets":>7} {"evict":>7} {"avg KB":>8} {"get ms":>8} {"set ms":>8}'
+        if previous is not None:
+            header += f' {"req/s":>8}'
+        self.stdout.write(time.strftime('%H:%M:%S'))
+        self.stdout.write(header)
+        for namespace, metrics in sorted(totals.items(), key=lambda item: -(item[1]['hits'] + item[1]['misses'])):
+            ratio = f'{metrics["hit_ratio"]:.1%}' if metrics['hit_ratio'] is not None else '-'
+            size = f'{metrics["avg_entry_bytes"] / 1024:.1f}' if metrics['avg_entry_bytes'] is not None else '-'
+            get_ms = f'{metrics["avg_get_ms"]:.3f}' if metrics['avg_get_ms'] is not None else '-'
+            set_ms = f'{metrics["avg_set_ms"]:.3f}' if metrics['avg_set_ms'] is not None else '-'
+            line = (
+                f'{namespace[:40]:<40} {metrics["hits"]:>9} {metrics["misses"]:>9} {ratio:>7} {metrics["l1_hits"]:>9} '
+                f'{metrics["stale_hits"]:>7} {metrics["sets"]:>7} {metrics["evictions"]:>7} {size:>8} {get_ms:>8} {set_ms:>8}'
+            )
+            if previous is not None:
+                before = previous.get(namespace, {}).get('gets', 0)
+                line += f' {(metrics["gets"] - before) / interval:>8.1f}'
+            self.stdout.write(line)
+        self.stdout.write('')
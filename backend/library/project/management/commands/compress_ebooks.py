@@ -0,0 +1,37 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from project.compression import write_sidecars, available_encodings
+from project.file_serving import file_extension
+from project.models import Book
+from project.text_pages import TEXT_EXTENSIONS
+
+
+class Command(BaseCommand):
+    help = 'Write precompressed variants for existing text ebooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Files compressed in parallel')
+        parser.add_argument('--force', action='store_true', help='Rewrite variants that already exist')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        names = {
+            name for name in Book.objects.exclude(ebook__isnull=True).exclude(ebook='').values_list('ebook', flat=True)
+            if file_extension(name) in TEXT_EXTENSIONS
+        }
+        storage = Book._meta.get_field('ebook').storage
+        paths = [storage.path(name) for name in names if storage.exists(name)]
+        encodings = ', '.join(encoding for encoding, _, _ in available_encodings())
+        self.stdout.write(f'Compressing {len(paths)} text ebooks ({encodings})')
+
+        def compress(path):
+            return write_sidecars(path, force=options['force'])
+
+        written = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for encodings_written in executor.map(compress, paths):
+                written += len(encodings_written)
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} variants in {time.time() - started:.2f}s'))
@@ -0,0 +1,109 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from project.cache_utils import invalidate_model_cache
+from project.file_serving import file_sha256
+from project.models import Book, StoredBlob
+from project.storage import content_storage, blob_digest, blob_name
+
+# Book file fields kept in content-addressed storage
+FILE_FIELDS = ('ebook', 'image')
+
+
+def books_with_file(field):
+    return Book.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+
+
+class Command(BaseCommand):
+    help = 'Move existing ebooks and cover images into content-addressed storage, sharing identical files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Files hashed in parallel')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deduplicated without changing anything')
+
+    def handle(self, *args, **options):
+        started = time.time()
+
+        # Legacy file names and the (book, field) pairs that refer to them
+        references = defaultdict(list)
+        for field in FILE_FIELDS:
+            for book_id, name in books_with_file(field).values_list('id', field):
+                if not blob_digest(name):
+                    references[name].append((book_id, field))
+
+        names = [name for name in references if content_storage.exists(name)]
+        missing = len(references) - len(names)
+        self.stdout.write(f'Hashing {len(names)} files with {options["workers"]} workers ({missing} missing)')
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            digests = dict(zip(names, executor.map(lambda name: file_sha256(content_storage.path(name)), names)))
+
+        moved = shared = reclaimed = 0
+        # Targets this run already moved a file to (or would have, in a dry run)
+        targets = set()
+        for name, digest in digests.items():
+            target = blob_name(os.path.dirname(name), digest, name)
+            source_path = content_storage.path(name)
+            target_path = content_storage.path(target)
+            size = os.path.getsize(source_path)
+            duplicate = target in targets or os.path.exists(target_path)
+            targets.add(target)
+            if duplicate:
+                shared += 1
+                reclaimed += size
+            else:
+                moved += 1
+            if options['dry_run']:
+                continue
+
+            if duplicate:
+                os.remove(source_path)
+            else:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                os.replace(source_path, target_path)
+            for book_id, field in references[name]:
+                Book.objects.filter(pk=book_id).update(**{field: target})
+                # update() sends no signals; cached payloads would keep URLs of the moved file
+                invalidate_model_cache('BookPayload', book_id)
+
+        if not options['dry_run']:
+            self.recount()
+            # Cached lists and responses (popular, home, ...) embed the payloads
+            invalidate_model_cache('Book')
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {moved} files and merged {shared} duplicates, '
+            f'reclaiming {reclaimed / (1024 * 1024):.1f} MiB in {time.time() - started:.2f}s'
+        ))
+
+    def recount(self):
+        """
+        Set every blob's reference count to the number of book fields pointing at it,
+        removing blobs that are no longer referenced.
+
+        Blobs younger than STORED_BLOB_SWEEP_GRACE are kept: their book may not be committed yet.
+        """
+        counts = defaultdict(int)
+        for field in FILE_FIELDS:
+            rows = books_with_file(field).values(field).annotate(refs=Count('id'))
+            for row in rows:
+                if blob_digest(row[field]):
+                    counts[row[field]] += row['refs']
+
+        for name, refs in counts.items():
+            path = content_storage.path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            StoredBlob.objects.update_or_create(name=name, defaults={'ref_count': refs, 'size': size})
+
+        # Blobs nothing refers to any more
+        cutoff = timezone.now() - timedelta(seconds=settings.STORED_BLOB_SWEEP_GRACE)
+        for blob in StoredBlob.objects.exclude(name__in=list(counts)).filter(created_at__lt=cutoff):
+            blob.delete()
+            content_storage.delete_file(blob.name)
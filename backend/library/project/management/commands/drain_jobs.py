@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from project.jobs import run_pending
+from project.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (ebook ingestion, ...) in this process until the queue is empty'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', dest='kinds', help='Only run jobs of this kind (repeatable)')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after running this many jobs')
+        parser.add_argument('--watch', action='store_true', help='Keep polling for new and retried jobs')
+        parser.add_argument('--interval', type=float, default=5.0, help='Polling interval in seconds with --watch')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        total = 0
+        while True:
+            limit = options['limit'] - total if options['limit'] is not None else None
+            total += run_pending(limit=limit, kinds=options['kinds'])
+            if not options['watch'] or (options['limit'] is not None and total >= options['limit']):
+                break
+            time.sleep(options['interval'])
+
+        failed = BackgroundJob.objects.filter(status='failed').count()
+        pending = BackgroundJob.objects.filter(status='pending').count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {total} jobs in {time.time() - started:.2f}s ({pending} pending, {failed} failed)'
+        ))
@@ -0,0 +1,67 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from project.cache_utils import invalidate_model_cache
+from project.models import Book
+from project.thumbnails import render_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate the cover renditions of every book in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Re-render renditions that already exist')
+        parser.add_argument('--missing', action='store_true', help='Only books whose renditions are not recorded')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        storage = Book._meta.get_field('image').storage
+        books = Book.objects.exclude(image__isnull=True).exclude(image='').values_list('id', 'image', 'thumbnails')
+        if options['missing']:
+            books = [(book_id, image, thumbnails) for book_id, image, thumbnails in books if (thumbnails or {}).get('source') != image]
+
+        # Books sharing a cover (content-addressed) are rendered once
+        by_image = {}
+        for book_id, image, _ in books:
+            by_image.setdefault(image, []).append(book_id)
+        self.stdout.write(f'Rendering {len(by_image)} covers with {options["workers"]} workers')
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            futures = {
+                executor.submit(
+                    render_thumbnails,
+                    storage.location,
+                    image,
+                    settings.COVER_THUMBNAIL_WIDTHS,
+                    settings.COVER_THUMBNAIL_FORMATS,
+                    options['force']
+                ): image
+                for image in by_image
+            }
+            for future in as_completed(futures):
+                image = futures[future]
+                try:
+                    sizes = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'  {image}: {e}')
+                    continue
+                Book.objects.filter(id__in=by_image[image], image=image).update(
+                    thumbnails={'source': image, 'sizes': sizes}
+                )
+                # update() sends no signals, so cached payloads are dropped here
+                for book_id in by_image[image]:
+                    invalidate_model_cache('BookPayload', book_id)
+                done += 1
+
+        if done:
+            # Cached responses (popular, home, ...) embed the payloads
+            invalidate_model_cache('Book')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {done} covers ({failed} failed) in {time.time() - started:.2f}s'
+        ))
@@ -0,0 +1,52 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from project.als import load_interactions, train_als, save_factors, np
+
+
+class Command(BaseCommand):
+    help = 'Train the implicit-feedback ALS recommender and write its factor model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=32, help='Number of latent factors')
+        parser.add_argument('--iterations', type=int, default=15, help='Number of ALS iterations')
+        parser.add_argument('--regularization', type=float, default=0.05, help='L2 regularization weight')
+        parser.add_argument('--alpha', type=float, default=10.0, help='Confidence scaling of interaction weights')
+        parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='Worker threads used per iteration')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for factor initialization')
+        parser.add_argument('--output', default=None, help='Model directory (defaults to RECOMMENDER_MODEL_DIR)')
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('NumPy is required to train the recommender')
+
+        started = time.time()
+        interactions = load_interactions()
+        if not interactions:
+            raise CommandError('No interactions to train on')
+
+        users = len({user_id for user_id, _ in interactions})
+        books = len({book_id for _, book_id in interactions})
+        self.stdout.write(f'Training on {len(interactions)} interactions from {users} users over {books} books')
+
+        def report(iteration, elapsed):
+            self.stdout.write(f'  iteration {iteration}/{options["iterations"]} ({elapsed:.2f}s)')
+
+        params = {
+            'factors': options['factors'],
+            'iterations': options['iterations'],
+            'regularization': options['regularization'],
+            'alpha': options['alpha'],
+        }
+        model = train_als(
+            interactions,
+            threads=max(1, options['threads']),
+            seed=options['seed'],
+            callback=report,
+            **params
+        )
+        meta = save_factors(model, options['output'], **params)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Saved model {meta["version"]} ({meta["factors"]} factors) in {time.time() - started:.2f}s'
+        ))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from project.warmup import warm_cache
+
+
+class Command(BaseCommand):
+    help = 'Fill the caches by replaying the most requested URLs and search queries of recent traffic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urls', type=int, help='Number of most requested URLs to replay')
+        parser.add_argument('--queries', type=int, help='Number of most frequent search queries to replay')
+        parser.add_argument('--workers', type=int, help='Number of concurrent requests')
+        parser.add_argument('--budget', type=float, help='Seconds after which the remaining URLs are skipped')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(done, total, url, status, seconds):
+            result = 'skipped' if status is None else f'{status} in {seconds * 1000:.0f}ms'
+            self.stdout.write(f'[{done}/{total}] {url} {result}')
+
+        summary = warm_cache(
+            url_limit=options['urls'],
+            query_limit=options['queries'],
+            workers=options['workers'],
+            budget=options['budget'],
+            progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {summary['warmed']} of {summary['total']} URLs in {time.monotonic() - started:.1f}s "
+            f"({summary['failed']} failed, {summary['skipped']} skipped)"
+        ))
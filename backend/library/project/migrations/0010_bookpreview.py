@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-19 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_book_ebook_hash_book_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookPreview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('preview_type', models.CharField(default='text', max_length=20)),
+                ('preview_text', models.TextField(blank=True)),
+                ('table_of_contents', models.JSONField(blank=True, default=list)),
+                ('total_pages', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='preview', to='project.book')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_ingestion_pipeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextPageIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('page_size', models.PositiveIntegerField()),
+                ('page_count', models.PositiveIntegerField()),
+                ('offsets', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='page_index', to='project.book')),
+            ],
+        ),
+    ]
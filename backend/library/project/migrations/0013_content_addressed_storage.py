@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-19 13:10
+
+import project.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_textpageindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='ebook',
+            field=models.FileField(blank=True, null=True, storage=project.storage.get_content_storage, upload_to='ebooks/'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=project.storage.get_content_storage, upload_to='static/bookImages/'),
+        ),
+    ]
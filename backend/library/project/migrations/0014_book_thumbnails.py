@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0013_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
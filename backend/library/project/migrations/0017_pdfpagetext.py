@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-19 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0016_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfPageText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('page_number', models.PositiveIntegerField()),
+                ('text', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_texts', to='project.book')),
+            ],
+            options={
+                'unique_together': {('book', 'source_hash', 'page_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+SEARCH_INDEX_TEXT_LIMIT = 20000
+
+
+def move_extracted_text(apps, schema_editor):
+    """
+    Move text extracted by ingestion out of BookContent, which is served with every book
+    """
+    BookContent = apps.get_model('project', 'BookContent')
+    BookSearchIndex = apps.get_model('project', 'BookSearchIndex')
+    db = schema_editor.connection.alias
+    extracted = BookContent.objects.using(db).exclude(source_hash='')
+    for content in extracted.iterator():
+        BookSearchIndex.objects.using(db).update_or_create(
+            book_id=content.book_id,
+            defaults={'text': content.content[:SEARCH_INDEX_TEXT_LIMIT], 'source_hash': content.source_hash}
+        )
+    extracted.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0017_pdfpagetext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booksearchindex',
+            name='text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(move_extracted_text, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='bookcontent',
+            name='source_hash',
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-19 19:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """
+    Create the table of the database cache (the default shared cache) so `migrate` is enough
+    """
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0018_search_index_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,17 @@
-from django.db import models
+import uuid
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
+from .storage import get_content_storage
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     first_name = models.CharField(max_length=100, blank=True)
     last_name = models.CharField(max_length=100, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)  # {size: name} of square renditions
+    pending_profile_picture = models.CharField(max_length=255, blank=True)  # Upload waiting to be processed
     bio = models.TextField(blank=True, null=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(null=True, blank=True)
@@ -50,16 +55,25 @@ class Book(models.Model):
     description = models.TextField(null=True)
     year = models.CharField(max_length=4, default='0000')
     isbn = models.CharField(max_length=255, unique=True, null=True)  
-    image = models.ImageField(upload_to='static/bookImages/', null=True, blank=True)
-    ebook = models.FileField(upload_to='ebooks/', null=True, blank=True)
+    image = models.ImageField(upload_to='static/bookImages/', storage=get_content_storage, null=True, blank=True)
+    ebook = models.FileField(upload_to='ebooks/', storage=get_content_storage, null=True, blank=True)
+    thumbnails = models.JSONField(default=dict, blank=True)  # {'source': image name, 'sizes': {width: {format: name}}}
+    ebook_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 of the ebook file
+    page_count = models.PositiveIntegerField(null=True, blank=True)  # Set by the ingestion pipeline
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='uploaded_books')
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
     is_public = models.BooleanField(default=True)  
     uploaded_on = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     favorites = models.ManyToManyField(User, through='Collection', related_name='favorite_books')
     view_count = models.PositiveIntegerField(default=0)
     download_count = models.PositiveIntegerField(default=0)
     
+    def save(self, *args, **kwargs):
+        # New files take their blob references while the row is saved; a failed save drops them too
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.title} by {self.author}"
 
@@ -120,3 +134,111 @@ class BookContent(models.Model):
     
     def __str__(self):
         return f"Content for {self.book.title}"
+
+class BookPreview(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='preview')
+    source_hash = models.CharField(max_length=64)  # ebook_hash the preview was extracted from
+    version = models.PositiveIntegerField(default=0)  # PREVIEW_VERSION used for extraction
+    preview_type = models.CharField(max_length=20, default='text')
+    preview_text = models.TextField(blank=True)
+    table_of_contents = models.JSONField(default=list, blank=True)
+    total_pages = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Preview for {self.book.title}"
+
+class TextPageIndex(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='page_index')
+    source_hash = models.CharField(max_length=64)  # ebook_hash the offsets were computed from
+    page_size = models.PositiveIntegerField()
+    page_count = models.PositiveIntegerField()
+    offsets = models.BinaryField()  # array('Q') of page start offsets, followed by the file size
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Page index for {self.book.title}"
+
+class PdfPageText(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='page_texts')
+    source_hash = models.CharField(max_length=64)  # ebook_hash the text was extracted from
+    page_number = models.PositiveIntegerField()
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['book', 'source_hash', 'page_number']
+    
+    def __str__(self):
+        return f"Page {self.page_number} of {self.book.title}"
+
+class BookSearchIndex(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='search_index')
+    document = models.TextField()  # Lowercased metadata, table of contents and leading text
+    text = models.TextField(blank=True)  # Leading text extracted from the ebook, never served to clients
+    source_hash = models.CharField(max_length=64, blank=True)  # ebook_hash the text was extracted from
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search index for {self.book.title}"
+
+class StoredBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # Content-addressed path under MEDIA_ROOT
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('completed', 'Completed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # Declared total length
+    offset = models.PositiveBigIntegerField(default=0)  # Bytes received so far
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    book = models.ForeignKey(Book, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')  # Set once finalized
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Upload {self.filename} by {self.user.username} ({self.offset}/{self.size})"
+
+class BackgroundJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField(null=True, blank=True)  # Primary key of the object the job works on
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    stage = models.CharField(max_length=50, blank=True)  # Stage currently (or last) running
+    completed_stages = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+        
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} ({self.status})"
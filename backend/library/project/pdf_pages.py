@@ -0,0 +1,126 @@
+"""
+Per-page text of PDF ebooks.
+
+Page text is extracted the first time a page is requested and stored per
+(book, file hash, page), so hot books are never parsed again. After each request
+the neighboring pages are extracted in a background thread, ready for a
+reader turning pages.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from .file_serving import ensure_ebook_hash
+from .models import Book, PdfPageText
+
+_prefetch_executor = None
+# (book id, source hash, page) of pages being extracted in the background
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+
+
+def extract_page_texts(path, page_numbers):
+    """
+    Return (page count, {page: text}) for the requested 1-based pages that exist
+    """
+    from PyPDF2 import PdfReader
+
+    with open(path, 'rb') as file:
+        # Pages are parsed lazily, so only the requested ones are decoded
+        reader = PdfReader(file)
+        total_pages = len(reader.pages)
+        texts = {
+            page: reader.pages[page - 1].extract_text() or ''
+            for page in page_numbers if 1 <= page <= total_pages
+        }
+    return total_pages, texts
+
+
+def store_page_texts(book, source_hash, texts):
+    PdfPageText.objects.bulk_create(
+        [PdfPageText(book=book, source_hash=source_hash, page_number=page, text=text) for page, text in texts.items()],
+        # Pages stored concurrently by another request or the prefetcher are kept
+        ignore_conflicts=True
+    )
+
+
+def get_page_text(book, page):
+    """
+    Text of page ``page`` of a PDF ebook, or None if the book has fewer pages
+    """
+    source_hash = ensure_ebook_hash(book)
+    text = PdfPageText.objects.filter(
+        book=book, source_hash=source_hash, page_number=page
+    ).values_list('text', flat=True).first()
+    if text is not None:
+        # Keep extracting ahead of a reader turning pages
+        prefetch_neighbors(book, page)
+        return text
+
+    total_pages, texts = extract_page_texts(book.ebook.path, [page])
+    if book.page_count != total_pages:
+        book.page_count = total_pages
+        Book.objects.filter(pk=book.pk).update(page_count=total_pages)
+    if page not in texts:
+        return None
+
+    # Pages of a replaced file are dropped when the new one is first read
+    PdfPageText.objects.filter(book=book).exclude(source_hash=source_hash).delete()
+    store_page_texts(book, source_hash, texts)
+    prefetch_neighbors(book, page)
+    return texts[page]
+
+
+def _prefetch(book, source_hash, pages):
+    try:
+        stored = set(PdfPageText.objects.filter(
+            book=book, source_hash=source_hash, page_number__in=pages
+        ).values_list('page_number', flat=True))
+        missing = [page for page in pages if page not in stored]
+        if missing:
+            _, texts = extract_page_texts(book.ebook.path, missing)
+            store_page_texts(book, source_hash, texts)
+    except Exception:
+        # Prefetching is best effort; the page is extracted on request instead
+        pass
+    finally:
+        with _prefetch_lock:
+            _prefetching.difference_update((book.pk, source_hash, page) for page in pages)
+
+
+def _prefetch_in_thread(book, source_hash, pages):
+    try:
+        _prefetch(book, source_hash, pages)
+    finally:
+        # The thread's own database connection
+        connection.close()
+
+
+def prefetch_neighbors(book, page):
+    """
+    Extract the PDF_PAGE_PREFETCH pages around ``page`` in the background
+    """
+    distance = settings.PDF_PAGE_PREFETCH
+    if distance <= 0:
+        return
+
+    global _prefetch_executor
+    source_hash = book.ebook_hash
+    last_page = book.page_count or page + distance
+    candidates = [
+        neighbor for neighbor in range(max(1, page - distance), min(last_page, page + distance) + 1)
+        if neighbor != page
+    ]
+    with _prefetch_lock:
+        pages = [neighbor for neighbor in candidates if (book.pk, source_hash, neighbor) not in _prefetching]
+        _prefetching.update((book.pk, source_hash, neighbor) for neighbor in pages)
+    if not pages:
+        return
+
+    if settings.BACKGROUND_JOBS_MODE == 'sync':
+        _prefetch(book, source_hash, pages)
+        return
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pdf-prefetch')
+    _prefetch_executor.submit(_prefetch_in_thread, book, source_hash, pages)
@@ -0,0 +1,132 @@
+from django.db import IntegrityError
+from .epub import extract_epub_preview
+from .file_serving import ensure_ebook_hash, file_extension
+from .models import BookPreview
+
+# Bump whenever the preview payload or extraction logic changes, so clients revalidate
+# and stored previews are re-extracted
+PREVIEW_VERSION = 3
+
+# Formats whose preview is extracted and stored in BookPreview
+PREVIEW_EXTENSIONS = ('pdf', 'epub', 'txt', 'text')
+
+PREVIEW_TEXT_LIMIT = 5000
+PREVIEW_PAGES = 3
+# Number of EPUB spine documents read for the preview text
+PREVIEW_SPINE_ITEMS = 2
+TOC_LIMIT = 50
+
+
+def preview_validators(book):
+    """
+    ETag and Last-Modified of a book's preview, derived from the book version and PREVIEW_VERSION
+    """
+    book_version = f'{ensure_ebook_hash(book)}-{int(book.updated_at.timestamp())}'
+    etag = f'"preview-{PREVIEW_VERSION}-{book.pk}-{book_version}"'
+    return etag, book.updated_at.timestamp()
+
+
+def _outline_titles(outline, toc, depth=0):
+    """
+    Flatten a (possibly nested) PDF outline into a list of titles
+    """
+    for item in outline:
+        if len(toc) >= TOC_LIMIT:
+            return
+        if isinstance(item, list):
+            _outline_titles(item, toc, depth + 1)
+        elif isinstance(item, dict) and '/Title' in item:
+            toc.append(str(item['/Title']))
+
+
+def extract_pdf_preview(path):
+    """
+    Extract preview text, table of contents and page count from a PDF
+    """
+    from PyPDF2 import PdfReader
+
+    with open(path, 'rb') as file:
+        reader = PdfReader(file)
+
+        toc = []
+        if reader.outline:
+            _outline_titles(reader.outline, toc)
+
+        # Extract text from the first pages, up to the preview size limit
+        preview_text = ''
+        for page in reader.pages[:PREVIEW_PAGES]:
+            preview_text += page.extract_text() or ''
+            if len(preview_text) > PREVIEW_TEXT_LIMIT:
+                preview_text = preview_text[:PREVIEW_TEXT_LIMIT] + '...'
+                break
+
+        return {
+            'preview_text': preview_text,
+            'table_of_contents': toc,
+            'total_pages': len(reader.pages),
+            'preview_type': 'text',
+        }
+
+
+def is_heading(line):
+    """
+    Simple chapter detection for plain text files
+    """
+    line = line.strip()
+    return line.lower().startswith('chapter') or (line and line.isupper() and len(line) > 5)
+
+
+def extract_text_preview(path):
+    """
+    Extract preview text and chapter headings from a plain text file
+    """
+    with open(path, 'rb') as file:
+        content = file.read(PREVIEW_TEXT_LIMIT).decode('utf-8', errors='replace')
+        if file.read(1):  # Check if there's more content
+            content += '...'
+
+        # Scan the whole file once for chapter headings
+        file.seek(0)
+        toc = []
+        for raw_line in file:
+            line = raw_line.decode('utf-8', errors='replace')
+            if is_heading(line):
+                toc.append(line.strip())
+                if len(toc) >= TOC_LIMIT:
+                    break
+
+    return {
+        'preview_text': content,
+        'table_of_contents': toc,
+        'total_pages': None,
+        'preview_type': 'text',
+    }
+
+
+def extract_preview(book):
+    file_ext = file_extension(book.ebook.name)
+    if file_ext == 'pdf':
+        return extract_pdf_preview(book.ebook.path)
+    if file_ext == 'epub':
+        return extract_epub_preview(book.ebook.path, PREVIEW_TEXT_LIMIT, TOC_LIMIT, PREVIEW_SPINE_ITEMS)
+    return extract_text_preview(book.ebook.path)
+
+
+def get_book_preview(book):
+    """
+    Return the stored BookPreview of a book, extracting it if missing or outdated.
+
+    A preview is re-extracted only when the ebook content hash or PREVIEW_VERSION changes.
+    """
+    source_hash = ensure_ebook_hash(book)
+    preview = BookPreview.objects.filter(book=book).first()
+    if preview is not None and preview.source_hash == source_hash and preview.version == PREVIEW_VERSION:
+        return preview
+
+    fields = dict(extract_preview(book), source_hash=source_hash, version=PREVIEW_VERSION)
+    try:
+        preview, _ = BookPreview.objects.update_or_create(book=book, defaults=fields)
+    except IntegrityError:
+        # Another request stored the preview concurrently
+        preview = BookPreview.objects.get(book=book)
+    return preview
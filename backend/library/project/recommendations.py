@@ -0,0 +1,255 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Count, Avg, F, Sum
+from .models import Book, Rating, ReadingProgress, Collection
+from .cache_utils import generate_cache_key
+from .als import load_factor_model
+
+
+def popular_books_queryset():
+    """
+    Public books ordered by overall activity (ratings, comments, views and downloads)
+    """
+    return Book.objects.filter(is_public=True).annotate(
+        avg_rating=Avg('ratings__rating'),
+        total_activity=Count('ratings') + Count('comments') + F('view_count') + F('download_count')
+    ).order_by('-total_activity', '-avg_rating', '-view_count')
+
+
+def heuristic_recommendations(user):
+    """
+    Compute recommended book ids for a user from their reading history and ratings.
+
+    Returns a tuple of (book_ids, based_on) where based_on describes the signals used.
+    """
+    # Get user's reading history
+    user_progress = ReadingProgress.objects.filter(user=user).select_related('book')
+    read_book_ids = [progress.book.id for progress in user_progress]
+
+    # Get user's ratings
+    user_ratings = Rating.objects.filter(user=user).select_related('book')
+    rated_books = {rating.book.id: rating.rating for rating in user_ratings}
+
+    # Get categories of books the user has read or rated highly (4-5 stars)
+    preferred_categories = set()
+    for progress in user_progress:
+        if progress.book.id in rated_books and rated_books[progress.book.id] >= 4:
+            preferred_categories.add(progress.book.category)
+        elif progress.completed:
+            # If they completed a book, they probably liked it
+            preferred_categories.add(progress.book.category)
+
+    # If we don't have enough data, add some popular categories
+    if len(preferred_categories) < 2:
+        # Get most popular categories based on view counts
+        popular_categories = Book.objects.filter(is_public=True)\
+            .values('category')\
+            .annotate(total_views=Sum('view_count'))\
+            .order_by('-total_views')\
+            .values_list('category', flat=True)[:3]
+        preferred_categories.update(popular_categories)
+
+    # Get books in preferred categories that the user hasn't read yet
+    category_recommendations = Book.objects.filter(
+        category__in=preferred_categories,
+        is_public=True
+    ).exclude(id__in=read_book_ids).order_by('-view_count').values_list('id', flat=True)[:5]
+
+    # Get books that are similar to highly rated books (same author or similar titles)
+    similar_recommendations = []
+    for book_id, rating in rated_books.items():
+        if rating >= 4:
+            # User liked this book, find similar ones
+            book = Book.objects.get(id=book_id)
+            similar_books = Book.objects.filter(
+                Q(author=book.author) | Q(title__icontains=book.title.split()[0] if book.title and book.title.split() else ''),
+                is_public=True
+            ).exclude(id__in=read_book_ids + [book_id])
+            similar_recommendations.extend(similar_books.values_list('id', flat=True)[:2])
+
+    # Combine recommendations, removing duplicates
+    all_recommendations = list(category_recommendations)
+    for book_id in similar_recommendations:
+        if book_id not in all_recommendations:
+            all_recommendations.append(book_id)
+            if len(all_recommendations) >= 10:
+                break
+
+    # If we still don't have enough recommendations, add some popular books
+    if len(all_recommendations) < 5:
+        popular_books = Book.objects.filter(is_public=True)\
+            .exclude(id__in=read_book_ids)\
+            .exclude(id__in=all_recommendations)\
+            .order_by('-view_count')\
+            .values_list('id', flat=True)[:5]
+        all_recommendations.extend(popular_books)
+
+    based_on = {
+        'strategy': 'heuristic',
+        'reading_history': len(read_book_ids),
+        'ratings': len(rated_books),
+        'preferred_categories': list(preferred_categories)
+    }
+    return all_recommendations, based_on
+
+
+def similar_book_ids(book, include_also_read=False):
+    """
+    Ids of books similar to the given book (same author, category, or related content)
+    """
+    # Find books by the same author
+    same_author = list(Book.objects.filter(
+        author=book.author,
+        is_public=True
+    ).exclude(id=book.id).order_by('-view_count').values_list('id', flat=True)[:3])
+
+    # Find books in the same category
+    same_category = list(Book.objects.filter(
+        category=book.category,
+        is_public=True
+    ).exclude(id=book.id).exclude(id__in=same_author).order_by('-view_count').values_list('id', flat=True)[:3])
+
+    # Find books with similar titles or descriptions (basic text similarity)
+    title_words = [word for word in book.title.split() if len(word) > 3] if book.title else []
+    if title_words:
+        similar_title_query = Q()
+        for word in title_words:
+            similar_title_query |= Q(title__icontains=word)
+
+        similar_title = list(Book.objects.filter(
+            similar_title_query,
+            is_public=True
+        ).exclude(id=book.id)\
+        .exclude(id__in=same_author + same_category)\
+        .order_by('-view_count')\
+        .values_list('id', flat=True)[:2])
+    else:
+        similar_title = []
+
+    # Combine all similar books
+    all_similar = same_author + same_category + similar_title
+
+    if include_also_read:
+        # Get books that users who read this book also read
+        users_who_read = ReadingProgress.objects.filter(book=book).values_list('user', flat=True)
+        if users_who_read:
+            other_books_read = ReadingProgress.objects.filter(
+                user__in=users_who_read
+            ).exclude(book=book).values_list('book', flat=True)
+
+            if other_books_read:
+                also_read = Book.objects.filter(
+                    id__in=other_books_read,
+                    is_public=True
+                ).exclude(id__in=all_similar)\
+                .annotate(read_count=Count('id'))\
+                .order_by('-read_count')\
+                .values_list('id', flat=True)[:2]
+
+                all_similar.extend(also_read)
+
+    return all_similar
+
+
+def interacted_book_ids(user_id):
+    """
+    Ids of every book the user has read, rated or collected
+    """
+    book_ids = set(ReadingProgress.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    book_ids.update(Rating.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    book_ids.update(Collection.objects.filter(user_id=user_id).values_list('book_id', flat=True))
+    return book_ids
+
+
+def als_recommendations(user, model, limit=10):
+    """
+    Score every book against the user's factors and return (book_ids, based_on)
+    """
+    seen = interacted_book_ids(user.id)
+    # Over-fetch so that private books can be dropped without a second scoring pass
+    candidates = [book_id for book_id, _ in model.recommend(user.id, exclude=seen, limit=limit * 2)]
+    public_ids = set(Book.objects.filter(id__in=candidates, is_public=True).values_list('id', flat=True))
+    book_ids = [book_id for book_id in candidates if book_id in public_ids][:limit]
+
+    based_on = {
+        'strategy': 'als',
+        'model_version': model.version,
+        'interactions': len(seen)
+    }
+    return book_ids, based_on
+
+
+def compute_recommendations(user, model=None):
+    """
+    Recommend with the factor model when the user has factors, otherwise use the heuristic
+    """
+    if model is not None and user.id in model:
+        book_ids, based_on = als_recommendations(user, model)
+        if book_ids:
+            return book_ids, based_on
+    return heuristic_recommendations(user)
+
+
+def user_recommendations_cache_key(user_id):
+    return generate_cache_key('recommendations', f'user_{user_id}')
+
+
+def anonymous_recommendations_cache_key():
+    return generate_cache_key('recommendations', 'anonymous')
+
+
+def get_user_recommendations(user):
+    """
+    Return the cached recommendation entry for a user, computing it on a miss.
+
+    The entry is a dict with 'ids', 'based_on' and 'computed_at' keys, plus a
+    'cache_hit' flag that is not stored.
+    """
+    model = load_factor_model()
+    model_version = model.version if model is not None else None
+
+    cache_key = user_recommendations_cache_key(user.id)
+    entry = cache.get(cache_key)
+    # Entries computed with a previous model are treated as misses
+    if entry is not None and entry.get('model_version') == model_version:
+        return dict(entry, cache_hit=True)
+
+    ids, based_on = compute_recommendations(user, model)
+    entry = {'ids': ids, 'based_on': based_on, 'model_version': model_version, 'computed_at': time.time()}
+    cache.set(cache_key, entry, settings.RECOMMENDATION_CACHE_SECONDS)
+    return dict(entry, cache_hit=False)
+
+
+def get_anonymous_recommendations():
+    """
+    Return the shared recommendation entry served to anonymous users (popular books)
+    """
+    cache_key = anonymous_recommendations_cache_key()
+    entry = cache.get(cache_key)
+    if entry is not None:
+        return dict(entry, cache_hit=True)
+
+    ids = list(popular_books_queryset().values_list('id', flat=True)[:12])
+    entry = {'ids': ids, 'based_on': {'popular': True}, 'computed_at': time.time()}
+    cache.set(cache_key, entry, settings.ANONYMOUS_RECOMMENDATION_CACHE_SECONDS)
+    return dict(entry, cache_hit=False)
+
+
+def invalidate_user_recommendations(user_id):
+    """
+    Drop the cached recommendations of a single user
+    """
+    cache.delete(user_recommendations_cache_key(user_id))
+
+
+def hydrate_books(book_ids):
+    """
+    Load public books for a list of ids, preserving the order of the ids
+    """
+    books = Book.objects.filter(is_public=True).select_related('uploaded_by').in_bulk(book_ids)
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+def cache_age(entry):
+    return max(0, int(time.time() - entry['computed_at']))
@@ -0,0 +1,211 @@
+"""
+In-memory membership test for blacklisted refresh tokens.
+
+Every worker keeps a Bloom filter of the JTIs of unexpired blacklisted tokens,
+plus an exact set of the ones blacklisted since the filter was built. A JTI
+missing from the filter is not blacklisted and needs no query; one in the
+recent set is; only the remaining (probable) hits are checked in the database.
+
+Blacklisting bumps a generation counter in the shared cache once committed,
+and workers that see a new generation load the tokens blacklisted since their
+last sync. The counter is read at most every TOKEN_BLACKLIST_SYNC_INTERVAL
+seconds, so most lookups touch neither the cache nor the database. A background thread in each worker rebuilds its filter every
+TOKEN_BLACKLIST_REBUILD_INTERVAL seconds, dropping tokens that expired, and a
+recurring background job deletes expired tokens from the database.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .cache_utils import get_generations, invalidate_model_cache
+from .jobs import job_handler, enqueue
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_GENERATION = 'BlacklistedToken'
+
+PRUNE_EXPIRED_TOKENS = 'prune_expired_tokens'
+
+# Syncs reload tokens blacklisted this long before the previous sync, to cover
+# transactions that committed after it
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class BloomFilter:
+    """
+    Set of strings with no false negatives and about ``error_rate`` false positives at ``capacity`` entries
+    """
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: the positions are derived from the two halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevokedTokens:
+    """
+    Per-process filter of blacklisted JTIs, built at startup (or on first use) and rebuilt by a background thread
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._recent = set()
+        self._generation = None
+        self._synced_at = None
+        self._next_check = 0  # time.monotonic() of the next generation check
+        self._rebuilder = None
+        self._rebuild_requested = threading.Event()
+
+    def load(self):
+        """
+        Build the filter from the unexpired blacklisted tokens in the database
+        """
+        # Read before the rows, so tokens blacklisted meanwhile trigger a sync
+        generation = get_generations(BLACKLIST_GENERATION)[0]
+        synced_at = timezone.now()
+        jtis = list(BlacklistedToken.objects.filter(
+            token__expires_at__gt=synced_at
+        ).values_list('token__jti', flat=True))
+        bloom = BloomFilter(
+            max(settings.TOKEN_BLACKLIST_BLOOM_CAPACITY, 2 * len(jtis)),
+            settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        # Lookups keep using the previous filter until the new one is complete
+        with self._lock:
+            self._filter = bloom
+            self._recent = set()
+            self._generation = generation
+            self._synced_at = synced_at
+            self._next_check = time.monotonic() + settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+
+    def _rebuild_periodically(self):
+        while True:
+            self._rebuild_requested.wait(settings.TOKEN_BLACKLIST_REBUILD_INTERVAL)
+            self._rebuild_requested.clear()
+            try:
+                self.load()
+            except Exception:
+                logger.exception('Could not rebuild the token blacklist filter')
+            finally:
+                # The thread's own database connection
+                connection.close()
+
+    def start_rebuilding(self):
+        """
+        Rebuild the filter every TOKEN_BLACKLIST_REBUILD_INTERVAL seconds, off the request path
+        """
+        with self._lock:
+            if self._rebuilder is None or not self._rebuilder.is_alive():
+                self._rebuilder = threading.Thread(
+                    target=self._rebuild_periodically, name='token-blacklist-rebuild', daemon=True
+                )
+                self._rebuilder.start()
+
+    def _sync(self):
+        if self._filter is None:
+            # Not loaded at startup (e.g. runserver without wsgi.py, management commands)
+            self.load()
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+        generation = get_generations(BLACKLIST_GENERATION)[0]
+        if generation == self._generation:
+            return
+        # Queried without the lock, so lookups in other threads keep going meanwhile
+        synced_at = timezone.now()
+        jtis = list(BlacklistedToken.objects.filter(
+            blacklisted_at__gte=self._synced_at - SYNC_OVERLAP
+        ).values_list('token__jti', flat=True))
+        with self._lock:
+            for jti in jtis:
+                self._add(jti)
+            self._generation = generation
+            self._synced_at = synced_at
+        if len(self._recent) > settings.TOKEN_BLACKLIST_RECENT_MAX:
+            self._rebuild_requested.set()
+
+    def _add(self, jti):
+        self._recent.add(jti)
+        self._filter.add(jti)
+
+    def add(self, jti):
+        """
+        Record a token blacklisted by this process, without waiting for a sync
+        """
+        with self._lock:
+            if self._filter is not None:
+                self._add(jti)
+
+    def is_blacklisted(self, jti):
+        self._sync()
+        if jti in self._recent:
+            return True
+        if jti not in self._filter:
+            return False
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+revoked_tokens = RevokedTokens()
+
+
+def token_blacklisted(jti):
+    """
+    Add a newly blacklisted token to this process's filter and make the other workers sync theirs
+    """
+    revoked_tokens.add(jti)
+    transaction.on_commit(lambda: invalidate_model_cache(BLACKLIST_GENERATION))
+
+
+def schedule_token_pruning():
+    """
+    Queue the recurring expired-token pruning job unless it is already queued
+    """
+    if not BackgroundJob.objects.filter(kind=PRUNE_EXPIRED_TOKENS, status__in=('pending', 'running')).exists():
+        enqueue(PRUNE_EXPIRED_TOKENS, delay=settings.TOKEN_PRUNE_INTERVAL)
+
+
+def load_on_startup():
+    """
+    Build the filter, start rebuilding it and schedule pruning before the worker takes requests
+    """
+    revoked_tokens.start_rebuilding()
+    try:
+        revoked_tokens.load()
+        schedule_token_pruning()
+    except DatabaseError:
+        # E.g. migrations not applied yet; the filter is then built on first use
+        logger.exception('Could not load the token blacklist')
+
+
+@job_handler(PRUNE_EXPIRED_TOKENS)
+def prune_expired_tokens(job):
+    # Blacklist entries are deleted with their outstanding tokens
+    OutstandingToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    enqueue(PRUNE_EXPIRED_TOKENS, delay=settings.TOKEN_PRUNE_INTERVAL)
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from rest_framework.response import Response
 from .models import (
     Book, Collection, UserProfile, Rating, ReadingProgress, 
-    Comment, Category, BookContent
+    Comment, Category, BookContent, UploadSession
 )
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -14,10 +14,31 @@ class CategorySerializer(serializers.ModelSerializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    profile_picture_renditions = serializers.SerializerMethodField()
+    profile_picture_processing = serializers.SerializerMethodField()
     
     class Meta:
         model = UserProfile
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile_picture', 'bio', 'date_joined']
+        fields = [
+            'id', 'username', 'email', 'first_name', 'last_name', 'profile_picture',
+            'profile_picture_renditions', 'profile_picture_processing', 'bio', 'date_joined'
+        ]
+        read_only_fields = ['profile_picture']
+    
+    def get_profile_picture_renditions(self, obj):
+        """
+        URLs of the square renditions by size
+        """
+        request = self.context.get('request')
+        storage = UserProfile._meta.get_field('profile_picture').storage
+        urls = {}
+        for size, name in obj.profile_picture_renditions.items():
+            url = storage.url(name)
+            urls[size] = request.build_absolute_uri(url) if request else url
+        return urls
+    
+    def get_profile_picture_processing(self, obj):
+        return bool(obj.pending_profile_picture)
 
 class CommentSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -71,6 +92,9 @@ class BookSerializer(serializers.ModelSerializer):
     ratings_count = serializers.SerializerMethodField()
     average_rating = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
+    reading_progress = serializers.SerializerMethodField()
+    user_rating = serializers.SerializerMethodField()
+    image_thumbnails = serializers.SerializerMethodField()
     comments = CommentSerializer(many=True, read_only=True)
     content = BookContentSerializer(read_only=True)
     
@@ -78,9 +102,9 @@ class BookSerializer(serializers.ModelSerializer):
         model = Book
         fields = [
             'id', 'title', 'author', 'description', 'year', 'isbn', 'ebook',
-            'image', 'category', 'is_public', 'uploaded_on', 'uploader',
+            'image', 'image_thumbnails', 'category', 'is_public', 'uploaded_on', 'uploader',
             'view_count', 'download_count', 'ratings_count', 'average_rating',
-            'is_favorited', 'comments', 'content'
+            'is_favorited', 'reading_progress', 'user_rating', 'comments', 'content'
         ]
         read_only_fields = ['uploaded_by', 'view_count', 'download_count']
     
@@ -93,11 +117,48 @@ class BookSerializer(serializers.ModelSerializer):
             return sum(r.rating for r in ratings) / len(ratings)
         return 0
     
-    def get_is_favorited(self, obj):
+    def get_image_thumbnails(self, obj):
+        """
+        URLs of the cover renditions by width and format, empty until they are generated
+        """
+        thumbnails = obj.thumbnails or {}
+        if not obj.image or thumbnails.get('source') != obj.image.name:
+            return {}
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Collection.objects.filter(user=request.user, book=obj).exists()
-        return False
+        storage = obj.image.storage
+        urls = {}
+        for width, formats in thumbnails.get('sizes', {}).items():
+            urls[width] = {}
+            for image_format, name in formats.items():
+                url = storage.url(name)
+                urls[width][image_format] = request.build_absolute_uri(url) if request else url
+        return urls
+    
+    def _user_state(self):
+        """
+        The requesting user's favorites, progress and ratings, loaded once per serialization.
+
+        None for anonymous users and for payloads shared between users (``public_only``).
+        """
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated or self.context.get('public_only'):
+            return None
+        if '_user_state' not in self.context:
+            from .book_cache import get_user_book_state
+            self.context['_user_state'] = get_user_book_state(request.user)
+        return self.context['_user_state']
+    
+    def get_is_favorited(self, obj):
+        state = self._user_state()
+        return state is not None and obj.pk in state['favorites']
+    
+    def get_reading_progress(self, obj):
+        state = self._user_state()
+        return state['progress'].get(obj.pk) if state is not None else None
+    
+    def get_user_rating(self, obj):
+        state = self._user_state()
+        return state['ratings'].get(obj.pk) if state is not None else None
     
     def create(self, validated_data):
         request = self.context.get('request')
@@ -167,4 +228,11 @@ class UserAnalyticsSerializer(serializers.ModelSerializer):
         return ReadingProgress.objects.filter(user=obj, completed=False).exclude(current_page=0).count()
     
     def get_favorite_books(self, obj):
-        return obj.favorite_books.count()
\ No newline at end of file
+        return obj.favorite_books.count()
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'offset', 'status', 'book', 'expires_at', 'created_at']
+        read_only_fields = fields
@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save
+from functools import partial
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import UserProfile, Book, BookContent, Comment, Rating, ReadingProgress, Collection, UploadSession
+from .authentication import invalidate_cached_user
+from .cache_utils import invalidate_model_cache
+from .recommendations import invalidate_user_recommendations
+from .revoked_tokens import token_blacklisted
+from .uploads import forget_session
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -21,3 +29,77 @@ def save_user_profile(sender, instance, **kwargs):
         UserProfile.objects.create(user=instance)
     else:
         instance.profile.save()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """
+    Drop the user cached for JWT authentication when it is changed (password, active flag, ...) or deleted
+    """
+    invalidate_cached_user(instance.pk)
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_revoked_token(sender, instance, created, **kwargs):
+    """
+    Add tokens blacklisted by logout, rotation or the admin to the in-memory blacklist filters
+    """
+    if created:
+        token_blacklisted(instance.token.jti)
+
+@receiver(post_delete, sender=UploadSession)
+def forget_upload_session(sender, instance, **kwargs):
+    """
+    Drop the running hash of an upload session deleted in this process (e.g. with its user)
+    """
+    forget_session(instance.pk)
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=ReadingProgress)
+@receiver(post_delete, sender=ReadingProgress)
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_recommendations(sender, instance, **kwargs):
+    """
+    Drop a user's cached recommendations and book state when their ratings, reading progress or collection change
+    """
+    invalidate_user_recommendations(instance.user_id)
+    invalidate_model_cache('UserBookState', instance.user_id)
+
+@receiver(post_delete, sender=Book)
+def release_book_files(sender, instance, **kwargs):
+    """
+    Drop the references of a deleted book's files (also for cascades and bulk deletes) once the delete is committed
+    """
+    for field_file in (instance.ebook, instance.image):
+        if field_file:
+            transaction.on_commit(partial(field_file.storage.delete, field_file.name))
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_lists(sender, instance, **kwargs):
+    """
+    Drop cached book lists and the book's payload whenever a book is created, changed or deleted
+    """
+    invalidate_model_cache('Book')
+    invalidate_model_cache('BookPayload', instance.pk)
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=BookContent)
+@receiver(post_delete, sender=BookContent)
+def invalidate_book_payload(sender, instance, **kwargs):
+    """
+    Drop a book's cached payload when its ratings, comments or content change
+    """
+    invalidate_model_cache('BookPayload', instance.book_id)
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_rating_filters(sender, instance, **kwargs):
+    """
+    Drop cached book lists filtered by rating when ratings change
+    """
+    invalidate_model_cache('Rating')
@@ -0,0 +1,154 @@
+"""
+Content-addressed storage for ebooks and cover images.
+
+Uploads are hashed while they are streamed to disk and stored once under
+their SHA-256 digest (``ebooks/ab/abcd....pdf``). A StoredBlob row counts the
+references to every stored file; deleting a file only drops a reference and
+the file is unlinked when nothing refers to it any more. Checking for, moving
+and unlinking a blob's file all happen while its row is locked, in the same
+transaction as the reference change.
+"""
+import glob
+import hashlib
+import os
+import re
+import tempfile
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+# <upload dir>/<first two hex digits>/<sha256 hex>.<ext>
+BLOB_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.[A-Za-z0-9]+)?$')
+
+INCOMING_DIR = '.incoming'
+
+# Precompressed variants stored next to a blob, by content coding
+SIDECAR_SUFFIXES = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+
+
+def blob_digest(name):
+    """
+    SHA-256 digest encoded in a content-addressed file name, or None for other names
+    """
+    match = BLOB_NAME_RE.search(name or '')
+    return match.group('digest') if match else None
+
+
+def blob_name(directory, digest, original_name):
+    """
+    Content-addressed name for a file with the given digest, keeping the original extension
+    """
+    ext = os.path.splitext(original_name)[1].lower()
+    return '/'.join(part for part in (directory.strip('/'), digest[:2], f'{digest}{ext}') if part)
+
+
+def acquire_blob(name, size, count=1):
+    """
+    Add references to a stored blob.
+
+    Must be called in a transaction; the blob's row stays locked until it ends.
+    """
+    from .models import StoredBlob
+    blob, _ = StoredBlob.objects.select_for_update().get_or_create(name=name, defaults={'size': size})
+    StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + count)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by their content and keeps one copy per content
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, and duplicates are shared
+        return name
+
+    def _save(self, name, content):
+        incoming = self.path(INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        # Hash while streaming the upload into a temporary file on the same filesystem
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            final_name = blob_name(os.path.dirname(name), digest.hexdigest(), name)
+            self._store(tmp_path, final_name, size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return final_name
+
+    def _store(self, path, final_name, size):
+        """
+        Reference a blob and move the local file into place unless the blob's file already exists
+        """
+        final_path = self.path(final_name)
+        # The reference is taken first, so a concurrent delete() cannot unlink the file in between
+        with transaction.atomic():
+            acquire_blob(final_name, size)
+            if os.path.exists(final_path):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(path, final_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(final_path, self.file_permissions_mode)
+
+    def adopt(self, path, directory, original_name, digest, size):
+        """
+        Move a complete local file whose digest is already known into storage.
+
+        The file must be on the same filesystem as MEDIA_ROOT. Returns the stored name.
+        """
+        final_name = blob_name(directory, digest, original_name)
+        self._store(path, final_name, size)
+        return final_name
+
+    def delete(self, name):
+        """
+        Drop one reference to a blob and unlink it once it is unreferenced.
+
+        Files that were stored before content addressing (no StoredBlob row) are kept.
+        """
+        from .models import StoredBlob
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        with transaction.atomic():
+            # Writing first takes the row lock (the write lock on SQLite) before the count is read
+            if not StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') - 1):
+                return
+            blob = StoredBlob.objects.select_for_update().get(name=name)
+            if blob.ref_count > 0:
+                return
+            blob.delete()
+            self.delete_file(name)
+
+    def delete_file(self, name):
+        """
+        Unlink a stored file and the files derived from it (precompressed variants
+        and thumbnails) regardless of its references
+        """
+        super().delete(name)
+        for suffix in SIDECAR_SUFFIXES.values():
+            super().delete(name + suffix)
+        if blob_digest(name):
+            for path in glob.glob(glob.escape(os.path.splitext(self.path(name))[0]) + '-*'):
+                os.remove(path)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
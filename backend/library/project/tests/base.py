@@ -0,0 +1,43 @@
+"""
+Shared setup of the project's tests
+"""
+import shutil
+import tempfile
+from io import BytesIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from project.tiered_cache import local_cache
+
+
+def image_bytes(width, height, image_format='JPEG', color=(200, 30, 30)):
+    """
+    Encoded bytes of a plain image
+    """
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ProjectTestCase(TestCase):
+    """
+    Test case with its own media root, empty caches, manually run jobs and a user to authenticate as
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root, BACKGROUND_JOBS_MODE='manual')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'reader-pass-1!')
+        self.client = APIClient()
+
+    def authenticate(self, user=None):
+        token = RefreshToken.for_user(user or self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
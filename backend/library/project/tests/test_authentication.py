@@ -0,0 +1,89 @@
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from project.authentication import CachedJWTAuthentication, invalidate_cached_user
+from project.tiered_cache import local_cache
+from .base import ProjectTestCase
+
+
+class CachedJWTAuthenticationTests(ProjectTestCase):
+    def get(self):
+        """
+        Request an authenticated endpoint and return the response with the user lookups it made
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/collections/')
+        lookups = [query['sql'] for query in queries.captured_queries if 'WHERE "auth_user"."id"' in query['sql']]
+        return response, lookups
+
+    def test_users_are_loaded_once(self):
+        self.authenticate()
+        response, lookups = self.get()
+        self.assertEqual((response.status_code, len(lookups)), (200, 1))
+        response, lookups = self.get()
+        self.assertEqual((response.status_code, lookups), (200, []))
+
+    def test_saved_users_are_loaded_again(self):
+        self.authenticate()
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get()[0].status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        response, lookups = self.get()
+        self.assertEqual((response.status_code, len(lookups)), (200, 1))
+
+    def test_logout_from_all_devices_drops_the_cached_user(self):
+        self.authenticate()
+        self.get()
+        self.client.post('/auth/logout-all-devices/')
+        self.assertEqual(len(self.get()[1]), 1)
+
+        self.get()
+        invalidate_cached_user(self.user.pk)
+        self.assertEqual(len(self.get()[1]), 1)
+
+    def test_cached_users_have_their_other_fields_deferred(self):
+        self.user.email = 'keep@example.com'
+        self.user.first_name = 'Keep'
+        self.user.save()
+        token = AccessToken.for_user(self.user)
+        CachedJWTAuthentication().get_user(token)
+        # The password hash is never cached
+        self.assertFalse(any(
+            self.user.password.encode() in data for _, data, _ in local_cache._entries.values()
+        ))
+
+        user = CachedJWTAuthentication().get_user(token)
+        self.assertEqual(user.username, 'reader')
+        self.assertTrue(user.is_active)
+        self.assertTrue({'email', 'password', 'first_name'} <= user.get_deferred_fields())
+        # Saving writes only the loaded fields
+        user.set_password('new-pass-1!')
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.email, self.user.first_name), ('keep@example.com', 'Keep'))
+        self.assertTrue(self.user.check_password('new-pass-1!'))
+
+    def test_tokens_issued_before_a_password_change_are_refused(self):
+        # Overriding SIMPLE_JWT would not reach the api_settings already imported by simplejwt's modules
+        patcher = mock.patch.object(api_settings, 'CHECK_REVOKE_TOKEN', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = AccessToken.for_user(self.user)
+        CachedJWTAuthentication().get_user(token)
+        self.assertEqual(CachedJWTAuthentication().get_user(token).pk, self.user.pk)
+
+        self.user.set_password('new-pass-1!')
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().get_user(token)
+        self.assertEqual(CachedJWTAuthentication().get_user(AccessToken.for_user(self.user)).pk, self.user.pk)
+        # Also once the user is cached again
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().get_user(token)
@@ -0,0 +1,93 @@
+import os
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+from project.avatars import INCOMING_DIR, PROCESS_PROFILE_PICTURE
+from project.jobs import run_pending
+from project.models import BackgroundJob, UserProfile
+from .base import ProjectTestCase, image_bytes
+
+UPLOAD_URL = '/api/profiles/upload-profile-picture/'
+
+
+class ProfilePictureTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.profile = UserProfile.objects.get(user=self.user)
+
+    def upload(self, data, name='avatar.jpg'):
+        return self.client.post(UPLOAD_URL, {'profile_picture': SimpleUploadedFile(name, data)}, format='multipart')
+
+    def incoming_files(self):
+        incoming = os.path.join(self.media_root, INCOMING_DIR)
+        return os.listdir(incoming) if os.path.isdir(incoming) else []
+
+    def test_upload_is_rendered_in_the_background(self):
+        response = self.upload(image_bytes(1200, 800))
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['processing'])
+
+        run_pending()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.pending_profile_picture, '')
+        self.assertEqual(set(self.profile.profile_picture_renditions), {'64', '128', '256'})
+        with Image.open(self.profile.profile_picture.path) as image:
+            self.assertEqual(image.size, (256, 256))
+        self.assertEqual(self.incoming_files(), [])
+
+    def test_rejects_files_that_are_not_images(self):
+        self.assertEqual(self.upload(b'not an image').status_code, 400)
+        self.assertFalse(BackgroundJob.objects.filter(kind=PROCESS_PROFILE_PICTURE).exists())
+
+    def test_rejects_truncated_images(self):
+        data = image_bytes(1200, 800)
+        response = self.upload(data[:len(data) // 2])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.incoming_files(), [])
+
+    @override_settings(PROFILE_PICTURE_MAX_UPLOAD_SIZE=100)
+    def test_rejects_large_files(self):
+        self.assertEqual(self.upload(image_bytes(64, 64)).status_code, 400)
+
+    def test_profile_update_validates_pictures(self):
+        url = f'/api/profiles/{self.profile.pk}/'
+        response = self.client.patch(url, {'profile_picture': SimpleUploadedFile('a.jpg', b'junk')}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BackgroundJob.objects.filter(kind=PROCESS_PROFILE_PICTURE).exists())
+
+        response = self.client.patch(
+            url, {'profile_picture': SimpleUploadedFile('a.png', image_bytes(64, 64, 'PNG'))}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BackgroundJob.objects.filter(kind=PROCESS_PROFILE_PICTURE).exists())
+
+    def test_undecodable_staged_file_fails_without_retries(self):
+        self.upload(image_bytes(1200, 800))
+        self.profile.refresh_from_db()
+        staged = os.path.join(self.media_root, self.profile.pending_profile_picture)
+        # Corrupted after the upload check, e.g. by a partial write to storage
+        with open(staged, 'r+b') as file:
+            file.truncate(os.path.getsize(staged) // 2)
+
+        with self.assertLogs('project.jobs', 'ERROR'):
+            run_pending()
+        job = BackgroundJob.objects.get(kind=PROCESS_PROFILE_PICTURE)
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.pending_profile_picture, '')
+        self.assertFalse(os.path.exists(staged))
+        self.assertFalse(self.client.get(f'/api/profiles/{self.profile.pk}/').json()['data']['profile_picture_processing'])
+
+    def test_last_failed_attempt_drops_the_upload(self):
+        self.upload(image_bytes(300, 300))
+        self.profile.refresh_from_db()
+        staged = self.profile.pending_profile_picture
+        with override_settings(BACKGROUND_JOB_MAX_ATTEMPTS=1, PROFILE_PICTURE_SIZES=()):
+            # max() of no sizes fails the job with an error that is not a decode error
+            with self.assertLogs('project.jobs', 'ERROR'):
+                run_pending()
+        self.assertEqual(BackgroundJob.objects.get(kind=PROCESS_PROFILE_PICTURE).status, 'failed')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.pending_profile_picture, '')
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, staged)))
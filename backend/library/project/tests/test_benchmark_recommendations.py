@@ -0,0 +1,57 @@
+import json
+import os
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connections
+from project.models import Book, Collection, Rating
+from .base import ProjectTestCase
+
+
+class BenchmarkRecommendationsTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        # The command creates (and removes) its database connection itself
+        self.enterContext(mock.patch.object(type(self), 'databases', {'default', 'benchmark'}))
+
+    def benchmark(self, **options):
+        output = os.path.join(self.media_root, 'results.json')
+        call_command('benchmark_recommendations', output=output, stdout=StringIO(), **options)
+        with open(output) as f:
+            return json.load(f)
+
+    def test_runs_on_an_isolated_database(self):
+        book = Book.objects.create(title='Live book', author='Author', category='Novel', is_public=True)
+        Rating.objects.create(user=self.user, book=book, rating=5)
+
+        results = self.benchmark(users=30, books=40, interactions=600, strategies='popular,heuristic')
+        self.assertEqual(results['params']['source'], 'generated')
+        # Only the generated catalog is measured
+        self.assertEqual(results['dataset']['catalog_size'], 40)
+        self.assertEqual(set(results['strategies']), {'popular', 'heuristic'})
+        self.assertIn('precision@10', results['strategies']['popular'])
+
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Live book'])
+        self.assertEqual(Rating.objects.count(), 1)
+        self.assertNotIn('benchmark', connections)
+
+    def test_exported_live_interactions_can_be_replayed(self):
+        books = [
+            Book.objects.create(title=f'Book {i}', author='Author', category='Novel', is_public=True)
+            for i in range(2)
+        ]
+        Rating.objects.create(user=self.user, book=books[0], rating=4)
+        Collection.objects.create(user=self.user, book=books[1])
+
+        dataset_path = os.path.join(self.media_root, 'dataset.json')
+        call_command('benchmark_recommendations', export_dataset=dataset_path, stdout=StringIO())
+        with open(dataset_path) as f:
+            dataset = json.load(f)
+        self.assertEqual(len(dataset['interactions']), 2)
+        self.assertEqual(len(dataset['books']), 2)
+        self.assertNotIn('username', json.dumps(dataset))
+
+        results = self.benchmark(dataset=dataset_path, strategies='popular', test_fraction=0.5)
+        self.assertEqual(results['dataset']['catalog_size'], 2)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Rating.objects.count(), 1)
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from project.models import Book, Rating
+from project.tiered_cache import local_cache
+from .base import ProjectTestCase
+
+
+class BookListCacheTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(15):
+            Book.objects.create(title=f'Book {i:02d}', author='Author', category='Novel', isbn=str(i))
+        Book.objects.create(title='Private', author='Author', category='Novel', isbn='private', is_public=False, uploaded_by=self.user)
+
+    def book_queries(self, path):
+        """
+        Response for a list request and the model queries it ran; the database cache's own queries are left out
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT') and 'kremlib_cache' not in query['sql']]
+
+    def clear_caches(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_pages_are_served_from_cached_ids_and_count(self):
+        first = self.client.get('/api/books/?ordering=title')
+        self.assertEqual(first.data['count'], 15)
+        self.assertEqual(first.data['results'][0]['title'], 'Book 00')
+        self.assertIsNotNone(first.data['next'])
+
+        second, queries = self.book_queries('/api/books/?ordering=title')
+        self.assertEqual(second.data, first.data)
+        self.assertFalse([sql for sql in queries if 'COUNT' in sql], queries)
+        self.assertEqual(len(self.client.get('/api/books/?ordering=title&page=2').data['results']), 3)
+        self.assertEqual(self.client.get('/api/books/?page=9').status_code, 404)
+
+    def test_entries_are_scoped_by_visibility(self):
+        self.assertEqual(self.client.get('/api/books/').data['count'], 15)
+        self.authenticate()
+        self.assertEqual(self.client.get('/api/books/').data['count'], 16)
+
+    def test_book_writes_invalidate_pages(self):
+        self.client.get('/api/books/?ordering=title')
+        book = Book.objects.create(title='A first book', author='Author', category='Novel', isbn='new')
+        response = self.client.get('/api/books/?ordering=title')
+        self.assertEqual(response.data['count'], 16)
+        self.assertEqual(response.data['results'][0]['title'], 'A first book')
+
+        book.is_public = False
+        book.save()
+        self.assertEqual(self.client.get('/api/books/?ordering=title').data['count'], 15)
+
+    def test_rating_filters_follow_ratings(self):
+        self.assertEqual(self.client.get('/api/books/?min_rating=4').data['count'], 0)
+        Rating.objects.create(user=self.user, book=Book.objects.get(isbn='3'), rating=5)
+        self.assertEqual(self.client.get('/api/books/?min_rating=4').data['count'], 1)
+
+    def test_cold_pages_prefetch_related_rows(self):
+        for book in Book.objects.filter(is_public=True):
+            Rating.objects.create(user=self.user, book=book, rating=4)
+        _, small_page = self.book_queries('/api/books/?page_size=2')
+        self.clear_caches()
+        response, full_page = self.book_queries('/api/books/?page_size=12')
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertEqual(response.data['results'][0]['ratings_count'], 1)
+        self.assertEqual(response.data['results'][0]['average_rating'], 4)
+        # Serializing more books must not cost more queries
+        self.assertEqual(len(full_page), len(small_page), full_page)
+
+    def test_warm_payloads_skip_related_rows(self):
+        _, cold = self.book_queries('/api/books/?page_size=12')
+        _, warm = self.book_queries('/api/books/?page_size=12')
+        self.assertLess(len(warm), len(cold))
+        self.assertFalse([sql for sql in warm if 'project_rating' in sql], warm)
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from project.models import Book, Collection, Comment, Rating, ReadingProgress
+from .base import ProjectTestCase
+
+
+class BookPayloadTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            Book.objects.create(title=f'Book {i}', author='Author', category='Novel', isbn=str(i))
+        self.book = Book.objects.get(isbn='2')
+        Collection.objects.create(user=self.user, book=self.book)
+        Rating.objects.create(user=self.user, book=self.book, rating=4)
+        ReadingProgress.objects.create(user=self.user, book=self.book, current_page=3, total_pages=10)
+        self.other = User.objects.create_user('other', 'other@example.com', 'other-pass-1!')
+
+    def item(self, items):
+        return next(item for item in items if item['id'] == self.book.id)
+
+    def detail(self):
+        return self.client.get(f'/api/books/{self.book.id}/').json()['data']
+
+    def test_cached_responses_get_each_users_fields(self):
+        anonymous = self.client.get('/api/books/popular/').json()
+        self.assertFalse(any(item['is_favorited'] or item['user_rating'] for item in anonymous))
+
+        self.authenticate()
+        with CaptureQueriesContext(connection) as queries:
+            mine = self.item(self.client.get('/api/books/popular/').json())
+        self.assertEqual((mine['is_favorited'], mine['user_rating']), (True, 4))
+        self.assertEqual(mine['reading_progress']['current_page'], 3)
+        # The shared response is reused; only the user's state is loaded
+        self.assertEqual([query['sql'] for query in queries.captured_queries if 'project_book"' in query['sql']], [])
+
+        self.authenticate(self.other)
+        theirs = self.item(self.client.get('/api/books/popular/').json())
+        self.assertEqual((theirs['is_favorited'], theirs['user_rating'], theirs['reading_progress']), (False, None, None))
+
+    def test_list_and_detail_get_the_users_fields(self):
+        self.authenticate()
+        page = self.client.get('/api/books/?ordering=title').json()
+        self.assertTrue(self.item(page['results'])['is_favorited'])
+        self.assertEqual(self.detail()['user_rating'], 4)
+        self.assertEqual(self.client.get('/api/books/by_category/?category=Novel').json()['count'], 5)
+
+    def test_view_counts_are_not_frozen_in_the_payload(self):
+        views = self.detail()['view_count']
+        self.assertEqual(self.detail()['view_count'], views + 1)
+
+    def test_user_changes_update_their_fields(self):
+        self.authenticate()
+        self.assertTrue(self.detail()['is_favorited'])
+        Collection.objects.filter(user=self.user, book=self.book).delete()
+        Rating.objects.filter(user=self.user, book=self.book).get().delete()
+        data = self.detail()
+        self.assertFalse(data['is_favorited'])
+        self.assertIsNone(data['user_rating'])
+
+    def test_ratings_and_comments_update_the_shared_payload(self):
+        self.authenticate()
+        self.assertEqual(self.detail()['ratings_count'], 1)
+        Rating.objects.create(user=self.other, book=self.book, rating=2)
+        Comment.objects.create(user=self.other, book=self.book, content='Good read')
+        data = self.detail()
+        self.assertEqual(data['ratings_count'], 2)
+        self.assertEqual(len(data['comments']), 1)
@@ -0,0 +1,182 @@
+import time
+from unittest import mock
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from project import cache_utils
+from project.cache_utils import cache_result, get_generations, invalidate_model_cache, model_cache_key
+from project.db_cache import DatabaseCache
+from project.models import Book, Rating
+from project.tiered_cache import LocalLRU, local_cache, tiered_cache
+from .base import ProjectTestCase
+
+# Books passed to book_summary, once per computed (not cached) result
+summarized = []
+
+
+@cache_result(timeout=60, model='Book')
+def book_summary(book, detail=False):
+    summarized.append(book.pk)
+    return f'{book.title} ({len(summarized)})'
+
+
+class LocalLRUTests(ProjectTestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        lru = LocalLRU(max_entries=3, max_bytes=10 ** 6, timeout=60)
+        for i in range(4):
+            lru.set(i, [i])
+        self.assertIsNone(lru.get(0))
+        self.assertEqual(lru.get(1), [1])
+        lru.set('new', 'value')
+        self.assertIsNone(lru.get(2))
+
+    def test_byte_limit_and_expiry(self):
+        lru = LocalLRU(max_entries=10, max_bytes=100, timeout=60)
+        for key in 'abc':
+            lru.set(key, key * 40)
+        self.assertIsNone(lru.get('a'))
+        self.assertLessEqual(lru.stats()['bytes'], 100)
+
+        lru = LocalLRU(max_entries=10, max_bytes=1000, timeout=0.05)
+        lru.set('a', 1)
+        time.sleep(0.06)
+        self.assertIsNone(lru.get('a'))
+
+    def test_values_are_copies(self):
+        lru = LocalLRU(max_entries=10, max_bytes=1000, timeout=60)
+        lru.set('list', [1])
+        lru.get('list').append(2)
+        self.assertEqual(lru.get('list'), [1])
+
+
+class GenerationTests(ProjectTestCase):
+    def test_invalidation_changes_model_keys(self):
+        model_key, instance_key = model_cache_key('Book', 'list'), model_cache_key('Book', 'detail', instance_id=1)
+        invalidate_model_cache('Book', 2)
+        self.assertEqual(model_cache_key('Book', 'list'), model_key)
+        self.assertEqual(model_cache_key('Book', 'detail', instance_id=1), instance_key)
+        invalidate_model_cache('Book', 1)
+        self.assertEqual(model_cache_key('Book', 'list'), model_key)
+        self.assertNotEqual(model_cache_key('Book', 'detail', instance_id=1), instance_key)
+        invalidate_model_cache('Book')
+        self.assertNotEqual(model_cache_key('Book', 'list'), model_key)
+
+    def test_lost_counters_restart_above_previous_values(self):
+        before = get_generations('Book')[0]
+        cache.delete(cache_utils._generation_key('Book'))
+        local_cache.clear()
+        # Restarted counters are timestamps; make sure the clock has moved on
+        with mock.patch.object(cache_utils.time, 'time', return_value=time.time() + 1):
+            self.assertGreater(get_generations('Book')[0], before)
+
+    def test_cached_generations_skip_the_shared_cache(self):
+        get_generations('Book', 1)
+        with CaptureQueriesContext(connection) as queries:
+            get_generations('Book', 1)
+        self.assertEqual(queries.captured_queries, [])
+
+    def test_other_workers_invalidations_show_after_the_l1_timeout(self):
+        key = model_cache_key('Book', 'list')
+        # Another worker bumps the shared counter only
+        cache.incr(cache_utils._generation_key('Book'))
+        self.assertEqual(model_cache_key('Book', 'list'), key)
+        with override_settings(CACHE_GENERATION_L1_TIMEOUT=0):
+            local_cache.delete(cache_utils._generation_key('Book'))
+            self.assertNotEqual(model_cache_key('Book', 'list'), key)
+
+
+class CacheResultTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        summarized.clear()
+        self.first = Book.objects.create(title='First', author='Author', category='Novel', isbn='1')
+        self.second = Book.objects.create(title='Second', author='Author', category='Novel', isbn='2')
+
+    def test_results_are_cached_per_argument(self):
+        self.assertEqual(book_summary(self.first), book_summary(self.first))
+        book_summary(self.first, detail=True)
+        book_summary(self.second)
+        self.assertEqual(summarized, [self.first.pk, self.first.pk, self.second.pk])
+
+    def test_instance_invalidation_only_drops_that_instances_results(self):
+        book_summary(self.first)
+        book_summary(self.second)
+        invalidate_model_cache('Book', self.first.pk)
+        book_summary(self.first)
+        book_summary(self.second)
+        self.assertEqual(summarized, [self.first.pk, self.second.pk, self.first.pk])
+
+    def test_model_invalidation_drops_every_result(self):
+        book_summary(self.first)
+        book_summary(self.second)
+        invalidate_model_cache('Book')
+        book_summary(self.first)
+        book_summary(self.second)
+        self.assertEqual(len(summarized), 4)
+
+    def test_invalidation_works_after_the_shared_cache_is_cleared(self):
+        book_summary(self.first)
+        cache.clear()
+        invalidate_model_cache('Book')
+        book_summary(self.first)
+        self.assertEqual(len(summarized), 2)
+
+
+class ModelSignalInvalidationTests(ProjectTestCase):
+    def test_writes_bump_the_generations_of_cached_responses(self):
+        book = Book.objects.create(title='Book', author='Author', category='Novel', isbn='1')
+        books, payload = get_generations('Book')[0], get_generations('BookPayload', book.pk)[1]
+        book.title = 'Renamed'
+        book.save()
+        self.assertGreater(get_generations('Book')[0], books)
+        self.assertGreater(get_generations('BookPayload', book.pk)[1], payload)
+
+        ratings = get_generations('Rating')[0]
+        Rating.objects.create(user=self.user, book=book, rating=4)
+        self.assertGreater(get_generations('Rating')[0], ratings)
+
+    def test_cached_responses_follow_book_changes(self):
+        book = Book.objects.create(title='Book', author='Author', category='Novel', isbn='1')
+        self.assertEqual(self.client.get('/api/books/search/', {'q': 'Book'}).json()['count'], 1)
+        Book.objects.create(title='Another Book', author='Author', category='Novel', isbn='2')
+        self.assertEqual(self.client.get('/api/books/search/', {'q': 'Book'}).json()['count'], 2)
+        book.delete()
+        self.assertEqual(self.client.get('/api/books/search/', {'q': 'Book'}).json()['count'], 1)
+
+
+class TieredCacheTests(ProjectTestCase):
+    def test_local_tier_is_read_first(self):
+        tiered_cache.set('key', {'a': 1}, 60)
+        self.assertEqual(cache.get('key'), {'a': 1})
+        cache.set('key', 'changed')
+        self.assertEqual(tiered_cache.get('key'), {'a': 1})
+        local_cache.clear()
+        self.assertEqual(tiered_cache.get('key'), 'changed')
+
+
+class DatabaseCacheTests(ProjectTestCase):
+    def test_default_cache_is_the_database_cache(self):
+        self.assertIsInstance(caches['default'], DatabaseCache)
+
+    def test_incr_keeps_the_value_and_expiry(self):
+        cache.set('counter', 5, None)
+        self.assertEqual(cache.incr('counter', 3), 8)
+        self.assertEqual(cache.get('counter'), 8)
+        cache.set('short', 1, 1)
+        cache.incr('short')
+        time.sleep(1.1)
+        self.assertIsNone(cache.get('short'))
+
+    def test_incr_of_missing_or_expired_keys_fails(self):
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.set('expired', 1, 1)
+        time.sleep(1.1)
+        with self.assertRaises(ValueError):
+            cache.incr('expired')
+
+    def test_add_only_sets_missing_keys(self):
+        self.assertTrue(cache.add('lock', 1, None))
+        self.assertFalse(cache.add('lock', 2, None))
+        self.assertEqual(cache.get('lock'), 1)
@@ -0,0 +1,107 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from project import cache_metrics
+from project.models import Book
+from project.tiered_cache import LocalLRU, TieredCache
+from .base import ProjectTestCase
+
+
+class CacheMetricsTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_metrics.reset()
+        self.addCleanup(cache_metrics.reset)
+
+    def test_counters_are_summed_with_derived_ratios(self):
+        cache_metrics.record('books', hits=3, misses=1, gets=4, get_us=8000, sets=2, bytes=300, set_us=1000)
+        metrics = cache_metrics.snapshot()['books']
+        self.assertEqual(metrics['hit_ratio'], 0.75)
+        self.assertEqual(metrics['avg_get_ms'], 2.0)
+        self.assertEqual(metrics['avg_set_ms'], 0.5)
+        self.assertEqual(metrics['avg_entry_bytes'], 150)
+
+        # Counters flushed by another worker add to the same totals
+        cache_metrics.record('books', hits=1)
+        cache_metrics.flush()
+        self.assertEqual(cache_metrics.snapshot()['books']['hits'], 4)
+
+    def test_untouched_namespaces_have_no_ratios(self):
+        cache_metrics.record('cold', evictions=1)
+        metrics = cache_metrics.snapshot()['cold']
+        self.assertIsNone(metrics['hit_ratio'])
+        self.assertIsNone(metrics['avg_get_ms'])
+        self.assertIsNone(metrics['avg_entry_bytes'])
+
+    def test_counters_restart_after_the_shared_cache_is_cleared(self):
+        cache_metrics.record('books', hits=2)
+        cache_metrics.flush()
+        cache.clear()
+        cache_metrics.record('books', hits=1)
+        self.assertEqual(cache_metrics.snapshot()['books']['hits'], 1)
+
+    def test_disabled_metrics_are_not_recorded(self):
+        with self.settings(CACHE_METRICS_ENABLED=False):
+            cache_metrics.record('books', hits=1)
+        self.assertEqual(cache_metrics.snapshot(), {})
+
+    def test_tiered_cache_accesses_are_counted(self):
+        tiered = TieredCache(LocalLRU(max_entries=1, max_bytes=10000, timeout=60), cache)
+        tiered.get('a', namespace='books')
+        tiered.set('a', 'value', namespace='books')
+        tiered.get('a', namespace='books')
+        tiered.local.clear()
+        tiered.get('a', namespace='books')
+        tiered.set('b', 'value', namespace='books')
+        metrics = cache_metrics.snapshot()['books']
+        self.assertEqual((metrics['gets'], metrics['hits'], metrics['l1_hits'], metrics['misses']), (3, 2, 1, 1))
+        self.assertEqual(metrics['sets'], 2)
+        self.assertEqual(metrics['evictions'], 1)
+        self.assertGreater(metrics['bytes'], 0)
+
+
+class CacheMetricsEndpointTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_metrics.reset()
+        self.addCleanup(cache_metrics.reset)
+        for i in range(3):
+            Book.objects.create(title=f'Book {i}', author='Author', category='Novel', isbn=str(i))
+
+    def test_cached_views_are_counted_by_namespace(self):
+        self.client.get('/api/books/popular/')
+        self.client.get('/api/books/popular/')
+        metrics = cache_metrics.snapshot()['BookViewSet.popular']
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['sets']), (1, 1, 1))
+        self.assertGreater(metrics['bytes'], 0)
+
+    def test_endpoint_is_for_admins(self):
+        self.authenticate()
+        self.assertEqual(self.client.get('/cache/metrics/').status_code, 403)
+        self.assertEqual(self.client.delete('/cache/metrics/').status_code, 403)
+
+    def test_endpoint_reports_and_resets_the_metrics(self):
+        self.client.get('/api/books/popular/')
+        self.user.is_staff = True
+        self.user.save()
+        self.authenticate()
+        response = self.client.get('/cache/metrics/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('BookViewSet.popular', response.json()['data']['namespaces'])
+        self.assertIn('entries', response.json()['data']['local_cache'])
+
+        self.assertEqual(self.client.delete('/cache/metrics/').status_code, 200)
+        self.assertEqual(cache_metrics.snapshot(), {})
+
+    def test_cache_stats_command(self):
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('No cache activity recorded yet', out.getvalue())
+
+        self.client.get('/api/books/popular/')
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('BookViewSet.popular', out.getvalue())
+
+        call_command('cache_stats', reset=True, stdout=out)
+        self.assertEqual(cache_metrics.snapshot(), {})
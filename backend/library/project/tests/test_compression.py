@@ -0,0 +1,66 @@
+import gzip
+import os
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from project.compression import parse_accept_encoding
+from project.models import Book
+from .base import ProjectTestCase
+
+
+class ParseAcceptEncodingTests(SimpleTestCase):
+    def test_quality_values(self):
+        self.assertEqual(parse_accept_encoding('br;q=1, GZIP;q=0.5, identity'), {'br': 1.0, 'gzip': 0.5, 'identity': 1.0})
+        self.assertEqual(parse_accept_encoding('gzip;q=zero'), {'gzip': 0.0})
+        self.assertEqual(parse_accept_encoding(None), {})
+
+
+class PrecompressedVariantTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.text = b'the same line again\n' * 2000
+        self.book = Book.objects.create(title='Text', author='Author', category='Novel', isbn='1', uploaded_by=self.user)
+        self.book.ebook.save('book.txt', ContentFile(self.text))
+        self.read_url = f'/api/books/{self.book.id}/read/'
+
+    def compress(self):
+        call_command('compress_ebooks', workers=1, stdout=StringIO())
+
+    def read_gzip(self, accept='gzip', **headers):
+        return self.client.get(self.read_url, HTTP_ACCEPT_ENCODING=accept, **headers)
+
+    def test_identity_until_variants_are_written(self):
+        response = self.read_gzip()
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_accepted_variant_is_served(self):
+        self.compress()
+        self.assertTrue(os.path.exists(self.book.ebook.path + '.gz'))
+        response = self.read_gzip('br;q=1, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.text)
+        self.assertIn('-gzip', response['ETag'])
+        self.assertNotIn('Accept-Ranges', response)
+
+        not_modified = self.read_gzip(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn('Accept-Encoding', not_modified['Vary'])
+
+    def test_refused_codings_and_ranges_get_the_original(self):
+        self.compress()
+        self.assertNotIn('Content-Encoding', self.read_gzip('gzip;q=0'))
+        response = self.read_gzip(HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), self.text[:10])
+
+    def test_variants_are_deleted_with_the_book(self):
+        self.compress()
+        path = self.book.ebook.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/books/{self.book.id}/').status_code, 204)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.gz'))
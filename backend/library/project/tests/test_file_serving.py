@@ -0,0 +1,116 @@
+import os
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+from django.utils.http import http_date
+from project.compression import write_sidecars
+from project.file_serving import parse_range_header
+from project.models import Book
+from .base import ProjectTestCase
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_single_and_open_ended_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), [(0, 9)])
+        self.assertEqual(parse_range_header('bytes=90-', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=95-200', 100), [(95, 99)])
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range_header('bytes=-10', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=-500', 100), [(0, 99)])
+
+    def test_overlapping_and_adjacent_ranges_are_merged(self):
+        self.assertEqual(parse_range_header('bytes=20-29,0-4,5-9,25-40', 100), [(0, 9), (20, 40)])
+
+    def test_unsatisfiable_ranges(self):
+        self.assertEqual(parse_range_header('bytes=100-', 100), [])
+        self.assertEqual(parse_range_header('bytes=-0', 100), [])
+
+    def test_malformed_headers_mean_the_whole_file(self):
+        for header in (None, '', 'items=0-1', 'bytes=5', 'bytes=9-2', 'bytes=a-b', 'bytes=-'):
+            self.assertIsNone(parse_range_header(header, 100), header)
+
+    def test_too_many_ranges_mean_the_whole_file(self):
+        header = 'bytes=' + ','.join(f'{i * 2}-{i * 2}' for i in range(17))
+        self.assertIsNone(parse_range_header(header, 100))
+
+
+class ServeFileTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.data = bytes(range(256)) * 400
+        self.book = Book.objects.create(title='Served', author='Author', category='Novel', isbn='served')
+        self.book.ebook.save('served.txt', ContentFile(self.data))
+        self.read_url = f'/api/books/{self.book.pk}/read/'
+        self.download_url = f'/api/books/{self.book.pk}/download/'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_whole_file_is_streamed(self):
+        response = self.client.get(self.download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.data)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_byte_ranges(self):
+        response = self.client.get(self.read_url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.body(response), self.data[10:20])
+
+        response = self.client.get(self.read_url, HTTP_RANGE='bytes=0-4,100-104')
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        body = self.body(response)
+        self.assertEqual(len(body), int(response['Content-Length']))
+        self.assertIn(self.data[100:105], body)
+
+        response = self.client.get(self.read_url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_resumed_downloads_are_not_counted(self):
+        self.client.get(self.download_url)
+        self.client.get(self.download_url, HTTP_RANGE='bytes=100-')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.download_count, 1)
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.download_url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.book.refresh_from_db()
+        self.assertEqual(etag, f'"{self.book.ebook_hash}"')
+
+        self.assertEqual(self.client.get(self.download_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.download_url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.download_url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(
+            self.client.get(self.download_url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE=last_modified).status_code, 206
+        )
+        # A changed file invalidates the client's validators: the whole file is sent
+        self.assertEqual(
+            self.client.get(self.download_url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"stale"').status_code, 200
+        )
+
+    def test_offloaded_responses_carry_the_validators(self):
+        expected = self.client.get(self.download_url)
+        for mode, header in (('x-accel-redirect', 'X-Accel-Redirect'), ('x-sendfile', 'X-Sendfile')):
+            with override_settings(FILE_SERVE_MODE=mode):
+                response = self.client.get(self.download_url)
+            self.assertIn(header, response)
+            self.assertEqual(response['ETag'], expected['ETag'])
+            self.assertEqual(response['Last-Modified'], expected['Last-Modified'])
+
+    @override_settings(PRECOMPRESS_MIN_SIZE=0)
+    def test_precompressed_variant_uses_the_file_timestamp(self):
+        path = self.book.ebook.path
+        self.assertIn('gzip', write_sidecars(path))
+        os.utime(path + '.gz', (os.stat(path).st_atime, os.stat(path).st_mtime + 3600))
+
+        response = self.client.get(self.read_url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Last-Modified'], http_date(os.stat(path).st_mtime))
+        self.assertEqual(
+            self.client.get(self.read_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
+from project import jobs
+from project.ingestion import INGEST_BOOK, enqueue_ingestion
+from project.models import BackgroundJob, Book, BookContent, BookPreview, BookSearchIndex
+from .base import ProjectTestCase
+
+
+class JobQueueTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calls = []
+        # Handlers registered by a test are dropped afterwards
+        self.enterContext(mock.patch.dict(jobs.JOB_HANDLERS))
+
+    def register(self, kind, error=None):
+        def handler(job):
+            self.calls.append(job.pk)
+            if error is not None:
+                raise error
+        jobs.JOB_HANDLERS[kind] = handler
+
+    def test_jobs_run_once_and_are_marked_done(self):
+        self.register('test')
+        job = jobs.enqueue('test')
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(self.calls, [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_pending_jobs_for_an_object_are_reused(self):
+        first = jobs.enqueue('test', object_id=1)
+        self.assertEqual(jobs.enqueue('test', object_id=1).pk, first.pk)
+        self.assertNotEqual(jobs.enqueue('test', object_id=2).pk, first.pk)
+
+    def test_delayed_jobs_wait_until_due(self):
+        self.register('test')
+        job = jobs.enqueue('test', delay=60)
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertGreater(jobs.next_due_in(), 0)
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.run_pending(), 1)
+
+    def test_failed_jobs_are_retried_later_until_the_attempt_limit(self):
+        self.register('test', RuntimeError('flaky'))
+        job = jobs.enqueue('test')
+        for attempt in range(1, 4):
+            self.assertEqual(jobs.run_pending(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.attempts, job.error), (attempt, 'flaky'))
+            if attempt < 3:
+                self.assertEqual(job.status, 'pending')
+                # Retries are delayed
+                self.assertEqual(jobs.run_pending(), 0)
+                BackgroundJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_permanent_errors_are_not_retried(self):
+        self.register('test', jobs.PermanentJobError('broken input'))
+        job = jobs.enqueue('test')
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+
+    def test_jobs_without_a_handler_fail_and_are_retried(self):
+        job = BackgroundJob.objects.create(kind='unknown')
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('pending', 1))
+        self.assertIn('unknown', job.error)
+
+    def test_stale_running_jobs_are_requeued(self):
+        self.register('test')
+        job = BackgroundJob.objects.create(
+            kind='test', status='running', started_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertEqual(jobs.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    def test_retries_skip_completed_stages(self):
+        ran = []
+        failures = [RuntimeError('flaky')]
+
+        def flaky():
+            ran.append('second')
+            if failures:
+                raise failures.pop()
+
+        def handler(job):
+            jobs.run_stages(job, [('first', lambda: ran.append('first')), ('second', flaky)])
+        jobs.JOB_HANDLERS['staged'] = handler
+        job = jobs.enqueue('staged')
+        jobs.run_pending()
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(ran, ['first', 'second', 'second'])
+        self.assertEqual((job.status, job.completed_stages), ('done', ['first', 'second']))
+
+
+class IngestionTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.body = b'CHAPTER ONE\n' + b'the quick zebrafish\n' * 400
+
+    def upload(self):
+        response = self.client.post('/api/books/', {
+            'title': 'Fish', 'author': 'Author', 'category': 'Novel', 'isbn': '9', 'year': '2000',
+            'is_public': 'true', 'ebook': SimpleUploadedFile('fish.txt', self.body),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Book.objects.get(pk=response.json()['data']['book']['id'])
+
+    def status(self, book):
+        return self.client.get(f'/api/books/{book.id}/ingestion/').json()['data']['job']
+
+    def test_upload_is_ingested_in_the_background(self):
+        book = self.upload()
+        self.assertEqual(self.status(book)['status'], 'pending')
+        self.assertEqual(book.ebook_hash, '')
+
+        call_command('drain_jobs', stdout=StringIO())
+        book.refresh_from_db()
+        self.assertEqual(len(book.ebook_hash), 64)
+        self.assertEqual(book.page_count, 3)
+        self.assertFalse(BookContent.objects.filter(book=book).exists())
+        self.assertTrue(BookSearchIndex.objects.get(book=book).text.startswith('CHAPTER ONE'))
+        self.assertIn('CHAPTER ONE', BookPreview.objects.get(book=book).table_of_contents)
+        status = self.status(book)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['completed_stages'], ['hash', 'pages', 'text', 'compress', 'preview', 'thumbnails', 'index'])
+
+        response = self.client.get('/api/books/search/', {'q': 'zebrafish quick'})
+        self.assertEqual(response.json()['count'], 1)
+        # Extracted text is indexed but not sent with the books
+        self.assertNotIn(b'zebrafish', self.client.get('/api/books/').content)
+
+    def test_ingestion_can_run_again(self):
+        book = self.upload()
+        jobs.run_pending()
+        enqueue_ingestion(book)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(BackgroundJob.objects.filter(kind=INGEST_BOOK, status='done').count(), 2)
+
+    def test_deleted_books_are_skipped(self):
+        book = self.upload()
+        book.delete()
+        self.assertEqual(jobs.run_pending(kinds=[INGEST_BOOK]), 1)
+        self.assertEqual(BackgroundJob.objects.get(kind=INGEST_BOOK).status, 'done')
@@ -0,0 +1,93 @@
+from unittest import mock
+from django.core.files.base import ContentFile
+from project import pdf_pages
+from project.models import Book, PdfPageText, ReadingProgress
+from .base import ProjectTestCase
+
+
+def pdf_bytes(page_count):
+    """
+    A minimal PDF whose page n reads "Text of page n"
+    """
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join(f'{4 + 2 * i} 0 R' for i in range(page_count)), page_count),
+        '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for i in range(page_count):
+        stream = f'BT /F1 12 Tf 72 720 Td (Text of page {i + 1}) Tj ET'
+        objects.append(
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>'
+        )
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n{stream}\nendstream')
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f'{number} 0 obj\n{body}\nendobj\n'.encode()
+    xref = len(data)
+    data += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    data += b''.join(f'{offset:010d} 00000 n \n'.encode() for offset in offsets)
+    data += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return data
+
+
+class PageTextTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        # Neighboring pages are extracted inline instead of in a thread
+        settings_override = self.settings(BACKGROUND_JOBS_MODE='sync', PDF_PAGE_PREFETCH=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.authenticate()
+        self.book = Book.objects.create(title='Pdf', author='Author', category='Novel', isbn='1')
+        self.book.ebook.save('book.pdf', ContentFile(pdf_bytes(6)))
+
+    def page(self, number, **headers):
+        return self.client.get(f'/api/books/{self.book.id}/pages/{number}/', **headers)
+
+    def stored_pages(self):
+        return sorted(PdfPageText.objects.filter(book=self.book).values_list('page_number', flat=True))
+
+    def test_page_and_its_neighbors_are_extracted_and_stored(self):
+        response = self.page(3)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('Text of page 3', response.data['data']['text'])
+        self.assertEqual(response.data['data']['total_pages'], 6)
+        self.assertEqual(self.stored_pages(), [1, 2, 3, 4, 5])
+        self.assertEqual(ReadingProgress.objects.get(book=self.book, user=self.user).current_page, 3)
+
+    def test_stored_pages_are_not_parsed_again(self):
+        self.page(3)
+        extract = pdf_pages.extract_page_texts
+
+        def without_page_4(path, pages):
+            self.assertNotIn(4, pages)
+            return extract(path, pages)
+        with mock.patch.object(pdf_pages, 'extract_page_texts', side_effect=without_page_4):
+            response = self.page(4)
+        self.assertIn('Text of page 4', response.data['data']['text'])
+        self.assertEqual(self.stored_pages(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(self.page(4, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_pages_out_of_range(self):
+        self.assertEqual(self.page(9).status_code, 404)
+        self.assertEqual(self.page(0).status_code, 404)
+
+    def test_pages_of_a_replaced_file_are_dropped(self):
+        self.page(1)
+        self.book.ebook.save('other.pdf', ContentFile(pdf_bytes(2)))
+        self.book.ebook_hash = ''
+        self.book.page_count = None
+        self.book.save()
+        self.assertEqual(self.page(2).status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(set(PdfPageText.objects.filter(book=self.book).values_list('source_hash', flat=True)), {self.book.ebook_hash})
+
+    def test_text_ebooks_are_split_into_pages(self):
+        book = Book.objects.create(title='Text', author='Author', category='Novel', isbn='2')
+        book.ebook.save('book.txt', ContentFile(b'hello\n' * 2000))
+        response = self.client.get(f'/api/books/{book.id}/pages/2/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.data['data']['text'].startswith('hello'))
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import tracemalloc
+import zipfile
+from io import BytesIO
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from project.epub import extract_epub_preview
+from project.models import Book, BookPreview
+from project.previews import PREVIEW_TEXT_LIMIT
+from .base import ProjectTestCase
+
+
+class StoredPreviewTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.book = Book.objects.create(title='Preview', author='Author', category='Novel', isbn='1')
+        self.book.ebook.save('book.txt', ContentFile(b'Opening line\n' + b'text\n' * 3000 + b'CHAPTER TWO\n'))
+
+    def preview(self):
+        return self.client.get(f'/api/books/{self.book.id}/preview/')
+
+    def test_preview_is_extracted_once_and_stored(self):
+        response = self.preview()
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertIn('CHAPTER TWO', data['table_of_contents'])
+        self.assertTrue(data['preview_text'].startswith('Opening line'))
+        self.assertEqual(len(data['preview_text']), PREVIEW_TEXT_LIMIT + len('...'))
+        self.assertEqual(BookPreview.objects.filter(book=self.book).count(), 1)
+
+        with mock.patch('project.previews.extract_preview') as extract:
+            self.assertEqual(self.preview().status_code, 200)
+        extract.assert_not_called()
+
+    def test_new_ebook_replaces_the_stored_preview(self):
+        self.preview()
+        self.book.ebook.save('other.txt', ContentFile(b'NEW CONTENT HERE\n'))
+        self.book.ebook_hash = ''
+        self.book.save()
+        self.assertEqual(self.preview().json()['table_of_contents'], ['NEW CONTENT HERE'])
+        self.assertEqual(BookPreview.objects.filter(book=self.book).count(), 1)
+
+    def test_outdated_previews_are_extracted_again(self):
+        self.preview()
+        BookPreview.objects.filter(book=self.book).update(version=0, table_of_contents=[])
+        self.assertIn('CHAPTER TWO', self.preview().json()['table_of_contents'])
+        self.assertNotEqual(BookPreview.objects.get(book=self.book).version, 0)
+
+    def test_books_without_an_ebook_have_no_preview(self):
+        book = Book.objects.create(title='Empty', author='Author', category='Novel', isbn='2')
+        self.assertEqual(self.client.get(f'/api/books/{book.id}/preview/').status_code, 404)
+        self.assertFalse(BookPreview.objects.filter(book=book).exists())
+
+
+def write_epub(target, chapters=3, filler=0, nav=True):
+    """
+    Write a minimal EPUB to a path or file with a navigation document (or only an NCX) and ``filler`` extra paragraphs per chapter
+    """
+    container = (
+        '<?xml version="1.0"?><container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">'
+        '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles></container>'
+    )
+    items = ''.join(f'<item id="c{i}" href="text/ch%20{i}.xhtml" media-type="application/xhtml+xml"/>' for i in range(chapters))
+    if nav:
+        items += '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+    itemrefs = ''.join(f'<itemref idref="c{i}"/>' for i in range(chapters))
+    package = (
+        '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0"><manifest>'
+        f'<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/><item id="cover" href="cover.bin" media-type="image/png"/>{items}'
+        f'</manifest><spine toc="ncx">{itemrefs}</spine></package>'
+    )
+    nav_document = (
+        '<html xmlns:epub="http://www.idpf.org/2007/ops"><body><nav epub:type="landmarks"><a href="x">Skip</a></nav><nav epub:type="toc"><ol>'
+        + ''.join(f'<li><a href="text/ch {i}.xhtml">Chapter &amp; {i}</a></li>' for i in range(chapters))
+        + '</ol></nav></body></html>'
+    )
+    ncx = (
+        '<?xml version="1.0"?><ncx xmlns="http://www.daisy.org/z3986/2005/ncx/"><navMap>'
+        + ''.join(f'<navPoint id="n{i}"><navLabel><text>NCX {i}</text></navLabel><content src="text/ch {i}.xhtml"/></navPoint>' for i in range(chapters))
+        + '</navMap></ncx>'
+    )
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('mimetype', 'application/epub+zip')
+        archive.writestr('META-INF/container.xml', container)
+        archive.writestr('OEBPS/content.opf', package)
+        archive.writestr('OEBPS/nav.xhtml', nav_document)
+        archive.writestr('OEBPS/toc.ncx', ncx)
+        archive.writestr('OEBPS/cover.bin', b'\0' * (5 * 1024 * 1024 if filler else 10))
+        for i in range(chapters):
+            archive.writestr(
+                f'OEBPS/text/ch {i}.xhtml',
+                f'<html><head><title>Title</title><style>p {{}}</style></head><body><h1>Heading {i}</h1>'
+                f'<p>Café paragraph {i}</p><script>hidden()</script>{"<p>word</p>" * filler}</body></html>'
+            )
+
+
+class EpubPreviewTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.epub')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_navigation_document_and_first_spine_items(self):
+        write_epub(self.path)
+        preview = extract_epub_preview(self.path, 5000, 50)
+        self.assertEqual(preview['table_of_contents'], ['Chapter & 0', 'Chapter & 1', 'Chapter & 2'])
+        self.assertTrue(preview['preview_text'].startswith('Heading 0\nCafé paragraph 0\nHeading 1'))
+        self.assertNotIn('hidden', preview['preview_text'])
+        self.assertNotIn('Title', preview['preview_text'])
+        # Only the first two spine documents are read
+        self.assertNotIn('Heading 2', preview['preview_text'])
+        self.assertTrue(preview['preview_text'].endswith('...'))
+
+    def test_ncx_and_limits_without_reading_the_whole_book(self):
+        write_epub(self.path, chapters=2, filler=200000, nav=False)
+        tracemalloc.start()
+        try:
+            preview = extract_epub_preview(self.path, 500, 1)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(preview['table_of_contents'], ['NCX 0'])
+        self.assertLessEqual(len(preview['preview_text']), 503)
+        self.assertTrue(preview['preview_text'].endswith('...'))
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+
+class EpubBookPreviewTests(ProjectTestCase):
+    def test_epub_preview_is_stored(self):
+        self.authenticate()
+        epub = BytesIO()
+        write_epub(epub)
+        book = Book.objects.create(title='Epub', author='Author', category='Novel', isbn='1')
+        book.ebook.save('book.epub', ContentFile(epub.getvalue()))
+
+        response = self.client.get(f'/api/books/{book.id}/preview/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['table_of_contents'][0], 'Chapter & 0')
+        self.assertEqual(BookPreview.objects.get(book=book).table_of_contents[2], 'Chapter & 2')
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock, skipIf
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from project import als
+from project.models import Book, Collection, Rating, ReadingProgress
+from .base import ProjectTestCase
+
+
+class RecommendationCacheTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        # No trained model, so the heuristic is used
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, ignore_errors=True)
+        settings_override = self.settings(RECOMMENDER_MODEL_DIR=model_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author='Author', category='Novel', isbn=str(i), view_count=i)
+            for i in range(8)
+        ]
+
+    def recommendations(self):
+        response = self.client.get('/api/books/recommendations/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_anonymous_users_share_popular_books(self):
+        response = self.recommendations()
+        self.assertIn('Age', response)
+        self.assertEqual([book['id'] for book in response.json()], [book.id for book in reversed(self.books)])
+
+    def test_user_recommendations_are_cached(self):
+        self.authenticate()
+        self.assertFalse(self.recommendations().json()['cache']['hit'])
+        with CaptureQueriesContext(connection) as queries:
+            body = self.recommendations().json()
+        self.assertTrue(body['cache']['hit'])
+        self.assertFalse([query['sql'] for query in queries.captured_queries if 'project_readingprogress' in query['sql']])
+
+    def test_activity_invalidates_only_that_users_entry(self):
+        other = User.objects.create_user('other', 'other@example.com', 'other-pass-1!')
+        self.authenticate(other)
+        self.recommendations()
+        self.authenticate()
+        self.recommendations()
+
+        Rating.objects.create(user=self.user, book=self.books[0], rating=5)
+        body = self.recommendations().json()
+        self.assertFalse(body['cache']['hit'])
+        self.assertEqual(body['data']['based_on']['ratings'], 1)
+
+        ReadingProgress.objects.create(user=self.user, book=self.books[1], current_page=3, total_pages=10)
+        self.assertFalse(self.recommendations().json()['cache']['hit'])
+        Collection.objects.create(user=self.user, book=self.books[2])
+        self.assertFalse(self.recommendations().json()['cache']['hit'])
+
+        self.authenticate(other)
+        self.assertTrue(self.recommendations().json()['cache']['hit'])
+
+
+@skipIf(als.np is None, 'NumPy is not installed')
+class FactorModelTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        settings_override = self.settings(RECOMMENDER_MODEL_DIR=self.model_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Two groups of readers who each only read their own half of the catalogue, one factor per group
+        self.books = [Book.objects.create(title=f'Book {i}', author='Author', category='Novel', isbn=str(i)) for i in range(20)]
+        self.readers = [User.objects.create_user(f'reader-{i}') for i in range(12)]
+        for i, reader in enumerate(self.readers):
+            half = self.books[:10] if i % 2 else self.books[10:]
+            for book in half[i % 5:i % 5 + 6]:
+                Rating.objects.create(user=reader, book=book, rating=4)
+
+    def train(self):
+        call_command('train_recommender', factors=2, iterations=8, threads=2, seed=0, stdout=StringIO())
+        return als.load_factor_model()
+
+    def test_recommends_books_read_by_similar_users(self):
+        model = self.train()
+        reader = self.readers[1]
+        self.assertIn(reader.id, model)
+        seen = {book_id for user_id, book_id in als.load_interactions() if user_id == reader.id}
+        recommended = [book_id for book_id, _ in model.recommend(reader.id, exclude=seen, limit=20)]
+        self.assertEqual(set(recommended), {book.id for book in self.books} - seen)
+        # Unread books of the reader's own half rank first
+        own_half = {book.id for book in self.books[:10]} - seen
+        self.assertEqual(set(recommended[:len(own_half)]), own_half)
+
+    def test_view_uses_the_model_and_retrains_invalidate_entries(self):
+        first = self.train()
+        self.authenticate(self.readers[1])
+        body = self.client.get('/api/books/recommendations/').json()
+        self.assertEqual(body['data']['based_on']['strategy'], 'als')
+        self.assertEqual(body['data']['based_on']['model_version'], first.version)
+        self.assertTrue(self.client.get('/api/books/recommendations/').json()['cache']['hit'])
+
+        with mock.patch('project.als.time.time', return_value=first.trained_at + 60):
+            second = self.train()
+        self.assertNotEqual(second.version, first.version)
+        body = self.client.get('/api/books/recommendations/').json()
+        self.assertFalse(body['cache']['hit'])
+        self.assertEqual(body['data']['based_on']['model_version'], second.version)
+        self.assertEqual(len([name for name in os.listdir(self.model_dir) if name.endswith('.npy')]), 1)
+
+    def test_users_without_factors_get_the_heuristic(self):
+        self.train()
+        self.authenticate()
+        body = self.client.get('/api/books/recommendations/').json()
+        self.assertEqual(body['data']['based_on']['strategy'], 'heuristic')
+
+    def test_training_needs_interactions(self):
+        Rating.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command('train_recommender', stdout=StringIO())
+        self.assertIsNone(als.load_factor_model())
@@ -0,0 +1,129 @@
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.http import HttpResponse
+from project import cache_utils
+from project.cache_utils import cached_response
+from project.models import Book
+from project.tiered_cache import local_cache, tiered_cache
+from .base import ProjectTestCase
+
+
+class CachedResponseTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        # Stale entries are refreshed inline and never early
+        settings_override = self.settings(BACKGROUND_JOBS_MODE='sync', RESPONSE_CACHE_EARLY_EXPIRATION_BETA=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.calls = 0
+
+    def compute(self, status=200):
+        self.calls += 1
+        return HttpResponse(f'response {self.calls}', status=status, content_type='text/plain')
+
+    def age(self, key, seconds):
+        """
+        Make a stored entry look ``seconds`` older
+        """
+        entry = tiered_cache.get(key)
+        entry['created'] -= seconds
+        tiered_cache.set(key, entry, 600)
+
+    def test_responses_are_computed_once_and_replayed(self):
+        first = cached_response('key', self.compute, 60)
+        second = cached_response('key', self.compute, 60)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], 'text/plain')
+        self.assertIn('Age', second)
+        self.assertFalse(cache.get('key_lock'))
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(cached_response('key', lambda: self.compute(404), 60).status_code, 404)
+        self.assertEqual(cached_response('key', lambda: self.compute(404), 60).status_code, 404)
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_entries_are_served_while_they_are_refreshed(self):
+        cached_response('key', self.compute, 60)
+        self.age('key', 61)
+        self.assertEqual(cached_response('key', self.compute, 60).content, b'response 1')
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(cached_response('key', self.compute, 60).content, b'response 2')
+
+    def test_stale_entries_use_the_refresh_function(self):
+        cached_response('key', self.compute, 60)
+        self.age('key', 61)
+        refreshed = HttpResponse(b'refreshed')
+        cached_response('key', self.compute, 60, refresh=lambda: refreshed)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cached_response('key', self.compute, 60).content, b'refreshed')
+
+    def test_entries_may_be_refreshed_before_they_expire(self):
+        cached_response('key', self.compute, 1000)
+        entry = tiered_cache.get('key')
+        entry['delta'] = 1.0
+        tiered_cache.set('key', entry, 600)
+        with self.settings(RESPONSE_CACHE_EARLY_EXPIRATION_BETA=1e9):
+            cached_response('key', self.compute, 1000)
+        self.assertEqual(self.calls, 2)
+
+    def test_waiters_use_the_entry_stored_by_the_lock_holder(self):
+        cache.add('key_lock', 1, 30)
+
+        def holder_stores(seconds):
+            entry = cache_utils._response_entry(HttpResponse(b'from holder'), time.time())
+            tiered_cache.shared.set('key', dict(entry, timeout=60))
+        with mock.patch.object(cache_utils.time, 'sleep', side_effect=holder_stores):
+            self.assertEqual(cached_response('key', self.compute, 60).content, b'from holder')
+        self.assertEqual(self.calls, 0)
+
+    def test_waiters_stop_when_the_lock_is_released_without_an_entry(self):
+        cache.add('key_lock', 1, 30)
+        with self.settings(RESPONSE_CACHE_LOCK_WAIT=30), \
+                mock.patch.object(cache_utils.time, 'sleep', side_effect=lambda seconds: cache.delete('key_lock')) as sleep:
+            self.assertEqual(cached_response('key', lambda: self.compute(404), 60).status_code, 404)
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_waiters_compute_the_response_after_the_wait(self):
+        cache.add('key_lock', 1, 30)
+        with self.settings(RESPONSE_CACHE_LOCK_WAIT=0.2):
+            started = time.time()
+            self.assertEqual(cached_response('key', self.compute, 60).content, b'response 1')
+        self.assertGreaterEqual(time.time() - started, 0.2)
+
+
+class CachedEndpointTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(BACKGROUND_JOBS_MODE='sync', RESPONSE_CACHE_EARLY_EXPIRATION_BETA=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for i in range(3):
+            Book.objects.create(title=f'Book {i}', author='Author', category='Novel', isbn=str(i))
+
+    def test_endpoints_replay_rendered_responses(self):
+        for url in ('/api/books/popular/', '/home/', '/api/books/by_category/?category=Novel', '/api/books/search/?q=Book'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, (url, first.content))
+            second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['Content-Type'], first['Content-Type'])
+            self.assertIn('Age', second)
+        self.assertEqual(self.client.get('/api/books/by_category/').status_code, 400)
+
+    def test_book_writes_invalidate_responses(self):
+        self.client.get('/home/')
+        Book.objects.create(title='New arrival', author='Author', category='Novel', isbn='new')
+        self.assertIn(b'New arrival', self.client.get('/home/').content)
+
+    def test_stale_responses_are_refreshed_through_the_view(self):
+        first = self.client.get('/api/books/popular/')
+        # A change that bypasses invalidation, so only a refresh picks it up
+        Book.objects.filter(isbn='0').update(view_count=100)
+        local_cache.clear()
+        later = time.time() + 60 * 60
+        with mock.patch.object(cache_utils.time, 'time', return_value=later):
+            stale = self.client.get('/api/books/popular/')
+        self.assertEqual(stale.content, first.content)
+        self.assertIn(b'"view_count":100', self.client.get('/api/books/popular/').content)
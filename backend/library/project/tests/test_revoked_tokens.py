@@ -0,0 +1,74 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from project.models import BackgroundJob
+from project.revoked_tokens import BloomFilter, PRUNE_EXPIRED_TOKENS, RevokedTokens, prune_expired_tokens
+from .base import ProjectTestCase
+
+
+class BloomFilterTests(ProjectTestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f'member-{i}')
+        self.assertTrue(all(f'member-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RevokedTokensTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.revoked = RevokedTokens()
+
+    def blacklist_elsewhere(self, token):
+        """
+        Blacklist a token the way another worker would: committed and announced, but not added here
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+
+    def test_negative_lookups_run_no_queries_between_syncs(self):
+        token = RefreshToken.for_user(self.user)
+        self.revoked.load()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                self.assertFalse(self.revoked.is_blacklisted(token['jti']))
+        self.assertEqual(queries.captured_queries, [])
+
+    def test_tokens_blacklisted_elsewhere_are_seen_after_the_sync_interval(self):
+        token = RefreshToken.for_user(self.user)
+        self.revoked.load()
+        self.blacklist_elsewhere(token)
+        self.assertFalse(self.revoked.is_blacklisted(token['jti']))
+
+        with override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0):
+            self.revoked._next_check = 0
+            self.assertTrue(self.revoked.is_blacklisted(token['jti']))
+        self.assertIn(token['jti'], self.revoked._recent)
+
+    def test_loaded_filter_finds_blacklisted_tokens(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        self.revoked.load()
+        self.assertTrue(self.revoked.is_blacklisted(token['jti']))
+
+    def test_rotated_refresh_token_is_rejected(self):
+        old = RefreshToken.for_user(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/auth/token/refresh/', {'refresh': str(old)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post('/auth/token/refresh/', {'refresh': str(old)}, format='json').status_code, 401)
+        new = response.json()['refresh']
+        self.assertEqual(self.client.post('/auth/token/verify/', {'token': new}, format='json').status_code, 200)
+
+    def test_pruning_deletes_expired_tokens_and_reschedules(self):
+        RefreshToken.for_user(self.user)
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(days=1))
+        prune_expired_tokens(None)
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertEqual(BackgroundJob.objects.filter(kind=PRUNE_EXPIRED_TOKENS, status='pending').count(), 1)
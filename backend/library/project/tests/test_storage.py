@@ -0,0 +1,100 @@
+import os
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import override_settings
+from project.models import Book, StoredBlob
+from project.storage import blob_digest, content_storage
+from .base import ProjectTestCase
+
+
+class ContentAddressedStorageTests(ProjectTestCase):
+    def create_book(self, isbn, data=b'%PDF-1.4 shared bytes'):
+        return Book.objects.create(
+            title=f'Book {isbn}', category='Novel', isbn=isbn, uploaded_by=self.user,
+            ebook=SimpleUploadedFile('book.pdf', data)
+        )
+
+    def test_identical_files_are_stored_once(self):
+        first, second = self.create_book('1'), self.create_book('2')
+        self.assertEqual(first.ebook.name, second.ebook.name)
+        self.assertIsNotNone(blob_digest(first.ebook.name))
+        self.assertEqual(StoredBlob.objects.get(name=first.ebook.name).ref_count, 2)
+
+    def test_file_is_unlinked_with_its_last_reference(self):
+        self.authenticate()
+        first, second = self.create_book('1'), self.create_book('2')
+        path = first.ebook.path
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/books/{first.pk}/').status_code, 204)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_bulk_deletes_release_references(self):
+        self.create_book('1')
+        self.create_book('2')
+        self.create_book('3', data=b'other bytes')
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(isbn__in=['1', '3']).delete()
+        self.assertEqual(list(StoredBlob.objects.values_list('ref_count', flat=True)), [1])
+
+    def test_failed_save_takes_no_reference(self):
+        book = self.create_book('1')
+        with self.assertRaises(IntegrityError):
+            self.create_book('1', data=b'different bytes')
+        self.assertEqual(list(StoredBlob.objects.values_list('name', 'ref_count')), [(book.ebook.name, 1)])
+
+    def test_storing_again_after_the_last_reference_restores_the_file(self):
+        book = self.create_book('1')
+        name = book.ebook.name
+        content_storage.delete(name)
+        self.assertFalse(content_storage.exists(name))
+        self.assertEqual(content_storage.save('ebooks/again.pdf', ContentFile(b'%PDF-1.4 shared bytes')), name)
+        self.assertTrue(content_storage.exists(name))
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 1)
+
+
+class DedupeMediaTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        legacy = FileSystemStorage(location=self.media_root)
+        self.names = [
+            legacy.save('ebooks/old.txt', ContentFile(b'duplicate')),
+            legacy.save('ebooks/old-copy.txt', ContentFile(b'duplicate')),
+            legacy.save('ebooks/other.txt', ContentFile(b'unique')),
+        ]
+        for i, name in enumerate(self.names + self.names[:1]):
+            Book.objects.create(title=f'Legacy {i}', category='Novel', isbn=f'legacy-{i}', ebook=name)
+
+    def dedupe(self, *args):
+        out = StringIO()
+        call_command('dedupe_media', '--workers', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_and_merges_legacy_files(self):
+        self.assertIn('Moved 2 files and merged 1 duplicates', self.dedupe())
+        self.assertEqual(len(set(Book.objects.values_list('ebook', flat=True))), 2)
+        self.assertEqual(sorted(StoredBlob.objects.values_list('ref_count', flat=True)), [1, 3])
+        self.assertEqual(Book.objects.get(isbn='legacy-1').ebook.read(), b'duplicate')
+
+    def test_dry_run_counts_duplicates_within_the_run(self):
+        self.assertIn('Would move 2 files and merged 1 duplicates', self.dedupe('--dry-run'))
+        self.assertEqual(set(Book.objects.values_list('ebook', flat=True)), set(self.names))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_recount_spares_recent_unreferenced_blobs(self):
+        content_storage.save('ebooks/in-progress.pdf', ContentFile(b'not committed yet'))
+        self.dedupe()
+        self.assertEqual(StoredBlob.objects.count(), 3)
+
+        with override_settings(STORED_BLOB_SWEEP_GRACE=-1):
+            self.dedupe()
+        self.assertEqual(StoredBlob.objects.count(), 2)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from project.models import Book, ReadingProgress, TextPageIndex
+from project.text_pages import build_page_offsets, read_pages
+from .base import ProjectTestCase
+
+
+class BuildPageOffsetsTests(SimpleTestCase):
+    def write(self, data):
+        handle, path = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_pages_end_at_line_breaks(self):
+        path = self.write(b'a' * 60 + b'\n' + b'b' * 60 + b'\n')
+        self.assertEqual(list(build_page_offsets(path, 100)), [0, 61, 122])
+
+    def test_characters_are_not_split(self):
+        path = self.write('é'.encode() * 500)
+        offsets = build_page_offsets(path, 101)
+        self.assertTrue(all(offset % 2 == 0 for offset in offsets))
+        self.assertEqual(offsets[-1], 1000)
+        pages = read_pages(path, offsets, 1, len(offsets))
+        self.assertEqual(''.join(pages), 'é' * 500)
+
+    def test_empty_file_has_one_empty_page(self):
+        path = self.write(b'')
+        offsets = build_page_offsets(path, 10)
+        self.assertEqual(list(offsets), [0, 0])
+        self.assertEqual(read_pages(path, offsets, 1), [''])
+
+
+class PagedReadingTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(TEXT_PAGE_SIZE=100)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.authenticate()
+        self.text = ''.join(f'line {i} ünïcödé héllo wörld\n' for i in range(200)).encode()
+        self.book = Book.objects.create(title='Pages', author='Author', category='Novel', isbn='1')
+        self.book.ebook.save('book.txt', ContentFile(self.text))
+
+    def read(self, query, **headers):
+        return self.client.get(f'/api/books/{self.book.id}/read/?{query}', **headers)
+
+    def test_pages_cover_the_whole_file(self):
+        response = self.read('page=1&count=3')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()['data']
+        self.assertEqual(data['count'], 3)
+        total = data['total_pages']
+
+        pages = []
+        for page in range(1, total + 1, 20):
+            pages += self.read(f'page={page}&count=20').json()['data']['pages']
+        self.assertEqual(''.join(pages).encode(), self.text)
+        self.assertTrue(all(len(page.encode()) <= 100 for page in pages))
+        self.assertEqual(TextPageIndex.objects.get(book=self.book).page_count, total)
+        self.assertEqual(ReadingProgress.objects.get(book=self.book, user=self.user).total_pages, total)
+
+    def test_invalid_pages(self):
+        total = self.read('page=1').json()['data']['total_pages']
+        self.assertEqual(self.read(f'page={total + 1}').status_code, 404)
+        self.assertEqual(self.read('page=x').status_code, 400)
+
+    def test_unchanged_pages_are_not_sent_again(self):
+        response = self.read('page=2')
+        self.assertEqual(self.read('page=2', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_index_is_rebuilt_for_a_new_page_size(self):
+        self.read('page=1')
+        with self.settings(TEXT_PAGE_SIZE=1000):
+            total = self.read('page=1').json()['data']['total_pages']
+        index = TextPageIndex.objects.get(book=self.book)
+        self.assertEqual((index.page_size, index.page_count), (1000, total))
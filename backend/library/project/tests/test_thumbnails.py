@@ -0,0 +1,83 @@
+import os
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from PIL import Image
+from project.cache_utils import invalidate_model_cache
+from project.jobs import run_pending
+from project.models import Book
+from project.thumbnails import render_thumbnails
+from .base import ProjectTestCase, image_bytes
+
+
+class RenderThumbnailsTests(ProjectTestCase):
+    def write_cover(self, name, data):
+        with open(os.path.join(self.media_root, name), 'wb') as file:
+            file.write(data)
+
+    def test_renditions_keep_the_aspect_ratio_and_never_upscale(self):
+        self.write_cover('cover.jpg', image_bytes(400, 600))
+        renditions = render_thumbnails(self.media_root, 'cover.jpg', [96, 480], ['jpeg', 'webp'])
+        self.assertEqual(renditions['96']['jpeg'], 'cover-96.jpg')
+        with Image.open(os.path.join(self.media_root, renditions['96']['webp'])) as image:
+            self.assertEqual((image.size, image.format), ((96, 144), 'WEBP'))
+        with Image.open(os.path.join(self.media_root, renditions['480']['jpeg'])) as image:
+            self.assertEqual(image.size, (400, 600))
+
+    def test_transparent_covers_are_flattened_for_jpeg(self):
+        Image.new('RGBA', (200, 300), (10, 200, 30, 128)).save(os.path.join(self.media_root, 'cover.png'))
+        renditions = render_thumbnails(self.media_root, 'cover.png', [96], ['jpeg'])
+        with Image.open(os.path.join(self.media_root, renditions['96']['jpeg'])) as image:
+            self.assertEqual(image.mode, 'RGB')
+
+    def test_existing_renditions_are_kept(self):
+        self.write_cover('cover.jpg', image_bytes(400, 600))
+        path = os.path.join(self.media_root, render_thumbnails(self.media_root, 'cover.jpg', [96], ['jpeg'])['96']['jpeg'])
+        os.utime(path, (0, 0))
+        render_thumbnails(self.media_root, 'cover.jpg', [96], ['jpeg'])
+        self.assertEqual(os.stat(path).st_mtime, 0)
+        render_thumbnails(self.media_root, 'cover.jpg', [96], ['jpeg'], force=True)
+        self.assertNotEqual(os.stat(path).st_mtime, 0)
+
+
+class BookThumbnailTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        response = self.client.post('/api/books/', {
+            'title': 'Cover', 'author': 'Author', 'category': 'Novel', 'isbn': '1', 'is_public': 'true',
+            'image': SimpleUploadedFile('cover.png', image_bytes(1000, 1500, 'PNG'), content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['data']['book']['image_thumbnails'], {})
+        self.book = Book.objects.get(pk=response.json()['data']['book']['id'])
+
+    def thumbnails(self):
+        return self.client.get(f'/api/books/{self.book.id}/').json()['data']['image_thumbnails']
+
+    def test_ingestion_renders_every_size(self):
+        run_pending()
+        self.book.refresh_from_db()
+        self.assertEqual(set(self.book.thumbnails['sizes']), {'96', '240', '480'})
+        self.assertEqual(self.book.thumbnails['source'], self.book.image.name)
+        self.assertTrue(self.thumbnails()['240']['webp'].endswith('-240.webp'))
+        with Image.open(os.path.join(self.media_root, self.book.thumbnails['sizes']['240']['jpeg'])) as image:
+            self.assertEqual((image.size, image.format), ((240, 360), 'JPEG'))
+
+    def test_regenerate_command_fills_in_missing_thumbnails(self):
+        run_pending()
+        Book.objects.filter(pk=self.book.pk).update(thumbnails={})
+        invalidate_model_cache('BookPayload', self.book.pk)
+        self.assertEqual(self.thumbnails(), {})
+
+        call_command('regenerate_thumbnails', workers=2, force=True, stdout=StringIO())
+        self.assertIn('240', self.thumbnails())
+
+    def test_thumbnails_are_deleted_with_the_book(self):
+        run_pending()
+        self.book.refresh_from_db()
+        path = os.path.join(self.media_root, self.book.thumbnails['sizes']['96']['webp'])
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/books/{self.book.id}/')
+        self.assertFalse(os.path.exists(path))
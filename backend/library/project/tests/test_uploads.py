@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import os
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.utils import timezone
+from project import uploads
+from project.jobs import run_pending
+from project.models import BackgroundJob, Book, UploadSession
+from .base import ProjectTestCase
+
+
+def checksum(data):
+    return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class ResumableUploadTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        self.authenticate()
+        self.addCleanup(uploads._hashers.clear)
+        self.data = b'chunked ebook ' * 10000
+
+    def start(self, size=None, filename='book.txt'):
+        response = self.client.post('/api/uploads/', {'filename': filename, 'size': size or len(self.data)}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response['Upload-Offset'], '0')
+        return response.json()['data']['id']
+
+    def send(self, session_id, offset, data, **headers):
+        return self.client.generic(
+            'PATCH', f'/api/uploads/{session_id}/', data,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset), **headers
+        )
+
+    def finalize(self, session_id, **fields):
+        return self.client.post(f'/api/uploads/{session_id}/finalize/', fields, format='json')
+
+    def book_fields(self, **fields):
+        return dict({'title': 'Chunked', 'author': 'Author', 'category': 'Novel', 'isbn': 'chunked', 'is_public': True}, **fields)
+
+    def test_chunks_are_assembled_into_a_new_book(self):
+        session_id = self.start()
+        self.assertEqual(self.send(session_id, 0, self.data[:50000]).status_code, 204)
+        self.assertEqual(self.client.head(f'/api/uploads/{session_id}/')['Upload-Offset'], '50000')
+        response = self.send(session_id, 50000, self.data[50000:], HTTP_UPLOAD_CHECKSUM=checksum(self.data[50000:]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], str(len(self.data)))
+
+        response = self.finalize(session_id, **self.book_fields())
+        self.assertEqual(response.status_code, 201, response.content)
+        book = Book.objects.get(isbn='chunked')
+        self.assertEqual(book.ebook.read(), self.data)
+        self.assertEqual(book.ebook_hash, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(book.uploaded_by, self.user)
+        self.assertEqual(BackgroundJob.objects.filter(kind='ingest_book', object_id=book.id).count(), 1)
+        self.assertFalse(os.path.exists(uploads.session_path(UploadSession.objects.get(pk=session_id))))
+
+        # A retried finalize returns the same book
+        again = self.finalize(session_id)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['data']['book']['id'], book.id)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_chunks_must_start_at_the_current_offset(self):
+        session_id = self.start()
+        self.send(session_id, 0, self.data[:100])
+        response = self.send(session_id, 10, self.data[10:20])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '100')
+
+    def test_chunks_past_the_declared_size_are_refused(self):
+        session_id = self.start(size=10)
+        self.assertEqual(self.send(session_id, 0, b'0123456789!').status_code, 413)
+        self.assertEqual(UploadSession.objects.get(pk=session_id).offset, 0)
+
+    def test_checksum_mismatch_discards_the_chunk(self):
+        session_id = self.start()
+        self.send(session_id, 0, self.data[:100])
+        response = self.send(session_id, 100, self.data[100:200], HTTP_UPLOAD_CHECKSUM=checksum(b'other'))
+        self.assertEqual(response.status_code, 460)
+        self.assertEqual(response['Upload-Offset'], '100')
+        self.assertEqual(os.path.getsize(uploads.session_path(UploadSession.objects.get(pk=session_id))), 100)
+        self.assertEqual(self.send(session_id, 100, self.data[100:200], HTTP_UPLOAD_CHECKSUM='md5 abc').status_code, 400)
+
+    def test_upload_continued_on_another_worker_is_hashed_from_the_file(self):
+        session_id = self.start()
+        self.send(session_id, 0, self.data[:70000])
+        uploads._hashers.clear()
+        self.send(session_id, 70000, self.data[70000:])
+        self.assertEqual(self.finalize(session_id, **self.book_fields()).status_code, 201)
+        self.assertEqual(Book.objects.get(isbn='chunked').ebook_hash, hashlib.sha256(self.data).hexdigest())
+
+    def test_incomplete_uploads_cannot_be_finalized(self):
+        session_id = self.start()
+        self.send(session_id, 0, self.data[:100])
+        self.assertEqual(self.finalize(session_id, **self.book_fields()).status_code, 409)
+        self.assertFalse(Book.objects.exists())
+
+    def test_upload_replaces_the_ebook_of_an_own_book(self):
+        book = Book.objects.create(title='Mine', author='Author', category='Novel', isbn='mine', uploaded_by=self.user)
+        session_id = self.start(size=3)
+        self.send(session_id, 0, b'new')
+        self.assertEqual(self.finalize(session_id, book=book.id).status_code, 201)
+        book.refresh_from_db()
+        self.assertEqual(book.ebook.read(), b'new')
+
+        other = Book.objects.create(title='Theirs', author='Author', category='Novel', isbn='theirs')
+        session_id = self.start(size=3)
+        self.send(session_id, 0, b'new')
+        self.assertEqual(self.finalize(session_id, book=other.id).status_code, 403)
+
+    def test_sessions_belong_to_their_user(self):
+        session_id = self.start()
+        self.authenticate(User.objects.create_user('other', 'other@example.com', 'other-pass-1!'))
+        self.assertEqual(self.send(session_id, 0, b'abc').status_code, 404)
+        self.assertEqual(self.finalize(session_id).status_code, 404)
+
+    def test_size_limits(self):
+        with self.settings(UPLOAD_MAX_SIZE=100):
+            response = self.client.post('/api/uploads/', {'filename': 'big.txt', 'size': 101}, format='json')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.client.post('/api/uploads/', {'filename': 'book.txt', 'size': 0}, format='json').status_code, 400)
+
+    def test_expired_sessions_are_refused_and_swept(self):
+        session_id = self.start()
+        session = UploadSession.objects.get(pk=session_id)
+        path = uploads.session_path(session)
+        UploadSession.objects.filter(pk=session_id).update(expires_at=timezone.now())
+        self.assertEqual(self.send(session_id, 0, b'abc').status_code, 410)
+
+        BackgroundJob.objects.filter(kind=uploads.EXPIRE_UPLOAD_SESSION).update(run_after=timezone.now())
+        run_pending()
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_active_sessions_are_checked_again_later(self):
+        session_id = self.start()
+        BackgroundJob.objects.filter(kind=uploads.EXPIRE_UPLOAD_SESSION).update(run_after=timezone.now())
+        run_pending()
+        self.assertTrue(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertTrue(BackgroundJob.objects.filter(kind=uploads.EXPIRE_UPLOAD_SESSION, status='pending').exists())
+
+    def test_running_hashes_are_dropped_with_their_session(self):
+        session_id = self.start()
+        self.send(session_id, 0, b'abc')
+        session = UploadSession.objects.get(pk=session_id)
+        self.assertIn(session.pk, uploads._hashers)
+        self.assertEqual(self.client.delete(f'/api/uploads/{session_id}/').status_code, 204)
+        self.assertNotIn(session.pk, uploads._hashers)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+        expired_id = self.start()
+        self.send(expired_id, 0, b'abc')
+        expired = UploadSession.objects.get(pk=expired_id)
+        offset, hasher, _ = uploads._hashers[expired.pk]
+        uploads._hashers[expired.pk] = (offset, hasher, timezone.now() - timedelta(seconds=1))
+        self.send(self.start(), 0, b'abc')
+        self.assertNotIn(expired.pk, uploads._hashers)
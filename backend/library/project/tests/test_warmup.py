@@ -0,0 +1,114 @@
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from project import cache_metrics, traffic
+from project.cache_utils import invalidate_model_cache
+from project.models import Book
+from project.tiered_cache import local_cache
+from project.warmup import warm_cache, warmup_urls
+from .base import ProjectTestCase
+
+
+class TrafficStatsTests(ProjectTestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(TRAFFIC_STATS_FLUSH_INTERVAL=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Counts left over by other tests
+        traffic.flush()
+        cache.clear()
+        self.book = Book.objects.create(title='Dune', author='Herbert', category='Novel', isbn='1')
+
+    def test_cacheable_requests_are_counted(self):
+        for _ in range(3):
+            self.client.get('/api/books/popular/')
+        self.client.get(f'/api/books/{self.book.id}/')
+        self.client.get('/api/books/search/?q=Dune')
+        self.client.get('/api/books/search/?q=Dune&page=1')
+        self.assertEqual(traffic.top(traffic.SEARCHES, 10), [('Dune', 1)])
+        urls = dict(traffic.top(traffic.URLS, 10))
+        self.assertEqual(urls['http://testserver/api/books/popular/'], 3)
+        self.assertEqual(urls[f'http://testserver/api/books/{self.book.id}/'], 1)
+        self.assertEqual(urls['http://testserver/api/books/search/?q=Dune&page=1'], 1)
+
+    def test_failed_uncacheable_and_warmup_requests_are_not_counted(self):
+        self.client.get('/api/books/by_category/')
+        self.client.get('/api/books/999/')
+        self.client.get('/api/books/popular/', HTTP_X_CACHE_WARMUP='1')
+        self.client.post('/api/books/', {})
+        self.assertEqual(traffic.top(traffic.URLS, 10), [])
+
+    def test_counts_are_summed_over_the_recent_hours(self):
+        traffic.record(traffic.SEARCHES, 'old')
+        with mock.patch.object(traffic, '_current_hour', return_value=traffic._current_hour() - 2):
+            traffic.record(traffic.SEARCHES, 'old')
+            traffic.record(traffic.SEARCHES, 'expired')
+        traffic.record(traffic.SEARCHES, 'new')
+        self.assertEqual(traffic.top(traffic.SEARCHES, 10), [('old', 2), ('expired', 1), ('new', 1)])
+        self.assertEqual(dict(traffic.top(traffic.SEARCHES, 10, hours=1)), {'old': 1, 'new': 1})
+
+    def test_buckets_keep_the_most_frequent_entries(self):
+        with self.settings(TRAFFIC_STATS_MAX_ENTRIES=2):
+            for query in ('a', 'a', 'b', 'b', 'c'):
+                traffic.record(traffic.SEARCHES, query)
+        self.assertEqual(traffic.top(traffic.SEARCHES, 10), [('a', 2), ('b', 2)])
+
+    def test_warmup_urls_include_the_home_and_popular_pages(self):
+        self.assertEqual(warmup_urls(10, 10), ['http://testserver/home/', 'http://testserver/api/books/popular/'])
+        self.client.get(f'/api/books/{self.book.id}/', HTTP_HOST='books.example.com')
+        self.client.get('/api/books/search/?q=dune sequel')
+        self.assertEqual(warmup_urls(10, 10), [
+            f'http://books.example.com/api/books/{self.book.id}/',
+            'http://books.example.com/home/',
+            'http://books.example.com/api/books/popular/',
+            'http://books.example.com/api/books/search/?q=dune+sequel',
+        ])
+        self.assertEqual(len(warmup_urls(10, 0)), 3)
+
+
+class WarmCacheTests(TransactionTestCase):
+    # Warmup requests run in other threads, which only see committed rows. One worker at a
+    # time, since concurrent requests lock the tables of the in-memory SQLite test database.
+
+    def setUp(self):
+        settings_override = self.settings(TRAFFIC_STATS_FLUSH_INTERVAL=0, BACKGROUND_JOBS_MODE='manual')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        traffic.flush()
+        cache.clear()
+        local_cache.clear()
+        cache_metrics.reset()
+        self.addCleanup(cache_metrics.reset)
+        self.book = Book.objects.create(title='Dune', author='Herbert', category='Novel', isbn='1')
+
+    def test_recorded_traffic_is_replayed(self):
+        self.client.get(f'/api/books/{self.book.id}/')
+        self.client.get('/api/books/search/?q=Dune')
+        invalidate_model_cache('Book')
+        local_cache.clear()
+        cache_metrics.reset()
+
+        out = StringIO()
+        call_command('warm_cache', workers=1, stdout=out)
+        self.assertIn('Warmed 4 of 4 URLs', out.getvalue())
+        self.assertEqual(cache_metrics.snapshot()['BookViewSet.search']['sets'], 1)
+
+        # Replayed requests are served from the cache and are not counted as traffic
+        self.client.get('/api/books/search/?q=Dune')
+        self.assertEqual(cache_metrics.snapshot()['BookViewSet.search']['hits'], 1)
+        self.assertEqual(traffic.top(traffic.SEARCHES, 10), [('Dune', 2)])
+
+    def test_failed_urls_are_reported(self):
+        self.client.get(f'/api/books/{self.book.id}/')
+        self.book.delete()
+        summary = warm_cache(workers=1)
+        self.assertEqual((summary['total'], summary['warmed'], summary['failed']), (3, 2, 1))
+
+    def test_urls_past_the_budget_are_skipped(self):
+        out = StringIO()
+        call_command('warm_cache', workers=1, budget=0, stdout=out)
+        self.assertIn('Warmed 0 of 2 URLs', out.getvalue())
+        self.assertIn('2 skipped', out.getvalue())
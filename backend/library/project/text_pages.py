@@ -0,0 +1,92 @@
+"""
+Page-addressable reading of plain text ebooks.
+
+The byte offset of every page boundary is computed once per file and stored
+as a packed array('Q'), so any page can be read by slicing a memory map of the
+file without scanning what comes before it.
+"""
+import mmap
+import os
+from array import array
+from django.conf import settings
+from django.db import IntegrityError
+from .file_serving import ensure_ebook_hash
+from .models import TextPageIndex
+
+TEXT_EXTENSIONS = ('txt', 'text')
+
+
+def _is_continuation_byte(byte):
+    return 0x80 <= byte <= 0xBF
+
+
+def build_page_offsets(path, page_size):
+    """
+    Offsets of each page start followed by the file size.
+
+    A page ends after the last line break in its window if that break falls in
+    the second half of the page; otherwise it is cut at ``page_size`` bytes,
+    moved back so that no UTF-8 character is split.
+    """
+    size = os.path.getsize(path)
+    offsets = array('Q', [0])
+    if size == 0:
+        offsets.append(0)
+        return offsets
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while size - start > page_size:
+            end = start + page_size
+            newline = data.rfind(b'\n', start + page_size // 2, end)
+            if newline != -1:
+                end = newline + 1
+            else:
+                while end > start + 1 and _is_continuation_byte(data[end]):
+                    end -= 1
+            offsets.append(end)
+            start = end
+    offsets.append(size)
+    return offsets
+
+
+def get_page_offsets(book):
+    """
+    Return the page offsets of a text ebook, building and storing them if missing or outdated
+    """
+    source_hash = ensure_ebook_hash(book)
+    page_size = settings.TEXT_PAGE_SIZE
+    index = TextPageIndex.objects.filter(book=book).first()
+    if index is not None and index.source_hash == source_hash and index.page_size == page_size:
+        offsets = array('Q')
+        offsets.frombytes(bytes(index.offsets))
+        return offsets
+
+    offsets = build_page_offsets(book.ebook.path, page_size)
+    fields = {
+        'source_hash': source_hash,
+        'page_size': page_size,
+        'page_count': len(offsets) - 1,
+        'offsets': offsets.tobytes(),
+    }
+    try:
+        TextPageIndex.objects.update_or_create(book=book, defaults=fields)
+    except IntegrityError:
+        # Built concurrently by another request; ours is equivalent
+        pass
+    return offsets
+
+
+def read_pages(path, offsets, page, count=1):
+    """
+    Decoded text of ``count`` pages starting at 1-based ``page``
+    """
+    last = min(page - 1 + count, len(offsets) - 1)
+    with open(path, 'rb') as file:
+        if offsets[-1] == 0:
+            return ['']
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return [
+                data[offsets[i]:offsets[i + 1]].decode('utf-8', errors='replace')
+                for i in range(page - 1, last)
+            ]
@@ -0,0 +1,81 @@
+"""
+Fixed-size cover renditions generated with Pillow.
+
+Renditions are written next to the original cover as ``<name>-<width>.<ext>``.
+Rendering only touches files, so it can run in any worker process; the
+resulting names are recorded in Book.thumbnails by the caller.
+"""
+import os
+import tempfile
+from PIL import Image, ImageOps
+
+# Pillow format name and save options for each rendition format
+FORMAT_OPTIONS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+FORMAT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def thumbnail_name(image_name, width, image_format):
+    return f'{os.path.splitext(image_name)[0]}-{width}.{FORMAT_EXTENSIONS[image_format]}'
+
+
+def _save_atomic(image, path, image_format):
+    pil_format, options = FORMAT_OPTIONS[image_format]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, pil_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_thumbnails(media_root, image_name, widths, formats, force=False):
+    """
+    Write every (width, format) rendition of a cover that is missing.
+
+    Covers are never upscaled. Returns {str(width): {format: name}} for all renditions.
+    """
+    source_path = os.path.join(media_root, image_name)
+    renditions = {
+        str(width): {image_format: thumbnail_name(image_name, width, image_format) for image_format in formats}
+        for width in widths
+    }
+    missing = [
+        (width, image_format) for width in widths for image_format in formats
+        if force or not os.path.exists(os.path.join(media_root, renditions[str(width)][image_format]))
+    ]
+    if not missing:
+        return renditions
+
+    with Image.open(source_path) as image:
+        # Let the JPEG decoder downscale while decoding when the covers are large
+        largest = max(width for width, _ in missing)
+        image.draft('RGB', (largest, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for width in sorted({width for width, _ in missing}, reverse=True):
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            else:
+                resized = image
+            for image_format in formats:
+                if (width, image_format) not in missing:
+                    continue
+                rendition = resized
+                if image_format == 'jpeg' and rendition.mode == 'RGBA':
+                    # JPEG has no alpha channel; flatten onto white
+                    background = Image.new('RGB', rendition.size, (255, 255, 255))
+                    background.paste(rendition, mask=rendition.getchannel('A'))
+                    rendition = background
+                _save_atomic(rendition, os.path.join(media_root, renditions[str(width)][image_format]), image_format)
+
+    return renditions
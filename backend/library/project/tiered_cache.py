@@ -0,0 +1,183 @@
+"""
+Two-tier cache: a small per-process LRU (L1) in front of the shared cache (L2).
+
+L2 is the ``default`` Django cache, shared by every worker. L1 keeps recently
+used values in the worker itself, bounded by entry count, total size and a
+short TTL. Keys that depend on models embed their generation counters, which
+are only kept in L1 for CACHE_GENERATION_L1_TIMEOUT seconds, so an
+invalidation in one worker is seen by all of them within that time; other
+keys can be stale in L1 for at most CACHE_L1_TIMEOUT seconds.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache as shared_cache
+from . import cache_metrics
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """
+    Thread-safe LRU of pickled values, limited by entry count, total bytes and TTL
+    """
+
+    def __init__(self, max_entries, max_bytes, timeout):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._entries = OrderedDict()  # key -> (expires_at, pickled value, namespace)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+            data = entry[1]
+        # Values are pickled so callers never share (and mutate) a cached object
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=None, namespace=None):
+        """
+        Store a value and return its pickled size
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if timeout <= 0 or len(data) > self.max_bytes:
+            self.delete(key)
+            return len(data)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, data, namespace)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted.append(self._remove(next(iter(self._entries))))
+        for evicted_namespace in evicted:
+            cache_metrics.record(evicted_namespace, evictions=1)
+        return len(data)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remove(self, key):
+        _, data, namespace = self._entries.pop(key)
+        self._bytes -= len(data)
+        return namespace
+
+
+class TieredCache:
+    """
+    Read-through L1/L2 cache with the subset of the Django cache API used by cache_utils.
+
+    ``namespace`` labels the access in project.cache_metrics.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, default=None, namespace=None):
+        started = time.perf_counter()
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            cache_metrics.record_get(namespace, started, hit=True, tier='l1')
+            return value
+        value = self.shared.get(key, _MISSING)
+        if value is _MISSING:
+            cache_metrics.record_get(namespace, started, hit=False)
+            return default
+        cache_metrics.record_get(namespace, started, hit=True, tier='l2')
+        self.local.set(key, value, namespace=namespace)
+        return value
+
+    def set(self, key, value, timeout=None, namespace=None):
+        started = time.perf_counter()
+        timeout = settings.CACHE_MIDDLEWARE_SECONDS if timeout is None else timeout
+        self.shared.set(key, value, timeout)
+        size = self.local.set(key, value, timeout, namespace=namespace)
+        cache_metrics.record(
+            namespace,
+            sets=1,
+            bytes=size,
+            set_us=int((time.perf_counter() - started) * 1_000_000)
+        )
+
+    def get_many(self, keys, namespace=None):
+        """
+        Values of the keys that are cached, fetching the ones missing from L1 in one L2 round trip
+        """
+        started = time.perf_counter()
+        found = {}
+        for key in keys:
+            value = self.local.get(key, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+        local_hits = len(found)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            for key, value in self.shared.get_many(missing).items():
+                found[key] = value
+                self.local.set(key, value, namespace=namespace)
+        cache_metrics.record(
+            namespace,
+            gets=len(keys),
+            hits=len(found),
+            l1_hits=local_hits,
+            misses=len(keys) - len(found),
+            get_us=int((time.perf_counter() - started) * 1_000_000)
+        )
+        return found
+
+    def set_many(self, mapping, timeout=None, namespace=None):
+        started = time.perf_counter()
+        timeout = settings.CACHE_MIDDLEWARE_SECONDS if timeout is None else timeout
+        self.shared.set_many(mapping, timeout)
+        size = sum(self.local.set(key, value, timeout, namespace=namespace) for key, value in mapping.items())
+        cache_metrics.record(
+            namespace,
+            sets=len(mapping),
+            bytes=size,
+            set_us=int((time.perf_counter() - started) * 1_000_000)
+        )
+
+    def delete(self, key):
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+
+
+local_cache = LocalLRU(
+    max_entries=settings.CACHE_L1_MAX_ENTRIES,
+    max_bytes=settings.CACHE_L1_MAX_BYTES,
+    timeout=settings.CACHE_L1_TIMEOUT
+)
+tiered_cache = TieredCache(local_cache, shared_cache)
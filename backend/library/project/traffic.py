@@ -0,0 +1,101 @@
+"""
+Request statistics used to warm the caches after a restart.
+
+A middleware counts successful GET requests to cacheable endpoints (by full
+URL) and search queries. Counts are kept in the worker and merged every
+TRAFFIC_STATS_FLUSH_INTERVAL seconds into hourly buckets in the shared cache,
+each trimmed to its TRAFFIC_STATS_MAX_ENTRIES most frequent entries. Merging
+is a read-modify-write, so concurrent flushes may lose a few counts, which is
+fine for ranking.
+"""
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+
+URLS = 'urls'
+SEARCHES = 'searches'
+
+# Header sent by the cache warmer so its own requests are not counted
+WARMUP_HEADER = 'HTTP_X_CACHE_WARMUP'
+
+_counts = {URLS: Counter(), SEARCHES: Counter()}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _bucket_key(kind, hour):
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}_traffic_{kind}_{hour}"
+
+
+def _current_hour():
+    return int(time.time() // 3600)
+
+
+def record(kind, value):
+    with _lock:
+        _counts[kind][value] += 1
+    if time.monotonic() - _last_flush >= settings.TRAFFIC_STATS_FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """
+    Merge this worker's counts into the current hourly bucket
+    """
+    global _last_flush
+    with _lock:
+        pending = {kind: counts.copy() for kind, counts in _counts.items() if counts}
+        for counts in _counts.values():
+            counts.clear()
+        _last_flush = time.monotonic()
+
+    hour = _current_hour()
+    # Buckets outlive the window they are read in by an hour
+    timeout = (settings.TRAFFIC_STATS_HOURS + 1) * 3600
+    for kind, counts in pending.items():
+        key = _bucket_key(kind, hour)
+        bucket = Counter(cache.get(key, {}))
+        bucket.update(counts)
+        cache.set(key, dict(bucket.most_common(settings.TRAFFIC_STATS_MAX_ENTRIES)), timeout)
+
+
+def top(kind, limit, hours=None):
+    """
+    The ``limit`` most frequent entries of the last ``hours`` hours, as (value, count) pairs
+    """
+    hours = hours or settings.TRAFFIC_STATS_HOURS
+    hour = _current_hour()
+    buckets = cache.get_many([_bucket_key(kind, hour - offset) for offset in range(hours)])
+    totals = Counter()
+    for bucket in buckets.values():
+        totals.update(bucket)
+    return totals.most_common(limit)
+
+
+class TrafficStatsMiddleware:
+    """
+    Count successful GET requests to the endpoints listed in CACHE_WARMUP_URL_NAMES
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            request.method == 'GET'
+            and response.status_code == 200
+            and WARMUP_HEADER not in request.META
+            and request.resolver_match is not None
+            and request.resolver_match.url_name in settings.CACHE_WARMUP_URL_NAMES
+        ):
+            query = request.GET.get('q', '')
+            if request.resolver_match.url_name == 'book-search' and query and list(request.GET) == ['q']:
+                # Kept verbatim, as cached responses are keyed by the exact query string
+                record(SEARCHES, query)
+            else:
+                # The host is kept because cached payloads contain absolute URLs
+                record(URLS, request.build_absolute_uri())
+        return response
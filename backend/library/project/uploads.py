@@ -0,0 +1,186 @@
+"""
+Resumable (tus-like) ebook uploads.
+
+A client creates an upload session with the total size, then PATCHes the
+file in chunks, each starting at the session's current offset. Chunks are
+appended to a temporary file and hashed as they arrive, so finalizing moves
+the finished file into content-addressed storage without reading it again.
+Sessions that stop receiving chunks expire after UPLOAD_SESSION_TTL, when a
+delayed job discards them with any other expired sessions.
+"""
+import base64
+import hashlib
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import UploadSession
+from .storage import content_storage, INCOMING_DIR
+from .jobs import job_handler, enqueue
+
+EXPIRE_UPLOAD_SESSION = 'expire_upload_session'
+
+CHUNK_READ_SIZE = 64 * 1024
+
+# Running hashes of sessions this process has received chunks for, as
+# {session id: (offset, hasher, expires_at)}. A session continued on another worker is
+# re-hashed from its temporary file once. Entries are dropped when the session is
+# deleted in this process or once it has expired.
+_hashers = {}
+
+
+class ChunkError(Exception):
+    """
+    A chunk that cannot be applied; ``status`` is the HTTP status to answer with
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def session_path(session):
+    return content_storage.path(f'{INCOMING_DIR}/uploads/{session.pk}.part')
+
+
+def create_session(user, filename, size):
+    session = UploadSession.objects.create(
+        user=user,
+        filename=os.path.basename(filename),
+        size=size,
+        expires_at=timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    )
+    path = session_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    enqueue(EXPIRE_UPLOAD_SESSION, payload={'session': str(session.pk)}, delay=settings.UPLOAD_SESSION_TTL)
+    return session
+
+
+def forget_session(session_id):
+    _hashers.pop(session_id, None)
+
+
+def _drop_expired_hashers():
+    now = timezone.now()
+    # Copied first, as other threads may add entries meanwhile
+    for session_id, entry in list(_hashers.items()):
+        if entry[2] <= now:
+            _hashers.pop(session_id, None)
+
+
+def _hasher_at(session, offset):
+    """
+    Running SHA-256 of the first ``offset`` bytes of the session's file
+    """
+    cached = _hashers.get(session.pk)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    with open(session_path(session), 'rb') as file:
+        remaining = offset
+        while remaining > 0:
+            data = file.read(min(1024 * 1024, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+    return hasher
+
+
+def _parse_checksum(header):
+    """
+    Expected SHA-256 digest from an `Upload-Checksum: sha256 <base64>` header
+    """
+    algorithm, _, value = header.strip().partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise ChunkError(f'Unsupported checksum algorithm {algorithm!r}', 400)
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except ValueError:
+        raise ChunkError('Malformed Upload-Checksum header', 400)
+
+
+def append_chunk(session_id, user, offset, stream, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset`` and return the updated session.
+
+    The session row is locked for the duration of the write, so concurrent
+    PATCHes to one session are applied one at a time.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().filter(pk=session_id, user=user).first()
+        if session is None:
+            raise ChunkError('Upload session not found', 404)
+        if session.status != 'active' or session.expires_at <= timezone.now():
+            raise ChunkError('Upload session is no longer active', 410)
+        if offset != session.offset:
+            raise ChunkError(f'Upload-Offset must be {session.offset}', 409)
+        if session.offset + length > session.size:
+            raise ChunkError('Chunk extends past the declared upload size', 413)
+
+        expected = _parse_checksum(checksum) if checksum else None
+        hasher = _hasher_at(session, session.offset).copy()
+        chunk_hasher = hashlib.sha256()
+        received = 0
+        with open(session_path(session), 'r+b') as file:
+            # Drop any bytes left over from an interrupted earlier attempt
+            file.truncate(session.offset)
+            file.seek(session.offset)
+            while received < length:
+                data = stream.read(min(CHUNK_READ_SIZE, length - received))
+                if not data:
+                    break
+                file.write(data)
+                hasher.update(data)
+                chunk_hasher.update(data)
+                received += len(data)
+
+            if expected is not None and chunk_hasher.digest() != expected:
+                file.truncate(session.offset)
+                raise ChunkError('Chunk checksum mismatch', 460)
+
+        # A short body still advances the offset; the client resumes from there
+        session.offset += received
+        session.expires_at = timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        session.save(update_fields=['offset', 'expires_at', 'updated_at'])
+        _drop_expired_hashers()
+        _hashers[session.pk] = (session.offset, hasher, session.expires_at)
+    return session
+
+
+def complete_session(session):
+    """
+    Move a fully received upload into ebook storage and mark the session completed.
+
+    Must be called inside a transaction holding the session row lock. Returns the stored name.
+    """
+    path = session_path(session)
+    digest = _hasher_at(session, session.offset).hexdigest()
+    name = content_storage.adopt(path, 'ebooks', session.filename, digest, session.size)
+    forget_session(session.pk)
+    session.status = 'completed'
+    session.save(update_fields=['status', 'updated_at'])
+    return name
+
+
+def discard_session(session):
+    forget_session(session.pk)
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+@job_handler(EXPIRE_UPLOAD_SESSION)
+def expire_upload_session(job):
+    # Also sweeps sessions whose own job was lost
+    for session in UploadSession.objects.filter(status='active', expires_at__lte=timezone.now()):
+        discard_session(session)
+    session = UploadSession.objects.filter(pk=job.payload['session'], status='active').first()
+    if session is not None:
+        # Chunks arrived since this check was scheduled
+        remaining = (session.expires_at - timezone.now()).total_seconds()
+        enqueue(EXPIRE_UPLOAD_SESSION, payload=job.payload, delay=int(remaining) + 1)
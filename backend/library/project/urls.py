@@ -13,6 +13,7 @@ router.register(r'ratings', views.RatingViewSet)
 router.register(r'comments', views.CommentViewSet)
 router.register(r'reading-progress', views.ReadingProgressViewSet)
 router.register(r'book-content', views.BookContentViewSet)
+router.register(r'uploads', views.UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     # Authentication endpoints
@@ -30,6 +31,9 @@ urlpatterns = [
     path('auth/password/reset/', views.reset_password, name='reset_password'),
     path('auth/password/change/', views.change_password, name='change_password'),
     
+    # Cache metrics (admin only)
+    path('cache/metrics/', views.cache_metrics_view, name='cache_metrics'),
+    
     # Legacy endpoints (for backward compatibility)
     path('home/', views.home, name='home'),
     
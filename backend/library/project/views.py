@@ -1,29 +1,35 @@
-import os
+import mimetypes
+from functools import partial
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status, viewsets, pagination
 from .auth import logout, invalidate_all_tokens
+from .authentication import CachedJWTAuthentication
 from rest_framework.decorators import api_view, permission_classes, authentication_classes, action
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
 from .models import (
     Book, Collection, UserProfile, Rating, ReadingProgress, 
-    Comment, Category, BookContent
+    Comment, Category, BookContent, UploadSession
 )
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from .serializers import (
     BookSerializer, CollectionSerializer, UserSerializer, CategorySerializer,
     RatingSerializer, ReadingProgressSerializer, CommentSerializer,
-    UserProfileSerializer, BookContentSerializer, UserAnalyticsSerializer
+    UserProfileSerializer, BookContentSerializer, UserAnalyticsSerializer,
+    UploadSessionSerializer
 )
 from rest_framework.response import Response
 from rest_framework import filters
 from .filters import BookFilter
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, F
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
 class StandardResultsSetPagination(pagination.PageNumberPagination):
     page_size = 12
@@ -215,10 +221,29 @@ def change_password(request):
     )
 
 # Import custom permissions and response utils
-from .permissions import IsBookOwnerOrReadOnly, IsAdminOrReadOnly
+from .permissions import IsBookOwnerOrReadOnly, IsAdminOrReadOnly, IsProfileOwner
 from .utils import standard_response, paginated_response
-from .cache_utils import cache_result, cache_view_method, invalidate_model_cache
-from django.db.models import Prefetch
+from .cache_utils import cache_view_method, cache_view, invalidate_model_cache, model_cache_key, get_generations
+from .tiered_cache import tiered_cache, local_cache
+from . import cache_metrics
+from .book_cache import BOOK_PREFETCHES, serialize_books, overlay_book_payload
+from .file_serving import (
+    serve_file, ebook_content_type, ebook_filename, file_extension, is_range_continuation, ensure_ebook_hash,
+    ebook_validators, file_validators, not_modified_response
+)
+from .previews import preview_validators, get_book_preview, PREVIEW_EXTENSIONS
+from .ingestion import enqueue_ingestion, ingestion_status
+from .text_pages import get_page_offsets, read_pages, TEXT_EXTENSIONS
+from .pdf_pages import get_page_text
+from .compression import choose_encoding
+from .avatars import stage_profile_picture, profile_picture_names, check_profile_picture, ProfilePictureError
+from .jobs import schedule_file_deletion
+from .storage import blob_digest
+from .uploads import create_session, append_chunk, complete_session, discard_session, ChunkError
+from .recommendations import (
+    popular_books_queryset, similar_book_ids, get_user_recommendations,
+    get_anonymous_recommendations, hydrate_books, cache_age
+)
 
 # Book Views
 class BookViewSet(viewsets.ModelViewSet):
@@ -229,7 +254,7 @@ class BookViewSet(viewsets.ModelViewSet):
     filterset_class = BookFilter
     
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'popular', 'search', 'by_category', 'preview', 'similar_books']:
+        if self.action in ['list', 'retrieve', 'popular', 'search', 'by_category', 'preview', 'cover', 'similar_books', 'recommendations']:
             permission_classes = [AllowAny]
         elif self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated, IsBookOwnerOrReadOnly]
@@ -237,16 +262,12 @@ class BookViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
     
-    @cache_result(timeout=60*5)  # Cache for 5 minutes
     def get_queryset(self):
         # Start with optimized query using select_related for foreign keys
         queryset = Book.objects.select_related('uploaded_by').all()
         
         # Add prefetch_related for related collections to reduce queries
-        queryset = queryset.prefetch_related(
-            'favorites',  # Use the favorites M2M field instead of 'collections'
-            Prefetch('ratings', queryset=Rating.objects.select_related('user'))
-        )
+        queryset = queryset.prefetch_related(*BOOK_PREFETCHES)
         
         if self.action == 'list':
             # For public listing, only show public books
@@ -258,16 +279,79 @@ class BookViewSet(viewsets.ModelViewSet):
                 
         return queryset
         
+    def list(self, request, *args, **kwargs):
+        """
+        List books, caching the ids and total count of each page.
+
+        Entries are keyed by visibility scope (anonymous or user), query parameters
+        (filters, search, ordering, page) and the Book generation, so any book
+        write invalidates them. Rows are then loaded with a single in_bulk query.
+        """
+        scope = f'user_{request.user.id}' if request.user.is_authenticated else 'anonymous'
+        params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        key_args = [scope]
+        if 'min_rating' in request.query_params:
+            # Rating filters also depend on ratings
+            key_args.append(f"ratings_{get_generations('Rating')[0]}")
+        cache_key = model_cache_key('Book', 'book_list', *key_args, params=params)
+        
+        entry = tiered_cache.get(cache_key, namespace='book_list')
+        if entry is None:
+            entry = self._list_entry(request)
+            tiered_cache.set(cache_key, entry, settings.BOOK_LIST_CACHE_SECONDS, namespace='book_list')
+        
+        # Books changed or hidden since the entry was cached are dropped by the visibility filter;
+        # related objects are prefetched only for books whose payload isn't cached
+        books = self.get_queryset().prefetch_related(None).in_bulk(entry['ids'])
+        data = serialize_books([books[book_id] for book_id in entry['ids'] if book_id in books], request)
+        if entry['number'] is None:
+            return Response(data)
+        
+        # Rebuild the page from the cached count so no COUNT query is needed
+        paginator = self.paginator.django_paginator_class(range(entry['count']), entry['page_size'])
+        self.paginator.page = paginator.page(entry['number'])
+        self.paginator.request = request
+        return self.get_paginated_response(data)
+    
+    def _list_entry(self, request):
+        ids = self.filter_queryset(self.get_queryset()).values_list('id', flat=True)
+        page = self.paginate_queryset(ids)
+        if page is None:
+            return {'ids': list(ids), 'count': None, 'number': None, 'page_size': None}
+        return {
+            'ids': list(page),
+            'count': self.paginator.page.paginator.count,
+            'number': self.paginator.page.number,
+            'page_size': self.paginator.page.paginator.per_page,
+        }
+        
     def perform_create(self, serializer):
         # Save the book and associate with current user
         instance = serializer.save(uploaded_by=self.request.user)
-        # Invalidate cache after creating a new book
-        invalidate_model_cache('Book')
+        # Hash, page count, text, preview, thumbnails and search index are derived in the background
+        if instance.ebook or instance.image:
+            enqueue_ingestion(instance)
         return instance
         
     def perform_update(self, serializer):
+        # Remember replaced files so their references can be dropped
+        replaced = [
+            getattr(serializer.instance, field) for field in ('ebook', 'image')
+            if field in serializer.validated_data and getattr(serializer.instance, field)
+        ]
+        replaced = [(field_file.storage, field_file.name) for field_file in replaced]
         # Save the updated book
         instance = serializer.save()
+        for storage, name in replaced:
+            transaction.on_commit(partial(storage.delete, name))
+        # A replaced ebook needs a new content hash and page count
+        if 'ebook' in serializer.validated_data:
+            instance.ebook_hash = ''
+            instance.page_count = None
+            Book.objects.filter(pk=instance.pk).update(ebook_hash='', page_count=None)
+        # Re-ingest so the search index picks up metadata changes too
+        if instance.ebook or instance.image:
+            enqueue_ingestion(instance)
         # Invalidate cache for this specific book
         invalidate_model_cache('Book', instance.id)
         return instance
@@ -275,22 +359,19 @@ class BookViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         # Invalidate cache before deleting
         invalidate_model_cache('Book', instance.id)
+        # The file references are dropped by the post_delete signal; shared files are kept
         instance.delete()
     
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        # Increment view count
+        # Increment view count without touching updated_at
+        Book.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
         instance.view_count += 1
-        instance.save()
-        serializer = self.get_serializer(instance, context={'request': request})
         return standard_response(
-            data=serializer.data,
+            data=serialize_books([instance], request)[0],
             message=f"Book '{instance.title}' details retrieved successfully"
         )
     
-    def perform_create(self, serializer):
-        serializer.save(uploaded_by=self.request.user)
-        
     def create(self, request, *args, **kwargs):
         """
         Custom create method to handle file uploads
@@ -329,16 +410,12 @@ class BookViewSet(viewsets.ModelViewSet):
         return Response({"message": "Book updated successfully", "book": serializer.data})
     
     @action(detail=False, methods=['get'])
+    @cache_view_method(timeout=settings.RESPONSE_CACHE_SECONDS, model='Book', overlay=overlay_book_payload)
     def popular(self, request):
         # Get popular books based on view count, download count, and ratings
-        queryset = Book.objects.filter(is_public=True)
-        queryset = queryset.annotate(
-            avg_rating=Avg('ratings__rating'),
-            total_activity=Count('ratings') + Count('comments') + models.F('view_count') + models.F('download_count')
-        ).order_by('-total_activity', '-avg_rating', '-view_count')[:12]
+        queryset = popular_books_queryset()[:12]
         
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(serialize_books(queryset, request))
         
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
@@ -346,96 +423,58 @@ class BookViewSet(viewsets.ModelViewSet):
         Get personalized book recommendations based on user's reading history and ratings
         """
         if not request.user.is_authenticated:
-            # For non-authenticated users, return popular books
-            return self.popular(request)
-            
-        # Get user's reading history
-        user_progress = ReadingProgress.objects.filter(user=request.user).select_related('book')
-        read_book_ids = [progress.book.id for progress in user_progress]
-        
-        # Get user's ratings
-        user_ratings = Rating.objects.filter(user=request.user).select_related('book')
-        rated_books = {rating.book.id: rating.rating for rating in user_ratings}
-        
-        # Get categories of books the user has read or rated highly (4-5 stars)
-        preferred_categories = set()
-        for progress in user_progress:
-            if progress.book.id in rated_books and rated_books[progress.book.id] >= 4:
-                preferred_categories.add(progress.book.category)
-            elif progress.completed:
-                # If they completed a book, they probably liked it
-                preferred_categories.add(progress.book.category)
-                
-        # If we don't have enough data, add some popular categories
-        if len(preferred_categories) < 2:
-            # Get most popular categories based on view counts
-            popular_categories = Book.objects.filter(is_public=True)\
-                .values('category')\
-                .annotate(total_views=models.Sum('view_count'))\
-                .order_by('-total_views')\
-                .values_list('category', flat=True)[:3]
-            preferred_categories.update(popular_categories)
+            # For non-authenticated users, return the shared list of popular books
+            entry = get_anonymous_recommendations()
+            books = hydrate_books(entry['ids'])
+            serializer = self.get_serializer(books, many=True, context={'request': request})
+            response = Response(serializer.data)
+            response['Age'] = str(cache_age(entry))
+            return response
             
-        # Get books in preferred categories that the user hasn't read yet
-        category_recommendations = Book.objects.filter(
-            category__in=preferred_categories,
-            is_public=True
-        ).exclude(id__in=read_book_ids).order_by('-view_count')[:5]
-        
-        # Get books that are similar to highly rated books (same author or similar titles)
-        similar_recommendations = []
-        for book_id, rating in rated_books.items():
-            if rating >= 4:
-                # User liked this book, find similar ones
-                book = Book.objects.get(id=book_id)
-                similar_books = Book.objects.filter(
-                    Q(author=book.author) | Q(title__icontains=book.title.split()[0] if book.title and book.title.split() else ''),
-                    is_public=True
-                ).exclude(id__in=read_book_ids + [book_id])
-                similar_recommendations.extend(list(similar_books[:2]))
-                
-        # Combine recommendations, removing duplicates
-        all_recommendations = list(category_recommendations)
-        for book in similar_recommendations:
-            if book not in all_recommendations:
-                all_recommendations.append(book)
-                if len(all_recommendations) >= 10:
-                    break
-                    
-        # If we still don't have enough recommendations, add some popular books
-        if len(all_recommendations) < 5:
-            popular_books = Book.objects.filter(is_public=True)\
-                .exclude(id__in=read_book_ids)\
-                .exclude(id__in=[b.id for b in all_recommendations])\
-                .order_by('-view_count')[:5]
-            all_recommendations.extend(list(popular_books))
-            
-        serializer = self.get_serializer(all_recommendations, many=True, context={'request': request})
-        return standard_response(
+        entry = get_user_recommendations(request.user)
+        books = hydrate_books(entry['ids'])
+        
+        serializer = self.get_serializer(books, many=True, context={'request': request})
+        response = standard_response(
             data={
                 'recommendations': serializer.data,
-                'based_on': {
-                    'reading_history': len(read_book_ids),
-                    'ratings': len(rated_books),
-                    'preferred_categories': list(preferred_categories)
-                }
+                'based_on': entry['based_on']
             },
-            message='Personalized book recommendations generated successfully'
+            message='Personalized book recommendations generated successfully',
+            cache={
+                'hit': entry['cache_hit'],
+                'age': cache_age(entry)
+            }
         )
+        response['Age'] = str(cache_age(entry))
+        return response
     
     @action(detail=False, methods=['get'])
+    @cache_view_method(timeout=settings.RESPONSE_CACHE_SECONDS, model='Book', overlay=overlay_book_payload)
     def search(self, request):
         query = request.query_params.get('q', '')
         if not query:
             return Response({"message": "Search query is required"}, status=status.HTTP_400_BAD_REQUEST)
         
+        # Every word must appear in the search index (metadata, table of contents and text)
+        index_query = Q()
+        for term in query.lower().split():
+            index_query &= Q(search_index__document__contains=term)
+        
         queryset = Book.objects.filter(
             Q(title__icontains=query) | 
             Q(author__icontains=query) | 
             Q(description__icontains=query) | 
-            Q(isbn__icontains=query),
+            Q(isbn__icontains=query) |
+            index_query,
             is_public=True
-        )
+        ).order_by('-view_count', 'id')
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_books(page, request))
+        
+        return Response(serialize_books(queryset, request))
         
     @action(detail=True, methods=['get'])
     def similar_books(self, request, pk=None):
@@ -444,55 +483,9 @@ class BookViewSet(viewsets.ModelViewSet):
         """
         book = self.get_object()
         
-        # Find books by the same author
-        same_author = Book.objects.filter(
-            author=book.author,
-            is_public=True
-        ).exclude(id=book.id).order_by('-view_count')[:3]
-        
-        # Find books in the same category
-        same_category = Book.objects.filter(
-            category=book.category,
-            is_public=True
-        ).exclude(id=book.id).exclude(id__in=[b.id for b in same_author]).order_by('-view_count')[:3]
-        
-        # Find books with similar titles or descriptions (basic text similarity)
-        title_words = [word for word in book.title.split() if len(word) > 3] if book.title else []
-        if title_words:
-            similar_title_query = Q()
-            for word in title_words:
-                similar_title_query |= Q(title__icontains=word)
-                
-            similar_title = Book.objects.filter(
-                similar_title_query,
-                is_public=True
-            ).exclude(id=book.id)\
-            .exclude(id__in=[b.id for b in list(same_author) + list(same_category)])\
-            .order_by('-view_count')[:2]
-        else:
-            similar_title = []
-            
-        # Combine all similar books
-        all_similar = list(same_author) + list(same_category) + list(similar_title)
-        
-        # If the user is authenticated, we can use their ratings to improve recommendations
-        if request.user.is_authenticated:
-            # Get books that users who read this book also rated highly
-            users_who_read = ReadingProgress.objects.filter(book=book).values_list('user', flat=True)
-            if users_who_read:
-                other_books_read = ReadingProgress.objects.filter(
-                    user__in=users_who_read
-                ).exclude(book=book).values_list('book', flat=True)
-                
-                if other_books_read:
-                    also_read = Book.objects.filter(
-                        id__in=other_books_read,
-                        is_public=True
-                    ).exclude(id__in=[b.id for b in all_similar])\
-                    .annotate(read_count=Count('id'))\
-                    .order_by('-read_count')[:2]
-                    
-                    all_similar.extend(list(also_read))
+        # Co-readership signals are only used for authenticated users
+        similar_ids = similar_book_ids(book, include_also_read=request.user.is_authenticated)
+        all_similar = hydrate_books(similar_ids)
         
         serializer = self.get_serializer(all_similar, many=True, context={'request': request})
         return standard_response(
@@ -517,23 +510,26 @@ class BookViewSet(viewsets.ModelViewSet):
                 status_code=status.HTTP_404_NOT_FOUND
             )
         
-        # Increment download count
-        book.download_count += 1
-        book.save()
-        
-        # Get the file path
-        file_path = book.ebook.path
-        
-        # Return the file for download
+        # Stream the file (or hand it to the front proxy) instead of reading it into memory
         try:
-            with open(file_path, 'rb') as file:
-                response = HttpResponse(file.read(), content_type='application/octet-stream')
-                response['Content-Disposition'] = f'attachment; filename={book.ebook.name.split("/")[-1]}'
-                return response
+            etag, last_modified = ebook_validators(book)
+            # Clients that already have this version get a 304 before the file is opened
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            response = serve_file(
+                request, book.ebook, as_attachment=True, filename=ebook_filename(book),
+                etag=etag, last_modified=last_modified
+            )
         except Exception as e:
             return Response({
                 'message': f'Error downloading file: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Increment download count, but not for resumed downloads
+        if not is_range_continuation(request):
+            Book.objects.filter(pk=book.pk).update(download_count=F('download_count') + 1)
+        return response
             
     @action(detail=True, methods=['get'])
     def read(self, request, pk=None):
@@ -548,9 +544,44 @@ class BookViewSet(viewsets.ModelViewSet):
                 'message': 'No readable content available for this book'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Increment view count if this is a new session
-        book.view_count += 1
-        book.save()
+        # Text ebooks can be read a few pages at a time with ?page=n&count=k
+        if 'page' in request.query_params and file_extension(book.ebook.name) in TEXT_EXTENSIONS:
+            return self._read_pages(request, book)
+        
+        # Text ebooks are sent precompressed when the client accepts it (whole-file requests only)
+        is_text = file_extension(book.ebook.name) in TEXT_EXTENSIONS
+        variant = None
+        if is_text and settings.FILE_SERVE_MODE == 'django' and 'HTTP_RANGE' not in request.META:
+            variant = choose_encoding(request, book.ebook.path)
+        
+        # Return book content for reading
+        try:
+            etag, last_modified = ebook_validators(book, variant[0] if variant else None)
+            # Clients that already have this version get a 304 before the file is opened
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                if is_text:
+                    patch_vary_headers(not_modified, ['Accept-Encoding'])
+                return not_modified
+            response = serve_file(
+                request,
+                book.ebook,
+                content_type=ebook_content_type(book.ebook.name),
+                filename=ebook_filename(book),
+                etag=etag,
+                last_modified=last_modified,
+                variant=variant
+            )
+            if is_text:
+                patch_vary_headers(response, ['Accept-Encoding'])
+        except Exception as e:
+            return Response({
+                'message': f'Error reading file: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Increment view count if this is a new session (not a later byte range of the same file)
+        if not is_range_continuation(request):
+            Book.objects.filter(pk=book.pk).update(view_count=F('view_count') + 1)
         
         # Get or create reading progress for authenticated users
         if request.user.is_authenticated:
@@ -559,34 +590,176 @@ class BookViewSet(viewsets.ModelViewSet):
                 book=book,
                 defaults={
                     'current_page': 0,
-                    'total_pages': 100  # This would be calculated based on the actual book content
+                    # Filled in by the ingestion pipeline if the page count isn't known yet
+                    'total_pages': book.page_count or 0
                 }
             )
             
-        # Return book content for reading
+        return response
+    
+    def _read_pages(self, request, book):
+        """
+        Return `count` pages of a text ebook starting at `page`, sliced using its page offset index
+        """
         try:
-            with open(book.ebook.path, 'rb') as file:
-                content = file.read()
-                
-                # Determine content type based on file extension
-                file_ext = book.ebook.name.split('.')[-1].lower()
-                if file_ext == 'pdf':
-                    content_type = 'application/pdf'
-                elif file_ext in ['txt', 'text']:
-                    content_type = 'text/plain'
-                elif file_ext in ['epub', 'mobi']:
-                    content_type = 'application/octet-stream'
-                else:
-                    content_type = 'application/octet-stream'
-                
-                response = HttpResponse(content, content_type=content_type)
-                response['Content-Disposition'] = f'inline; filename={book.ebook.name.split("/")[-1]}'
-                return response
+            page = int(request.query_params.get('page'))
+            count = int(request.query_params.get('count', 1))
+        except ValueError:
+            return standard_response(
+                message='page and count must be integers',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        if page < 1 or count < 1:
+            return standard_response(
+                message='page and count must be positive',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        count = min(count, settings.TEXT_MAX_PAGES_PER_REQUEST)
+        
+        try:
+            # Pages depend on the file and on the page size
+            etag = f'"{ensure_ebook_hash(book)}-{settings.TEXT_PAGE_SIZE}"'
+            _, last_modified = ebook_validators(book)
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                self._record_page_read(request, book, page, book.page_count)
+                return not_modified
+            
+            offsets = get_page_offsets(book)
+            total_pages = len(offsets) - 1
+            if page > total_pages:
+                return standard_response(
+                    message=f'Page {page} is out of range (the book has {total_pages} pages)',
+                    status_code=status.HTTP_404_NOT_FOUND
+                )
+            pages = read_pages(book.ebook.path, offsets, page, count)
+        except Exception as e:
+            return Response({
+                'message': f'Error reading file: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # The page size may have changed since the book was ingested
+        if book.page_count != total_pages:
+            book.page_count = total_pages
+            Book.objects.filter(pk=book.pk).update(page_count=total_pages)
+        self._record_page_read(request, book, page, total_pages)
+        
+        response = standard_response(
+            data={
+                'page': page,
+                'count': len(pages),
+                'total_pages': total_pages,
+                'pages': pages
+            },
+            message=f'Pages {page}-{page + len(pages) - 1} of {total_pages}'
+        )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+    
+    @action(detail=True, methods=['get'], url_path=r'pages/(?P<page_number>[0-9]+)')
+    def pages(self, request, pk=None, page_number=None):
+        """
+        Text of a single page of a PDF or text ebook, for reflowable display and text-to-speech
+        """
+        book = self.get_object()
+        page = int(page_number)
+        
+        if not book.ebook:
+            return Response({
+                'message': 'No readable content available for this book'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        file_ext = file_extension(book.ebook.name)
+        if file_ext != 'pdf' and file_ext not in TEXT_EXTENSIONS:
+            return standard_response(
+                message=f'Page text is not available for {file_ext.upper()} files',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        if page < 1 or (book.page_count and page > book.page_count):
+            return standard_response(
+                message=f'Page {page} is out of range (the book has {book.page_count or 0} pages)',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        
+        try:
+            # Text pages also depend on the page size
+            version = ensure_ebook_hash(book) if file_ext == 'pdf' else f'{ensure_ebook_hash(book)}-{settings.TEXT_PAGE_SIZE}'
+            etag = f'"{version}-page-{page}"'
+            _, last_modified = ebook_validators(book)
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                self._record_page_read(request, book, page, book.page_count)
+                return not_modified
+            
+            if file_ext == 'pdf':
+                text = get_page_text(book, page)
+                total_pages = book.page_count
+            else:
+                offsets = get_page_offsets(book)
+                total_pages = len(offsets) - 1
+                text = read_pages(book.ebook.path, offsets, page)[0] if page <= total_pages else None
+        except ImportError:
+            return Response({'message': 'PDF page text requires PyPDF2 library'}, status=status.HTTP_501_NOT_IMPLEMENTED)
         except Exception as e:
             return Response({
                 'message': f'Error reading file: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+        if text is None:
+            return standard_response(
+                message=f'Page {page} is out of range (the book has {total_pages} pages)',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        self._record_page_read(request, book, page, total_pages)
+        
+        response = standard_response(
+            data={
+                'page': page,
+                'total_pages': total_pages,
+                'text': text
+            },
+            message=f'Page {page} of {total_pages}'
+        )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+    
+    def _record_page_read(self, request, book, page, total_pages):
+        # Opening a book counts as a view; turning its pages does not
+        if page == 1:
+            Book.objects.filter(pk=book.pk).update(view_count=F('view_count') + 1)
+        
+        if request.user.is_authenticated:
+            defaults = {'current_page': page}
+            if total_pages:
+                defaults['total_pages'] = total_pages
+            ReadingProgress.objects.update_or_create(user=request.user, book=book, defaults=defaults)
+        
+    @action(detail=True, methods=['get'])
+    def cover(self, request, pk=None):
+        """
+        Serve a book's cover image with validators so clients can revalidate cheaply
+        """
+        book = self.get_object()
+        
+        if not book.image:
+            return Response({
+                'message': 'No cover image available for this book'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            etag, last_modified = file_validators(book.image)
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+            content_type = mimetypes.guess_type(book.image.name)[0]
+            return serve_file(request, book.image, content_type=content_type, etag=etag, last_modified=last_modified)
+        except Exception as e:
+            return Response({
+                'message': f'Error reading cover image: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
     @action(detail=True, methods=['get'])
     def preview(self, request, pk=None):
         """
@@ -599,209 +772,94 @@ class BookViewSet(viewsets.ModelViewSet):
             return Response({
                 'message': 'No preview available for this book'
             }, status=status.HTTP_404_NOT_FOUND)
-            
+        
         try:
-            # For PDF files, we would extract just the first few pages
-            # For text files, we can get the first few lines
-            # This is a simplified version that works for text-based files
-            with open(book.ebook.path, 'rb') as file:
-                file_ext = book.ebook.name.split('.')[-1].lower()
-                
-                if file_ext == 'pdf':
-                    # For PDF files, we need to use PyPDF2 to extract the first few pages
-                    try:
-                        from PyPDF2 import PdfReader
-                        reader = PdfReader(file)
-                        
-                        # Get table of contents if available
-                        toc = []
-                        if hasattr(reader, 'outline') and reader.outline:
-                            # This is a simplified TOC extraction
-                            # A real implementation would recursively process the outline
-                            for item in reader.outline:
-                                if isinstance(item, dict) and '/Title' in item:
-                                    toc.append(item['/Title'])
-                        
-                        # Extract text from first 3 pages or 10% of the book, whichever is less
-                        preview_pages = min(3, len(reader.pages))
-                        preview_text = ''
-                        for i in range(preview_pages):
-                            page = reader.pages[i]
-                            preview_text += page.extract_text()
-                            if len(preview_text) > 5000:  # Limit preview size
-                                preview_text = preview_text[:5000] + '...'
-                                break
-                        
-                        return Response({
-                            'title': book.title,
-                            'author': book.author,
-                            'description': book.description,
-                            'category': book.category,
-                            'year': book.year,
-                            'isbn': book.isbn,
-                            'total_pages': len(reader.pages),
-                            'table_of_contents': toc,
-                            'preview_text': preview_text,
-                            'preview_type': 'text'
-                        })
-                    except ImportError:
-                        # If PyPDF2 is not available, return metadata only
-                        return Response({
-                            'message': 'PDF preview requires PyPDF2 library',
-                            'title': book.title,
-                            'author': book.author,
-                            'description': book.description,
-                            'category': book.category,
-                            'year': book.year,
-                            'isbn': book.isbn
-                        })
-                        
-                elif file_ext in ['txt', 'text']:
-                    # For text files, read the first 5000 characters
-                    content = file.read(5000).decode('utf-8', errors='replace')
-                    if file.read(1):  # Check if there's more content
-                        content += '...'
-                    
-                    # Simple TOC generation for text files (chapter detection)
-                    lines = content.split('\n')
-                    toc = []
-                    for line in lines:
-                        if (line.lower().startswith('chapter') or 
-                            (line.strip() and line.strip().isupper() and len(line.strip()) > 5)):
-                            toc.append(line.strip())
-                            if len(toc) >= 10:  # Limit TOC entries
-                                break
-                    
-                    return Response({
-                        'title': book.title,
-                        'author': book.author,
-                        'description': book.description,
-                        'category': book.category,
-                        'year': book.year,
-                        'isbn': book.isbn,
-                        'table_of_contents': toc,
-                        'preview_text': content,
-                        'preview_type': 'text'
-                    })
-                    
-                elif file_ext in ['epub', 'mobi']:
-                    # For EPUB/MOBI, we would need specialized libraries
-                    # This is a placeholder for future implementation
-                    return Response({
-                        'message': f'{file_ext.upper()} preview not fully implemented yet',
-                        'title': book.title,
-                        'author': book.author,
-                        'description': book.description,
-                        'category': book.category,
-                        'year': book.year,
-                        'isbn': book.isbn
-                    })
-                    
-                else:
-                    # For other file types, just return metadata
-                    return Response({
-                        'title': book.title,
-                        'author': book.author,
-                        'description': book.description,
-                        'category': book.category,
-                        'year': book.year,
-                        'isbn': book.isbn,
-                        'message': f'Preview not available for {file_ext.upper()} files'
-                    })
-                    
-            # End of with block
-        except Exception as e:
+            etag, last_modified = preview_validators(book)
+        except OSError as e:
             return Response({
-                'message': f'Error generating preview: {str(e)}',
-                'title': book.title,
-                'author': book.author,
-                'description': book.description
+                'message': f'Error generating preview: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Get or create reading progress for authenticated users
-        if request.user.is_authenticated:
-            reading_progress, created = ReadingProgress.objects.get_or_create(
-                user=request.user,
-                book=book,
-                defaults={
-                    'current_page': 0,
-                    'total_pages': 100  # This would be calculated based on the actual book content
-                }
-            )
-            
-            # Return book content with reading progress
-            try:
-                # For PDF files, we would need to use a library like PyPDF2 to extract content
-                # For text files, we can simply read the content
-                # This is a simplified version that works for text-based files
-                with open(book.ebook.path, 'rb') as file:
-                    content = file.read()
-                    
-                    # Determine content type based on file extension
-                    file_ext = book.ebook.name.split('.')[-1].lower()
-                    if file_ext == 'pdf':
-                        content_type = 'application/pdf'
-                    elif file_ext in ['txt', 'text']:
-                        content_type = 'text/plain'
-                    elif file_ext in ['epub', 'mobi']:
-                        # For EPUB/MOBI, we would need special handling
-                        # This is just a placeholder
-                        content_type = 'application/octet-stream'
-                    else:
-                        content_type = 'application/octet-stream'
-                    
-                    response = HttpResponse(content, content_type=content_type)
-                    
-                    # For inline display in browser
-                    response['Content-Disposition'] = f'inline; filename={book.ebook.name.split("/")[-1]}'
-                    
-                    return response
-            except Exception as e:
-                return Response({
-                    'message': f'Error reading file: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            # For unauthenticated users, just serve the file without tracking progress
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        
+        response = self._preview_response(request, book)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+    
+    def _preview_response(self, request, book):
+        """
+        Build the preview payload for a book that has an ebook file
+        """
+        metadata = {
+            'title': book.title,
+            'author': book.author,
+            'description': book.description,
+            'category': book.category,
+            'year': book.year,
+            'isbn': book.isbn
+        }
+        file_ext = file_extension(book.ebook.name)
+        
+        if file_ext in PREVIEW_EXTENSIONS:
+            # Preview text, TOC and page count are extracted once and stored in BookPreview
             try:
-                with open(book.ebook.path, 'rb') as file:
-                    content = file.read()
-                    
-                    # Determine content type based on file extension
-                    file_ext = book.ebook.name.split('.')[-1].lower()
-                    if file_ext == 'pdf':
-                        content_type = 'application/pdf'
-                    elif file_ext in ['txt', 'text']:
-                        content_type = 'text/plain'
-                    else:
-                        content_type = 'application/octet-stream'
-                    
-                    response = HttpResponse(content, content_type=content_type)
-                    response['Content-Disposition'] = f'inline; filename={book.ebook.name.split("/")[-1]}'
-                    return response
+                artifact = get_book_preview(book)
+            except ImportError:
+                # If PyPDF2 is not available, return metadata only
+                return Response({'message': 'PDF preview requires PyPDF2 library', **metadata})
             except Exception as e:
                 return Response({
-                    'message': f'Error reading file: {str(e)}'
+                    'message': f'Error generating preview: {str(e)}',
+                    'title': book.title,
+                    'author': book.author,
+                    'description': book.description
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            data = dict(metadata)
+            if artifact.total_pages is not None:
+                data['total_pages'] = artifact.total_pages
+            data.update({
+                'table_of_contents': artifact.table_of_contents,
+                'preview_text': artifact.preview_text,
+                'preview_type': artifact.preview_type
+            })
+            return Response(data)
+            
+        elif file_ext == 'mobi':
+            # MOBI would need a specialized library
+            # This is a placeholder for future implementation
+            return Response({'message': f'{file_ext.upper()} preview not fully implemented yet', **metadata})
+            
+        # For other file types, just return metadata
+        return Response({**metadata, 'message': f'Preview not available for {file_ext.upper()} files'})
+    
+    @action(detail=True, methods=['get'])
+    def ingestion(self, request, pk=None):
+        """
+        Status of the background ingestion of a book's ebook
+        """
+        book = self.get_object()
+        job = ingestion_status(book)
+        if job is None:
+            return standard_response(
+                message='This book has not been queued for ingestion',
+                status_code=status.HTTP_404_NOT_FOUND
+            )
         
-        # Apply filters if provided
-        category = request.query_params.get('category', None)
-        year = request.query_params.get('year', None)
-        
-        if category:
-            queryset = queryset.filter(category=category)
-        
-        if year:
-            queryset = queryset.filter(year=year)
-        
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        return standard_response(
+            data={
+                'book': book.id,
+                'page_count': book.page_count,
+                'job': job
+            },
+            message=f'Ingestion is {job["status"]}'
+        )
     
     @action(detail=False, methods=['get'])
+    @cache_view_method(timeout=settings.RESPONSE_CACHE_SECONDS, model='Book', overlay=overlay_book_payload)
     def by_category(self, request):
         category = request.query_params.get('category', None)
         if not category:
@@ -811,11 +869,9 @@ class BookViewSet(viewsets.ModelViewSet):
         
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serialize_books(page, request))
         
-        serializer = self.get_serializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(serialize_books(queryset, request))
         
     @action(detail=False, methods=['get'])
     def infinite_scroll(self, request):
@@ -911,7 +967,7 @@ class BookViewSet(viewsets.ModelViewSet):
 # User Dashboard and Profile Views
 class UserDashboardView(APIView):
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get(self, request):
         user = request.user
@@ -944,7 +1000,7 @@ class UserDashboardView(APIView):
 class UserProfileViewSet(viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     parser_classes = [MultiPartParser, FormParser]  # Add parsers for file uploads
     
     def get_permissions(self):
@@ -973,7 +1029,16 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         instance = get_object_or_404(UserProfile, user=request.user)
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
+        if 'profile_picture' in request.FILES:
+            try:
+                check_profile_picture(request.FILES['profile_picture'])
+            except ProfilePictureError as e:
+                return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer.save()
+        # Pictures go through the same normalization as upload-profile-picture
+        if 'profile_picture' in request.FILES:
+            stage_profile_picture(instance, request.FILES['profile_picture'])
+            serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'], url_path='upload-profile-picture')
@@ -990,23 +1055,26 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                     'message': 'No profile picture provided'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Delete old profile picture if it exists
-            if profile.profile_picture:
-                try:
-                    if os.path.isfile(profile.profile_picture.path):
-                        os.remove(profile.profile_picture.path)
-                except Exception as e:
-                    # Just log the error but continue with the update
-                    print(f"Error removing old profile picture: {str(e)}")
+            uploaded = request.FILES['profile_picture']
+            # Decoded once here so broken files are refused; resizing happens in the background
+            try:
+                check_profile_picture(uploaded)
+            except ProfilePictureError as e:
+                return Response({
+                    'message': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Update profile picture
-            profile.profile_picture = request.FILES['profile_picture']
-            profile.save()
+            # The old picture is removed by the cleanup queue once the new one is ready
+            stage_profile_picture(profile, uploaded)
+            profile.refresh_from_db()
             
             return Response({
-                'message': 'Profile picture updated successfully',
-                'profile_picture_url': request.build_absolute_uri(profile.profile_picture.url)
-            })
+                'message': 'Profile picture uploaded and is being processed',
+                'processing': bool(profile.pending_profile_picture),
+                'profile_picture_url': (
+                    request.build_absolute_uri(profile.profile_picture.url) if profile.profile_picture else None
+                )
+            }, status=status.HTTP_202_ACCEPTED if profile.pending_profile_picture else status.HTTP_200_OK)
         except Exception as e:
             return Response({
                 'message': f'Error uploading profile picture: {str(e)}'
@@ -1069,17 +1137,12 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                     'message': 'Current password is required to delete your account'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Delete profile picture if it exists
-            if profile.profile_picture:
-                try:
-                    if os.path.isfile(profile.profile_picture.path):
-                        os.remove(profile.profile_picture.path)
-                except Exception as e:
-                    # Just log the error but continue with deletion
-                    print(f"Error removing profile picture during account deletion: {str(e)}")
+            # Profile picture files are removed by the cleanup queue
+            picture_names = profile_picture_names(profile) + [profile.pending_profile_picture]
             
             # Delete user account (this will cascade delete all related objects)
             user.delete()
+            schedule_file_deletion(picture_names, delay=0)
             
             return Response({
                 'message': 'Your account has been successfully deleted'
@@ -1094,7 +1157,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
     queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get_queryset(self):
         # Check if this is a schema request from Swagger
@@ -1111,7 +1174,7 @@ class RatingViewSet(viewsets.ModelViewSet):
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get_queryset(self):
         # Check if this is a schema request from Swagger
@@ -1143,7 +1206,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get_queryset(self):
         # Check if this is a schema request from Swagger
@@ -1163,7 +1226,7 @@ class ReadingProgressViewSet(viewsets.ModelViewSet):
     queryset = ReadingProgress.objects.all()
     serializer_class = ReadingProgressSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get_queryset(self):
         # Check if this is a schema request from Swagger
@@ -1266,7 +1329,7 @@ class BookContentViewSet(viewsets.ModelViewSet):
     queryset = BookContent.objects.all()
     serializer_class = BookContentSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     
     def get_queryset(self):
         # Check if this is a schema request from Swagger
@@ -1280,12 +1343,194 @@ class BookContentViewSet(viewsets.ModelViewSet):
         book = get_object_or_404(Book, id=book_id, uploaded_by=self.request.user)
         serializer.save(book=book)
 
+# Resumable Upload Views
+class UploadSessionViewSet(viewsets.GenericViewSet):
+    """
+    Resumable (tus-like) ebook uploads.
+
+    POST creates a session for a file of a given size, PATCH appends a chunk
+    at the `Upload-Offset` header, HEAD/GET report the current offset, and
+    `finalize` turns the completed upload into a new book or a book's new ebook.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def get_queryset(self):
+        # Check if this is a schema request from Swagger
+        if getattr(self, 'swagger_fake_view', False):
+            return UploadSession.objects.none()
+            
+        return UploadSession.objects.filter(user=self.request.user)
+    
+    def _upload_headers(self, response, session):
+        response['Upload-Offset'] = str(session.offset)
+        response['Upload-Length'] = str(session.size)
+        response['Upload-Expires'] = http_date(session.expires_at.timestamp())
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    def create(self, request):
+        filename = request.data.get('filename', '')
+        try:
+            size = int(request.data.get('size', 0))
+        except (TypeError, ValueError):
+            size = 0
+        if not filename or size <= 0:
+            return standard_response(
+                message='filename and a positive size are required',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        if size > settings.UPLOAD_MAX_SIZE:
+            return standard_response(
+                message=f'Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes',
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        session = create_session(request.user, filename, size)
+        response = standard_response(
+            data=self.get_serializer(session).data,
+            message='Upload session created',
+            status_code=status.HTTP_201_CREATED
+        )
+        response['Location'] = request.build_absolute_uri(f'{session.pk}/')
+        return self._upload_headers(response, session)
+    
+    def retrieve(self, request, pk=None):
+        session = self.get_object()
+        response = standard_response(
+            data=self.get_serializer(session).data,
+            message='Upload session retrieved successfully'
+        )
+        return self._upload_headers(response, session)
+    
+    def partial_update(self, request, pk=None):
+        """
+        Append the request body at the offset given in the Upload-Offset header
+        """
+        if request.content_type.split(';')[0].strip() != 'application/offset+octet-stream':
+            return standard_response(
+                message='Chunks must be sent as application/offset+octet-stream',
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return standard_response(
+                message='A numeric Upload-Offset header is required',
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return standard_response(
+                message=f'Chunks are limited to {settings.UPLOAD_CHUNK_MAX_SIZE} bytes',
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        try:
+            session = append_chunk(
+                pk,
+                request.user,
+                offset,
+                request.stream,
+                length,
+                checksum=request.META.get('HTTP_UPLOAD_CHECKSUM')
+            )
+        except ChunkError as e:
+            response = standard_response(message=str(e), status_code=e.status)
+            session = UploadSession.objects.filter(pk=pk, user=request.user).first()
+            return self._upload_headers(response, session) if session is not None else response
+        
+        return self._upload_headers(HttpResponse(status=status.HTTP_204_NO_CONTENT), session)
+    
+    def destroy(self, request, pk=None):
+        session = self.get_object()
+        if session.status == 'active':
+            discard_session(session)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """
+        Store a completed upload as the ebook of a new book (book fields in the body)
+        or of an existing book of the user (`book` id in the body)
+        """
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(pk=pk, user=request.user).first()
+            if session is None:
+                return standard_response(message='Upload session not found', status_code=status.HTTP_404_NOT_FOUND)
+            
+            # Finalizing again (e.g. after a lost response) returns the same book
+            if session.status == 'completed' and session.book_id:
+                serializer = BookSerializer(session.book, context={'request': request})
+                return standard_response(data={'book': serializer.data}, message='Upload already finalized')
+            if session.offset < session.size:
+                return self._upload_headers(standard_response(
+                    message=f'Upload is incomplete ({session.offset} of {session.size} bytes received)',
+                    status_code=status.HTTP_409_CONFLICT
+                ), session)
+            
+            book_id = request.data.get('book')
+            if book_id:
+                book = get_object_or_404(Book, pk=book_id)
+                if book.uploaded_by != request.user:
+                    return standard_response(
+                        message='You can only replace the ebook of your own books',
+                        status_code=status.HTTP_403_FORBIDDEN
+                    )
+            else:
+                serializer = BookSerializer(data=request.data, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+            
+            name = complete_session(session)
+            if book_id:
+                old_name = book.ebook.name if book.ebook else None
+                book.ebook = name
+                book.ebook_hash = blob_digest(name)
+                book.page_count = None
+                book.save()
+                # Drop the old file's reference (also balances re-uploading the same file)
+                if old_name:
+                    transaction.on_commit(partial(book.ebook.storage.delete, old_name))
+                invalidate_model_cache('Book', book.id)
+            else:
+                book = serializer.save(uploaded_by=request.user, ebook=name, ebook_hash=blob_digest(name))
+            
+            session.book = book
+            session.save(update_fields=['book', 'updated_at'])
+            enqueue_ingestion(book)
+        
+        serializer = BookSerializer(book, context={'request': request})
+        return standard_response(
+            data={'book': serializer.data},
+            message='Upload finalized successfully',
+            status_code=status.HTTP_201_CREATED
+        )
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def cache_metrics_view(request):
+    """
+    Cache hits, misses, sets, evictions, bytes and latencies by namespace, summed over all workers.
+    DELETE resets the counters.
+    """
+    if request.method == 'DELETE':
+        cache_metrics.reset()
+        return standard_response(message='Cache metrics reset')
+    
+    return standard_response(data={
+        'namespaces': cache_metrics.snapshot(),
+        # Local cache of the worker answering this request
+        'local_cache': local_cache.stats()
+    })
+
 # Legacy Views - Keeping for backward compatibility
+@cache_view(timeout=settings.RESPONSE_CACHE_SECONDS, model='Book')
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def home(request):
     books = Book.objects.filter(is_public=True).order_by('-uploaded_on')[:20]
-    serializer = BookSerializer(books, many=True, context={'request': request})
-    if serializer.data:
-        return Response(serializer.data)
+    data = serialize_books(books, request)
+    if data:
+        return Response(data)
     return Response({"message": "Books not found!"})
@@ -0,0 +1,113 @@
+"""
+Cache warming from recorded traffic.
+
+The most requested cacheable URLs and search queries (see project.traffic)
+are replayed through the Django test client in a thread pool, which fills
+the book list, detail, popular and search caches as real requests would.
+Requests are anonymous, so the shared entries are the ones warmed.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from . import traffic
+
+logger = logging.getLogger(__name__)
+
+_clients = threading.local()
+
+
+def warmup_urls(url_limit, query_limit):
+    """
+    Absolute URLs to replay, most requested first, with the home and popular pages always included
+    """
+    urls = [url for url, _ in traffic.top(traffic.URLS, url_limit)]
+    base = '{0.scheme}://{0.netloc}'.format(urlsplit(urls[0])) if urls else 'http://testserver'
+    for default in (reverse('home'), reverse('book-popular')):
+        if base + default not in urls:
+            urls.append(base + default)
+    search = base + reverse('book-search')
+    urls.extend(f"{search}?{urlencode({'q': query})}" for query, _ in traffic.top(traffic.SEARCHES, query_limit))
+    return urls
+
+
+def _fetch(url, deadline):
+    """
+    Request a URL and return (url, status code, seconds), or a None status if the budget ran out first
+    """
+    if time.monotonic() >= deadline:
+        return url, None, 0
+    client = getattr(_clients, 'client', None)
+    if client is None:
+        client = _clients.client = Client()
+    parts = urlsplit(url)
+    path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+    started = time.monotonic()
+    try:
+        # The original host and scheme, since cached payloads embed absolute URLs
+        response = client.get(
+            path,
+            HTTP_HOST=parts.netloc,
+            secure=parts.scheme == 'https',
+            **{traffic.WARMUP_HEADER: '1'}
+        )
+        status = response.status_code
+    except Exception:
+        logger.exception('Could not warm %s', url)
+        status = 500
+    finally:
+        connection.close()
+    return url, status, time.monotonic() - started
+
+
+def warm_cache(url_limit=None, query_limit=None, workers=None, budget=None, progress=None):
+    """
+    Replay the most requested URLs and search queries until done or ``budget`` seconds have passed.
+
+    ``progress(done, total, url, status, seconds)`` is called after each URL.
+    Returns a dict with the number of URLs warmed, failed and skipped.
+    """
+    url_limit = settings.CACHE_WARMUP_URLS if url_limit is None else url_limit
+    query_limit = settings.CACHE_WARMUP_QUERIES if query_limit is None else query_limit
+    workers = workers or settings.CACHE_WARMUP_WORKERS
+    budget = settings.CACHE_WARMUP_BUDGET if budget is None else budget
+
+    deadline = time.monotonic() + budget
+    urls = warmup_urls(url_limit, query_limit)
+    summary = {'total': len(urls), 'warmed': 0, 'failed': 0, 'skipped': 0}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cache-warmup') as executor:
+        for done, (url, status, seconds) in enumerate(
+            executor.map(lambda url: _fetch(url, deadline), urls), start=1
+        ):
+            if status is None:
+                summary['skipped'] += 1
+            elif status == 200:
+                summary['warmed'] += 1
+            else:
+                summary['failed'] += 1
+            if progress is not None:
+                progress(done, len(urls), url, status, seconds)
+    return summary
+
+
+def warm_on_startup():
+    """
+    Warm the caches before the worker serves requests, if CACHE_WARMUP_ON_STARTUP is set
+    """
+    if not settings.CACHE_WARMUP_ON_STARTUP:
+        return
+    started = time.monotonic()
+
+    def log_progress(done, total, url, status, seconds):
+        logger.info('Cache warmup %d/%d: %s (%s, %.2fs)', done, total, url, status or 'skipped', seconds)
+
+    summary = warm_cache(progress=log_progress)
+    logger.info(
+        'Cache warmup finished in %.1fs: %d warmed, %d failed, %d skipped',
+        time.monotonic() - started, summary['warmed'], summary['failed'], summary['skipped']
+    )
@@ -0,0 +1,26 @@
+"""
+Entry points for background job worker processes.
+
+This module must not import models at import time: spawned workers unpickle
+these functions before Django has been set up.
+"""
+import os
+
+
+def init_worker(settings_module):
+    """
+    Set up Django in a freshly spawned worker process
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    from .jobs import mark_worker_process
+    mark_worker_process()
+
+
+def drain(limit=None):
+    """
+    Run due jobs in the worker process until the queue is empty
+    """
+    from .jobs import run_pending
+    return run_pending(limit=limit)